@@ -45,7 +45,8 @@ from models.yolo import SegmentationModel
 from segment.val import run as val_seg
 from utils import notebook_init
 from utils.general import LOGGER, check_yaml, file_size, print_args
-from utils.torch_utils import select_device
+from utils.loss import profile_targets
+from utils.torch_utils import profile_memory_format, profile_train_step, select_device
 from val import run as val_det
 
 
@@ -59,6 +60,13 @@ def run(
     test=False,  # test exports only
     pt_only=False,  # test PyTorch only
     hard_fail=False,  # throw error on benchmark failure
+    throughput=False,  # also benchmark OpenVINO THROUGHPUT mode
+    int8=False,  # also benchmark TFLite INT8 models
+    threads=None,  # TFLite threads per interpreter
+    interpreters=1,  # TFLite interpreter pool size
+    channels_last=False,  # also benchmark PyTorch NCHW vs NHWC memory formats at several batch sizes
+    train_step=False,  # also benchmark PyTorch training step time with loop vs foreach/fused optimizer, clip and EMA
+    worker_targets=False,  # also benchmark and check target assignment in the training step vs dataloader workers
 ):
     """
     Run YOLOv5 benchmarks on multiple export formats and log results for model performance evaluation.
@@ -73,9 +81,21 @@ def run(
         test (bool): Test export formats only (default: False).
         pt_only (bool): Test PyTorch format only (default: False).
         hard_fail (bool): Throw an error on benchmark failure if True (default: False).
+        throughput (bool): Add an OpenVINO THROUGHPUT mode row, validated with 32-image batches split across async
+            infer requests (default: False).
+        int8 (bool): Add a TFLite INT8 row next to the float TFLite model for CPU comparison (default: False).
+        threads (int | None): Threads per TFLite interpreter, None for the runtime default (default: None).
+        interpreters (int): TFLite interpreter pool size, batches run concurrently when > 1 (default: 1).
+        channels_last (bool): Also log PyTorch inference ms/image in NCHW and NHWC (torch.channels_last) memory formats
+            at batch sizes 1, 8, 16 and 32 (default: False).
+        train_step (bool): Also log PyTorch training step time with per-tensor loops versus foreach/fused optimizer,
+            gradient clipping and EMA updates (default: False).
+        worker_targets (bool): Also log ComputeLoss() time with targets assigned by build_targets() in the training
+            step versus by a TargetAssigner() as in dataloader workers, and their parity (default: False).
 
     Returns:
-        None. Logs information about the benchmark results, including the format, size, mAP50-95, and inference time.
+        None. Logs information about the benchmark results, including the format, size, mAP50-95, inference time and
+            FPS.
 
     Notes:
         Supported export formats and models include PyTorch, TorchScript, ONNX, OpenVINO, TensorRT, CoreML,
@@ -122,26 +142,84 @@ def run(
                 result = val_seg(data, w, batch_size, imgsz, plots=False, device=device, task="speed", half=half)
                 metric = result[0][7]  # (box(p, r, map50, map), mask(p, r, map50, map), *loss(box, obj, cls))
             else:  # DetectionModel:
-                result = val_det(data, w, batch_size, imgsz, plots=False, device=device, task="speed", half=half)
+                kw = {"threads": threads, "interpreters": interpreters}  # TFLite CPU settings
+                bs = batch_size * interpreters if f == "tflite" else batch_size  # one model batch per interpreter
+                result = val_det(data, w, bs, imgsz, plots=False, device=device, task="speed", half=half, **kw)
                 metric = result[0][3]  # (p, r, map50, map, *loss(box, obj, cls))
             speed = result[2][1]  # times (preprocess, inference, postprocess)
-            y.append([name, round(file_size(w), 1), round(metric, 4), round(speed, 2)])  # MB, mAP, t_inference
+            y.append([name, round(file_size(w), 1), round(metric, 4), round(speed, 2), round(1000 / speed, 1)])
+
+            # OpenVINO THROUGHPUT mode (optional)
+            if throughput and f == "openvino" and model_type != SegmentationModel:
+                name = f"{name} throughput"
+                result = val_det(data, w, 32, imgsz, plots=False, device=device, task="speed", throughput=True)
+                speed = result[2][1]  # per-image inference time with 32-image batches across async requests
+                y.append([name, y[-1][1], round(result[0][3], 4), round(speed, 2), round(1000 / speed, 1)])
+
+            # TFLite INT8 (optional)
+            if int8 and f == "tflite" and model_type != SegmentationModel:
+                name = f"{name} INT8"
+                w = export.run(
+                    weights=weights,
+                    imgsz=[imgsz],
+                    include=[f],
+                    batch_size=batch_size,
+                    device=device,
+                    int8=True,
+                    data=data,
+                )[-1]
+                assert "-int8" in str(w), "export failed"
+                result = val_det(data, w, bs, imgsz, plots=False, device=device, task="speed", **kw)
+                speed = result[2][1]
+                y.append(
+                    [name, round(file_size(w), 1), round(result[0][3], 4), round(speed, 2), round(1000 / speed, 1)]
+                )
         except Exception as e:
             if hard_fail:
                 assert type(e) is AssertionError, f"Benchmark --hard-fail for {name}: {e}"
             LOGGER.warning(f"WARNING ⚠️ Benchmark failure for {name}: {e}")
-            y.append([name, None, None, None])  # mAP, t_inference
+            y.append([name, None, None, None, None])  # MB, mAP, t_inference, FPS
         if pt_only and i == 0:
             break  # break after PyTorch
 
+    # PyTorch NCHW vs NHWC memory format (optional)
+    if channels_last:
+        model = attempt_load(weights, device=device)
+        model.half() if half else model.float()
+        mf = pd.DataFrame(
+            profile_memory_format(model, imgsz), columns=["Batch size", "NCHW (ms/img)", "NHWC (ms/img)", "Speedup"]
+        )
+
+    # PyTorch training step (optional)
+    if train_step:
+        model = attempt_load(weights, device=device, fuse=False)
+        ts = pd.DataFrame(
+            profile_train_step(model, imgsz, batch_size),
+            columns=["Optimizer", "Implementation", "Step (ms)", "Clip + optimizer + EMA (ms)"],
+        )
+
+    # Target assignment in the training step vs dataloader workers (optional)
+    if worker_targets:
+        model = attempt_load(weights, device=device, fuse=False)
+        wt = pd.DataFrame(
+            profile_targets(model, imgsz, batch_size),
+            columns=["Assignment", "Step assign (ms)", "Loss (ms)", "Worker assign (ms)", "Parity"],
+        )
+
     # Print results
     LOGGER.info("\n")
     parse_opt()
     notebook_init()  # print system info
-    c = ["Format", "Size (MB)", "mAP50-95", "Inference time (ms)"] if map else ["Format", "Export", "", ""]
+    c = ["Format", "Size (MB)", "mAP50-95", "Inference time (ms)", "FPS"] if map else ["Format", "Export", "", "", ""]
     py = pd.DataFrame(y, columns=c)
     LOGGER.info(f"\nBenchmarks complete ({time.time() - t:.2f}s)")
     LOGGER.info(str(py if map else py.iloc[:, :2]))
+    if channels_last:
+        LOGGER.info(f"\nPyTorch memory format (torch.channels_last) {imgsz}x{imgsz}\n{mf}")
+    if train_step:
+        LOGGER.info(f"\nPyTorch training step, batch size {batch_size} at {imgsz}x{imgsz}\n{ts}")
+    if worker_targets:
+        LOGGER.info(f"\nTarget assignment, batch size {batch_size} at {imgsz}x{imgsz}\n{wt}")
     if hard_fail and isinstance(hard_fail, str):
         metrics = py["mAP50-95"].array  # values to compare to floor
         floor = eval(hard_fail)  # minimum metric floor to pass, i.e. = 0.29 mAP for YOLOv5n
@@ -159,6 +237,13 @@ def test(
     test=False,  # test exports only
     pt_only=False,  # test PyTorch only
     hard_fail=False,  # throw error on benchmark failure
+    throughput=False,  # also benchmark OpenVINO THROUGHPUT mode
+    int8=False,  # also benchmark TFLite INT8 models
+    threads=None,  # TFLite threads per interpreter
+    interpreters=1,  # TFLite interpreter pool size
+    channels_last=False,  # also benchmark PyTorch NCHW vs NHWC memory formats at several batch sizes
+    train_step=False,  # also benchmark PyTorch training step time with loop vs foreach/fused optimizer, clip and EMA
+    worker_targets=False,  # also benchmark and check target assignment in the training step vs dataloader workers
 ):
     """
     Run YOLOv5 export tests for all supported formats and log the results, including export statuses.
@@ -173,6 +258,8 @@ def test(
         test (bool): Test export formats only without running inference. Default is False.
         pt_only (bool): Test only the PyTorch model if True. Default is False.
         hard_fail (bool): Raise error on export or test failure if True. Default is False.
+        throughput, int8, threads, interpreters, channels_last, train_step, worker_targets: Unused by export tests,
+            accepted for CLI compatibility with `run()`.
 
     Returns:
         pd.DataFrame: DataFrame containing the results of the export tests, including format names and export statuses.
@@ -233,6 +320,18 @@ def parse_opt():
         pt_only (bool): Test PyTorch only. This is a flag and defaults to False.
         hard_fail (bool | str): Throw an error on benchmark failure. Can be a boolean or a string representing a minimum
             metric floor, e.g., '0.29'. Defaults to False.
+        throughput (bool): Also benchmark OpenVINO THROUGHPUT mode with async infer requests. This is a flag and
+            defaults to False.
+        int8 (bool): Also benchmark a TFLite INT8 model next to the float TFLite model. This is a flag and defaults to
+            False.
+        threads (int): Threads per TFLite interpreter. Defaults to None (runtime default).
+        interpreters (int): TFLite interpreter pool size. Defaults to 1.
+        channels_last (bool): Also benchmark PyTorch NCHW vs NHWC memory formats at several batch sizes. This is a flag
+            and defaults to False.
+        train_step (bool): Also benchmark PyTorch training step time with loop vs foreach/fused implementations. This is
+            a flag and defaults to False.
+        worker_targets (bool): Also benchmark target assignment in the training step vs dataloader workers and check
+            their parity. This is a flag and defaults to False.
 
     Returns:
         argparse.Namespace: Parsed command-line arguments encapsulated in an argparse Namespace object.
@@ -251,6 +350,13 @@ def parse_opt():
     parser.add_argument("--test", action="store_true", help="test exports only")
     parser.add_argument("--pt-only", action="store_true", help="test PyTorch only")
     parser.add_argument("--hard-fail", nargs="?", const=True, default=False, help="Exception on error or < min metric")
+    parser.add_argument("--throughput", action="store_true", help="also benchmark OpenVINO THROUGHPUT mode")
+    parser.add_argument("--int8", action="store_true", help="also benchmark TFLite INT8 models")
+    parser.add_argument("--threads", type=int, default=None, help="TFLite threads per interpreter")
+    parser.add_argument("--interpreters", type=int, default=1, help="TFLite interpreter pool size")
+    parser.add_argument("--channels-last", action="store_true", help="also benchmark PyTorch NCHW vs NHWC")
+    parser.add_argument("--train-step", action="store_true", help="also benchmark PyTorch training step time")
+    parser.add_argument("--worker-targets", action="store_true", help="also benchmark worker target assignment")
     opt = parser.parse_args()
     opt.data = check_yaml(opt.data)  # check YAML
     print_args(vars(opt))
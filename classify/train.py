@@ -59,6 +59,7 @@ from utils.loggers import GenericLogger
 from utils.plots import imshow_cls
 from utils.torch_utils import (
     ModelEMA,
+    clip_gradients,
     de_parallel,
     model_info,
     reshape_classifier_output,
@@ -227,7 +228,7 @@ def train(opt, device):
 
             # Optimize
             scaler.unscale_(optimizer)  # unscale gradients
-            torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=10.0)  # clip gradients
+            clip_gradients(model, max_norm=10.0)  # clip gradients
             scaler.step(optimizer)
             scaler.update()
             optimizer.zero_grad()
@@ -46,7 +46,8 @@ ROOT = Path(os.path.relpath(ROOT, Path.cwd()))  # relative
 from ultralytics.utils.plotting import Annotator, colors, save_one_box
 
 from models.common import DetectMultiBackend
-from utils.dataloaders import IMG_FORMATS, VID_FORMATS, LoadImages, LoadScreenshots, LoadStreams
+from utils.autobatch import autobatch_inference
+from utils.dataloaders import IMG_FORMATS, VID_FORMATS, LoadImageBatches, LoadImages, LoadScreenshots, LoadStreams
 from utils.general import (
     LOGGER,
     Profile,
@@ -97,6 +98,14 @@ def run(
     half=False,  # use FP16 half-precision inference
     dnn=False,  # use OpenCV DNN for ONNX inference
     vid_stride=1,  # video frame-rate stride
+    throughput=False,  # use OpenVINO THROUGHPUT mode with async infer requests
+    nireq=0,  # OpenVINO in-flight infer requests for --throughput, 0 for device optimal
+    threads=None,  # TFLite threads per interpreter, None for default
+    interpreters=1,  # TFLite interpreter pool size for concurrent batch images
+    compile=False,  # run PyTorch models through torch.compile
+    channels_last=False,  # run PyTorch models and inputs in torch.channels_last memory format
+    bf16=False,  # use bfloat16 autocast inference for PyTorch models
+    batch_size=1,  # batch size for image sources, -1 for highest throughput
 ):
     """
     Runs YOLOv5 detection inference on various sources like images, videos, directories, streams, etc.
@@ -133,6 +142,19 @@ def run(
         half (bool): If True, use FP16 half-precision inference. Default is False.
         dnn (bool): If True, use OpenCV DNN backend for ONNX inference. Default is False.
         vid_stride (int): Stride for processing video frames, to skip frames between processing. Default is 1.
+        throughput (bool): If True, run OpenVINO models in THROUGHPUT mode with an async infer request queue. Default is
+            False.
+        nireq (int): Number of in-flight OpenVINO infer requests in throughput mode, 0 for the device optimal number.
+            Default is 0.
+        threads (int | None): Number of threads per TFLite interpreter, None for the runtime default. Default is None.
+        interpreters (int): Size of the TFLite interpreter pool used to run batch images concurrently. Default is 1.
+        compile (bool): If True, run PyTorch models through torch.compile with a persistent kernel cache. Default is
+            False.
+        channels_last (bool): If True, run PyTorch models and inputs in torch.channels_last (NHWC) memory format.
+            Default is False.
+        bf16 (bool): If True, run PyTorch models under bfloat16 autocast on CPU or CUDA. Default is False.
+        batch_size (int): Images per inference batch for image sources, letterboxed to the full `imgsz`. -1 sweeps for
+            the highest throughput batch size of the model format. Default is 1.
 
     Returns:
         None
@@ -163,7 +185,20 @@ def run(
 
     # Load model
     device = select_device(device)
-    model = DetectMultiBackend(weights, device=device, dnn=dnn, data=data, fp16=half)
+    model = DetectMultiBackend(
+        weights,
+        device=device,
+        dnn=dnn,
+        data=data,
+        fp16=half,
+        throughput=throughput,
+        nireq=nireq,
+        threads=threads,
+        interpreters=interpreters,
+        compile=compile,
+        channels_last=channels_last,
+        bf16=bf16,
+    )
     stride, names, pt = model.stride, model.names, model.pt
     imgsz = check_img_size(imgsz, s=stride)  # check image size
 
@@ -177,6 +212,11 @@ def run(
         dataset = LoadScreenshots(source, img_size=imgsz, stride=stride, auto=pt)
     else:
         dataset = LoadImages(source, img_size=imgsz, stride=stride, auto=pt, vid_stride=vid_stride)
+        if batch_size != 1 and not any(dataset.video_flag):  # batched images
+            bs = autobatch_inference(model, imgsz) if batch_size == -1 else batch_size
+            if bs > 1:  # AutoBatch may pick batch-size 1
+                dataset = LoadImageBatches(source, img_size=imgsz, stride=stride, batch_size=bs)
+    batched = isinstance(dataset, LoadImageBatches)
     vid_path, vid_writer = [None] * bs, [None] * bs
 
     # Run inference
@@ -189,22 +229,13 @@ def run(
             im /= 255  # 0 - 255 to 0.0 - 1.0
             if len(im.shape) == 3:
                 im = im[None]  # expand for batch dim
-            if model.xml and im.shape[0] > 1:
-                ims = torch.chunk(im, im.shape[0], 0)
 
         # Inference
         with dt[1]:
-            visualize = increment_path(save_dir / Path(path).stem, mkdir=True) if visualize else False
-            if model.xml and im.shape[0] > 1:
-                pred = None
-                for image in ims:
-                    if pred is None:
-                        pred = model(image, augment=augment, visualize=visualize).unsqueeze(0)
-                    else:
-                        pred = torch.cat((pred, model(image, augment=augment, visualize=visualize).unsqueeze(0)), dim=0)
-                pred = [pred, None]
-            else:
-                pred = model(im, augment=augment, visualize=visualize)
+            visualize = (
+                increment_path(save_dir / Path(path[0] if batched else path).stem, mkdir=True) if visualize else False
+            )
+            pred = model(im, augment=augment, visualize=visualize)  # OpenVINO splits batches into model-sized requests
         # NMS
         with dt[2]:
             pred = non_max_suppression(pred, conf_thres, iou_thres, classes, agnostic_nms, max_det=max_det)
@@ -229,7 +260,7 @@ def run(
         # Process predictions
         for i, det in enumerate(pred):  # per image
             seen += 1
-            if webcam:  # batch_size >= 1
+            if webcam or batched:  # batch_size >= 1
                 p, im0, frame = path[i], im0s[i].copy(), dataset.count
                 s += f"{i}: "
             else:
@@ -355,6 +386,15 @@ def parse_opt():
         --dnn (bool, optional): Flag to use OpenCV DNN for ONNX inference. Defaults to False.
         --vid-stride (int, optional): Video frame-rate stride, determining the number of frames to skip in between
             consecutive frames. Defaults to 1.
+        --throughput (bool, optional): Use OpenVINO THROUGHPUT mode with async infer requests. Defaults to False.
+        --nireq (int, optional): OpenVINO in-flight requests for --throughput, 0 for device optimal. Defaults to 0.
+        --threads (int, optional): Threads per TFLite interpreter. Defaults to None (runtime default).
+        --interpreters (int, optional): TFLite interpreter pool size for concurrent batch images. Defaults to 1.
+        --compile (bool, optional): Flag to run PyTorch models through torch.compile. Defaults to False.
+        --channels-last (bool, optional): Flag to run PyTorch models and inputs in torch.channels_last memory format.
+            Defaults to False.
+        --bf16 (bool, optional): Flag to run PyTorch models under bfloat16 autocast. Defaults to False.
+        --batch-size (int, optional): Batch size for image sources, -1 for highest throughput. Defaults to 1.
 
     Returns:
         argparse.Namespace: Parsed command-line arguments as an argparse.Namespace object.
@@ -400,6 +440,14 @@ def parse_opt():
     parser.add_argument("--half", action="store_true", help="use FP16 half-precision inference")
     parser.add_argument("--dnn", action="store_true", help="use OpenCV DNN for ONNX inference")
     parser.add_argument("--vid-stride", type=int, default=1, help="video frame-rate stride")
+    parser.add_argument("--throughput", action="store_true", help="OpenVINO THROUGHPUT mode with async infer requests")
+    parser.add_argument("--nireq", type=int, default=0, help="OpenVINO --throughput infer requests, 0 for optimal")
+    parser.add_argument("--threads", type=int, default=None, help="TFLite threads per interpreter")
+    parser.add_argument("--interpreters", type=int, default=1, help="TFLite interpreter pool size")
+    parser.add_argument("--compile", action="store_true", help="torch.compile PyTorch models")
+    parser.add_argument("--channels-last", action="store_true", help="torch.channels_last PyTorch models and inputs")
+    parser.add_argument("--bf16", action="store_true", help="bfloat16 autocast inference for PyTorch models")
+    parser.add_argument("--batch-size", type=int, default=1, help="batch size for images, -1 for highest throughput")
     opt = parser.parse_args()
     opt.imgsz *= 2 if len(opt.imgsz) == 1 else 1  # expand
     print_args(vars(opt))
@@ -226,15 +226,18 @@ def try_export(inner_func):
 
 
 @try_export
-def export_torchscript(model, im, file, optimize, prefix=colorstr("TorchScript:")):
+def export_torchscript(model, im, file, optimize, int8=False, data=None, ncalib=100, prefix=colorstr("TorchScript:")):
     """
-    Export a YOLOv5 model to the TorchScript format.
+    Export a YOLOv5 model to the TorchScript format, optionally with PyTorch static INT8 quantization for CPU.
 
     Args:
         model (torch.nn.Module): The YOLOv5 model to be exported.
         im (torch.Tensor): Example input tensor to be used for tracing the TorchScript model.
         file (Path): File path where the exported TorchScript model will be saved.
         optimize (bool): If True, applies optimizations for mobile deployment.
+        int8 (bool): If True, applies FX graph mode static INT8 post-training quantization. Default is False.
+        data (str): Dataset YAML whose 'val' split is used for INT8 calibration. Default is None.
+        ncalib (int): Number of calibration batches for INT8 quantization. Default is 100.
         prefix (str): Optional prefix for log messages. Default is 'TorchScript:'.
 
     Returns:
@@ -247,6 +250,8 @@ def export_torchscript(model, im, file, optimize, prefix=colorstr("TorchScript:"
         - Metadata, including the input image shape, model stride, and class names, is saved in an extra file (`config.txt`)
           within the TorchScript model package.
         - For mobile optimization, refer to the PyTorch tutorial: https://pytorch.org/tutorials/recipes/mobile_interpreter.html
+        - INT8 models keep the Detect() head in float, are saved as '*-int8.torchscript' and run on CPU only with the
+          quantized engine (x86 or qnnpack) they were exported with.
 
     Example:
         ```python
@@ -270,9 +275,31 @@ def export_torchscript(model, im, file, optimize, prefix=colorstr("TorchScript:"
     """
     LOGGER.info(f"\n{prefix} starting export with torch {torch.__version__}...")
     f = file.with_suffix(".torchscript")
+    d = {"shape": im.shape, "stride": int(max(model.stride)), "names": model.names}
+
+    if int8:
+        assert im.device.type == "cpu", "--int8 TorchScript export requires --device cpu"
+        from utils.dataloaders import create_dataloader
+        from utils.torch_utils import convert_int8, prepare_int8
+
+        if not isinstance(model, torch.fx.GraphModule):  # post-training quantization, QAT models are converted directly
+            dataloader = create_dataloader(
+                check_dataset(check_yaml(data))["val"],
+                imgsz=max(im.shape[2:]),
+                batch_size=im.shape[0],
+                stride=d["stride"],
+                pad=0.5,
+            )[0]
+            LOGGER.info(f"{prefix} calibrating INT8 on {min(ncalib, len(dataloader))} batches from {data}...")
+            model = prepare_int8(model, im)
+            for i, (ims, *_) in enumerate(dataloader):
+                if i >= ncalib:
+                    break
+                model(ims.float() / 255)  # uint8 to fp32, 0-255 to 0.0-1.0
+        model = convert_int8(model)
+        f = file.with_name(f"{file.stem}-int8.torchscript")
 
     ts = torch.jit.trace(model, im, strict=False)
-    d = {"shape": im.shape, "stride": int(max(model.stride)), "names": model.names}
     extra_files = {"config.txt": json.dumps(d)}  # torch._C.ExtraFilesMap()
     if optimize:  # https://pytorch.org/tutorials/recipes/mobile_interpreter.html
         optimize_for_mobile(ts)._save_for_lite_interpreter(str(f), _extra_files=extra_files)
@@ -1285,7 +1312,8 @@ def run(
     inplace=False,  # set YOLOv5 Detect() inplace=True
     keras=False,  # use Keras
     optimize=False,  # TorchScript: optimize for mobile
-    int8=False,  # CoreML/TF INT8 quantization
+    int8=False,  # CoreML/TF/OpenVINO/TorchScript INT8 quantization
+    ncalib=100,  # TorchScript INT8: calibration batches
     per_tensor=False,  # TF per tensor quantization
     dynamic=False,  # ONNX/TF/TensorRT: dynamic axes
     cache="",  # TensorRT: timing cache path
@@ -1315,7 +1343,8 @@ def run(
         inplace (bool): Set the YOLOv5 Detect() module inplace=True. Default is False.
         keras (bool): Flag to use Keras for TensorFlow SavedModel export. Default is False.
         optimize (bool): Optimize TorchScript model for mobile deployment. Default is False.
-        int8 (bool): Apply INT8 quantization for CoreML or TensorFlow models. Default is False.
+        int8 (bool): Apply INT8 quantization for CoreML, TensorFlow, OpenVINO or TorchScript models. Default is False.
+        ncalib (int): Number of 'val' batches used to calibrate TorchScript INT8 quantization. Default is 100.
         per_tensor (bool): Apply per tensor quantization for TensorFlow models. Default is False.
         dynamic (bool): Enable dynamic axes for ONNX, TensorFlow, or TensorRT exports. Default is False.
         cache (str): TensorRT timing cache path. Default is an empty string.
@@ -1415,7 +1444,7 @@ def run(
     f = [""] * len(fmts)  # exported filenames
     warnings.filterwarnings(action="ignore", category=torch.jit.TracerWarning)  # suppress TracerWarning
     if jit:  # TorchScript
-        f[0], _ = export_torchscript(model, im, file, optimize)
+        f[0], _ = export_torchscript(model, im, file, optimize, int8, data, ncalib)
     if engine:  # TensorRT required before ONNX
         f[1], _ = export_engine(model, im, file, half, dynamic, simplify, workspace, verbose, cache)
     if onnx or xml:  # OpenVINO requires ONNX
@@ -1509,7 +1538,8 @@ def parse_opt(known=False):
     parser.add_argument("--inplace", action="store_true", help="set YOLOv5 Detect() inplace=True")
     parser.add_argument("--keras", action="store_true", help="TF: use Keras")
     parser.add_argument("--optimize", action="store_true", help="TorchScript: optimize for mobile")
-    parser.add_argument("--int8", action="store_true", help="CoreML/TF/OpenVINO INT8 quantization")
+    parser.add_argument("--int8", action="store_true", help="CoreML/TF/OpenVINO/TorchScript INT8 quantization")
+    parser.add_argument("--ncalib", type=int, default=100, help="TorchScript INT8: calibration batches")
     parser.add_argument("--per-tensor", action="store_true", help="TF per-tensor quantization")
     parser.add_argument("--dynamic", action="store_true", help="ONNX/TF/TensorRT: dynamic axes")
     parser.add_argument("--cache", type=str, default="", help="TensorRT: timing cache file path")
@@ -13,7 +13,7 @@ Usage:
 import torch
 
 
-def _create(name, pretrained=True, channels=3, classes=80, autoshape=True, verbose=True, device=None):
+def _create(name, pretrained=True, channels=3, classes=80, autoshape=True, verbose=True, device=None, **kwargs):
     """
     Creates or loads a YOLOv5 model, with options for pretrained weights and model customization.
 
@@ -26,6 +26,8 @@ def _create(name, pretrained=True, channels=3, classes=80, autoshape=True, verbo
         verbose (bool, optional): If True, prints detailed information during the model creation/loading process. Defaults to True.
         device (str | torch.device | None, optional): Device to use for model parameters (e.g., 'cpu', 'cuda'). If None, selects
             the best available device. Defaults to None.
+        **kwargs: Additional DetectMultiBackend arguments for pretrained models, i.e. `throughput=True, nireq=4` for
+            OpenVINO THROUGHPUT mode inference.
 
     Returns:
         (DetectMultiBackend | AutoShape): The loaded YOLOv5 model, potentially wrapped with AutoShape if specified.
@@ -67,7 +69,7 @@ def _create(name, pretrained=True, channels=3, classes=80, autoshape=True, verbo
         device = select_device(device)
         if pretrained and channels == 3 and classes == 80:
             try:
-                model = DetectMultiBackend(path, device=device, fuse=autoshape)  # detection model
+                model = DetectMultiBackend(path, device=device, fuse=autoshape, **kwargs)  # detection model
                 if autoshape:
                     if model.pt and isinstance(model.model, ClassificationModel):
                         LOGGER.warning(
@@ -103,7 +105,7 @@ def _create(name, pretrained=True, channels=3, classes=80, autoshape=True, verbo
         raise Exception(s) from e
 
 
-def custom(path="path/to/model.pt", autoshape=True, _verbose=True, device=None):
+def custom(path="path/to/model.pt", autoshape=True, _verbose=True, device=None, **kwargs):
     """
     Loads a custom or local YOLOv5 model from a given path with optional autoshaping and device specification.
 
@@ -115,6 +117,7 @@ def custom(path="path/to/model.pt", autoshape=True, _verbose=True, device=None):
             (default is True).
         device (str | torch.device | None): Device to load the model on, e.g., 'cpu', 'cuda', torch.device('cuda:0'), etc.
             (default is None, which automatically selects the best available device).
+        **kwargs: Additional DetectMultiBackend arguments, e.g. `throughput=True` for OpenVINO THROUGHPUT mode.
 
     Returns:
         torch.nn.Module: A YOLOv5 model loaded with the specified parameters.
@@ -130,9 +133,12 @@ def custom(path="path/to/model.pt", autoshape=True, _verbose=True, device=None):
 
         # Load model from a local path without autoshape on the CPU device
         model = torch.hub.load('.', 'custom', 'yolov5s.pt', source='local', autoshape=False, device='cpu')
+
+        # Load an OpenVINO model with 4 in-flight async infer requests
+        model = torch.hub.load('.', 'custom', 'yolov5s_openvino_model', source='local', throughput=True, nireq=4)
         ```
     """
-    return _create(path, autoshape=autoshape, verbose=_verbose, device=device)
+    return _create(path, autoshape=autoshape, verbose=_verbose, device=device, **kwargs)
 
 
 def yolov5n(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None):
@@ -5,12 +5,15 @@ import ast
 import contextlib
 import json
 import math
+import os
 import platform
 import warnings
 import zipfile
 from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from copy import copy
 from pathlib import Path
+from queue import Queue
 from urllib.parse import urlparse
 
 import cv2
@@ -28,8 +31,6 @@ try:
 
     assert hasattr(ultralytics, "__version__")  # verify package is not directory
 except (ImportError, AssertionError):
-    import os
-
     os.system("pip install -U ultralytics")
     import ultralytics
 
@@ -54,7 +55,14 @@ from utils.general import (
     xyxy2xywh,
     yaml_load,
 )
-from utils.torch_utils import copy_attr, smart_inference_mode
+from utils.torch_utils import (
+    copy_attr,
+    is_compiling,
+    profile_compile,
+    smart_autocast,
+    smart_compile,
+    smart_inference_mode,
+)
 
 
 def autopad(k, p=None, d=1):
@@ -309,6 +317,8 @@ class SPP(nn.Module):
         tensor.
         """
         x = self.cv1(x)
+        if is_compiling():  # catch_warnings() breaks torch.compile graphs
+            return self.cv2(torch.cat([x] + [m(x) for m in self.m], 1))
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")  # suppress torch 1.9.0 max_pool2d() warning
             return self.cv2(torch.cat([x] + [m(x) for m in self.m], 1))
@@ -333,11 +343,17 @@ class SPPF(nn.Module):
     def forward(self, x):
         """Processes input through a series of convolutions and max pooling operations for feature extraction."""
         x = self.cv1(x)
+        if is_compiling():  # catch_warnings() breaks torch.compile graphs
+            return self._pool(x)
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")  # suppress torch 1.9.0 max_pool2d() warning
-            y1 = self.m(x)
-            y2 = self.m(y1)
-            return self.cv2(torch.cat((x, y1, y2, self.m(y2)), 1))
+            return self._pool(x)
+
+    def _pool(self, x):
+        """Concatenates `x` with three chained max pools and fuses them with cv2."""
+        y1 = self.m(x)
+        y2 = self.m(y1)
+        return self.cv2(torch.cat((x, y1, y2, self.m(y2)), 1))
 
 
 class Focus(nn.Module):
@@ -459,8 +475,35 @@ class Concat(nn.Module):
 class DetectMultiBackend(nn.Module):
     """YOLOv5 MultiBackend class for inference on various backends including PyTorch, ONNX, TensorRT, and more."""
 
-    def __init__(self, weights="yolov5s.pt", device=torch.device("cpu"), dnn=False, data=None, fp16=False, fuse=True):
-        """Initializes DetectMultiBackend with support for various inference backends, including PyTorch and ONNX."""
+    def __init__(
+        self,
+        weights="yolov5s.pt",
+        device=torch.device("cpu"),
+        dnn=False,
+        data=None,
+        fp16=False,
+        fuse=True,
+        throughput=False,
+        nireq=0,
+        threads=None,
+        interpreters=1,
+        compile=False,
+        channels_last=False,
+        bf16=False,
+    ):
+        """
+        Initializes DetectMultiBackend with support for various inference backends, including PyTorch and ONNX.
+
+        PyTorch models accept `compile=True` to run through `torch.compile` with a persistent on-disk kernel cache,
+        falling back to eager mode where compilation fails, and `channels_last=True` to run model and inputs in
+        torch.channels_last (NHWC) memory format for faster oneDNN/cuDNN convolutions. `bf16=True` runs PyTorch models
+        under bfloat16 autocast on CPU or CUDA, i.e. on CPUs with AVX-512-BF16 or AMX, returning FP32 detections.
+
+        OpenVINO models accept `throughput=True` to compile with the THROUGHPUT performance hint and run batches through
+        an `AsyncInferQueue` of `nireq` in-flight requests (0 for the device optimal number). TFLite models accept
+        `threads` per interpreter (also used by the default XNNPACK delegate) and a pool of `interpreters` that run the
+        images of a batch concurrently.
+        """
         #   PyTorch:              weights = *.pt
         #   TorchScript:                    *.torchscript
         #   ONNX Runtime:                   *.onnx
@@ -479,6 +522,8 @@ class DetectMultiBackend(nn.Module):
         w = str(weights[0] if isinstance(weights, list) else weights)
         pt, jit, onnx, xml, engine, coreml, saved_model, pb, tflite, edgetpu, tfjs, paddle, triton = self._model_type(w)
         fp16 &= pt or jit or onnx or engine or triton  # FP16
+        channels_last &= pt  # torch.channels_last memory format
+        bf16 &= pt  # bfloat16 autocast
         nhwc = coreml or saved_model or pb or tflite or edgetpu  # BHWC formats (vs torch BCWH)
         stride = 32  # default stride
         cuda = torch.cuda.is_available() and device.type != "cpu"  # use CUDA
@@ -490,6 +535,10 @@ class DetectMultiBackend(nn.Module):
             stride = max(int(model.stride.max()), 32)  # model stride
             names = model.module.names if hasattr(model, "module") else model.names  # get class names
             model.half() if fp16 else model.float()
+            if channels_last:
+                model.to(memory_format=torch.channels_last)
+            if compile:
+                model = smart_compile(model)  # rect batch shapes recompile once with dynamic H/W
             self.model = model  # explicitly assign for to(), cpu(), cuda(), half()
         elif jit:  # TorchScript
             LOGGER.info(f"Loading {w} for TorchScript inference...")
@@ -531,7 +580,22 @@ class DetectMultiBackend(nn.Module):
             batch_dim = get_batch(ov_model)
             if batch_dim.is_static:
                 batch_size = batch_dim.get_length()
-            ov_compiled_model = core.compile_model(ov_model, device_name="AUTO")  # AUTO selects best available device
+            if throughput:  # THROUGHPUT hint, batches split across a queue of asynchronous infer requests
+                from openvino.runtime import AsyncInferQueue
+
+                config = {"PERFORMANCE_HINT": "THROUGHPUT"}
+                ov_compiled_model = core.compile_model(ov_model, device_name="AUTO", config=config)
+                ov_queue = AsyncInferQueue(ov_compiled_model, nireq)  # nireq=0 for device optimal number of requests
+                ov_results = {}  # outputs of completed requests by submission index
+
+                def ov_callback(request, userdata):
+                    """Copies a completed OpenVINO infer request's outputs into `ov_results` at index `userdata`."""
+                    ov_results[userdata] = [x.copy() for x in request.results.values()]
+
+                ov_queue.set_callback(ov_callback)
+                LOGGER.info(f"Using OpenVINO THROUGHPUT mode with {len(ov_queue)} infer requests")
+            else:
+                ov_compiled_model = core.compile_model(ov_model, device_name="AUTO")  # AUTO selects best device
             stride, names = self._load_metadata(Path(w).with_suffix(".yaml"))  # load metadata
         elif engine:  # TensorRT
             LOGGER.info(f"Loading {w} for TensorRT inference...")
@@ -629,13 +693,23 @@ class DetectMultiBackend(nn.Module):
                 delegate = {"Linux": "libedgetpu.so.1", "Darwin": "libedgetpu.1.dylib", "Windows": "edgetpu.dll"}[
                     platform.system()
                 ]
-                interpreter = Interpreter(model_path=w, experimental_delegates=[load_delegate(delegate)])
+                interpreters = [Interpreter(model_path=w, experimental_delegates=[load_delegate(delegate)])]
             else:  # TFLite
                 LOGGER.info(f"Loading {w} for TensorFlow Lite inference...")
-                interpreter = Interpreter(model_path=w)  # load TFLite model
-            interpreter.allocate_tensors()  # allocate
+                interpreters = max(interpreters, 1)  # pool size
+                if threads is None and interpreters > 1:
+                    threads = max((os.cpu_count() or 1) // interpreters, 1)  # split CPU cores across the pool
+                interpreters = [Interpreter(model_path=w, num_threads=threads) for _ in range(interpreters)]
+                LOGGER.info(f"Using {len(interpreters)} TFLite interpreters with {threads or 'default'} threads each")
+            for interpreter in interpreters:
+                interpreter.allocate_tensors()  # allocate
             input_details = interpreter.get_input_details()  # inputs
             output_details = interpreter.get_output_details()  # outputs
+            int8 = input_details[0]["dtype"] == np.uint8  # is TFLite quantized uint8 model
+            tflite_idle = Queue()  # interpreters not currently running an invoke
+            for interpreter in interpreters:
+                tflite_idle.put(interpreter)
+            tflite_pool = ThreadPoolExecutor(len(interpreters)) if len(interpreters) > 1 else None
             # load metadata
             with contextlib.suppress(zipfile.BadZipFile):
                 with zipfile.ZipFile(w, "r") as model:
@@ -693,11 +767,14 @@ class DetectMultiBackend(nn.Module):
         b, ch, h, w = im.shape  # batch, channel, height, width
         if self.fp16 and im.dtype != torch.float16:
             im = im.half()  # to FP16
+        if self.channels_last:
+            im = im.contiguous(memory_format=torch.channels_last)  # NCHW shape with NHWC strides
         if self.nhwc:
             im = im.permute(0, 2, 3, 1)  # torch BCHW to numpy BHWC shape(1,320,192,3)
 
         if self.pt:  # PyTorch
-            y = self.model(im, augment=augment, visualize=visualize) if augment or visualize else self.model(im)
+            with smart_autocast(self.device, bf16=self.bf16):
+                y = self.model(im, augment=augment, visualize=visualize) if augment or visualize else self.model(im)
         elif self.jit:  # TorchScript
             y = self.model(im)
         elif self.dnn:  # ONNX OpenCV DNN
@@ -709,7 +786,16 @@ class DetectMultiBackend(nn.Module):
             y = self.session.run(self.output_names, {self.session.get_inputs()[0].name: im})
         elif self.xml:  # OpenVINO
             im = im.cpu().numpy()  # FP32
-            y = list(self.ov_compiled_model(im).values())
+            n = self.batch_size if self.batch_dim.is_static else 1 if self.throughput else b  # images per request
+            ims = [im[i : i + n] for i in range(0, b, n)]  # split batch into model-sized chunks
+            if self.throughput:  # in-flight async requests, results collected in submission order
+                for i, x in enumerate(ims):
+                    self.ov_queue.start_async(x, userdata=i)
+                self.ov_queue.wait_all()
+                y = [self.ov_results.pop(i) for i in range(len(ims))]
+            else:
+                y = [list(self.ov_compiled_model(x).values()) for x in ims]
+            y = y[0] if len(y) == 1 else [np.concatenate(x, 0) for x in zip(*y)]
         elif self.engine:  # TensorRT
             if self.dynamic and im.shape != self.bindings["images"].shape:
                 i = self.model.get_binding_index("images")
@@ -748,20 +834,13 @@ class DetectMultiBackend(nn.Module):
             elif self.pb:  # GraphDef
                 y = self.frozen_func(x=self.tf.constant(im))
             else:  # Lite or Edge TPU
-                input = self.input_details[0]
-                int8 = input["dtype"] == np.uint8  # is TFLite quantized uint8 model
-                if int8:
-                    scale, zero_point = input["quantization"]
-                    im = (im / scale + zero_point).astype(np.uint8)  # de-scale
-                self.interpreter.set_tensor(input["index"], im)
-                self.interpreter.invoke()
-                y = []
-                for output in self.output_details:
-                    x = self.interpreter.get_tensor(output["index"])
-                    if int8:
-                        scale, zero_point = output["quantization"]
-                        x = (x.astype(np.float32) - zero_point) * scale  # re-scale
-                    y.append(x)
+                n = self.input_details[0]["shape"][0]  # images per invoke
+                ims = [im[i : i + n] for i in range(0, b, n)]  # split batch into model-sized chunks
+                if self.tflite_pool and len(ims) > 1:  # concurrent invokes across the interpreter pool, in order
+                    y = list(self.tflite_pool.map(self._tflite_invoke, ims))
+                else:
+                    y = [self._tflite_invoke(x) for x in ims]
+                y = y[0] if len(y) == 1 else [np.concatenate(x, 0) for x in zip(*y)]
             if len(y) == 2 and len(y[1].shape) != 4:
                 y = list(reversed(y))
             y = [x if isinstance(x, np.ndarray) else x.numpy() for x in y]
@@ -772,6 +851,27 @@ class DetectMultiBackend(nn.Module):
         else:
             return self.from_numpy(y)
 
+    def _tflite_invoke(self, im):
+        """Runs one TFLite invoke on an idle pooled interpreter, (de)quantizing inputs and outputs of int8 models."""
+        interpreter = self.tflite_idle.get()  # blocks until an interpreter is free
+        try:
+            input = self.input_details[0]
+            if self.int8:
+                scale, zero_point = input["quantization"]
+                im = (im / scale + zero_point).astype(np.uint8)  # de-scale
+            interpreter.tensor(input["index"])()[:] = im  # write into the allocated input tensor in place
+            interpreter.invoke()
+            y = []
+            for output in self.output_details:
+                x = interpreter.get_tensor(output["index"])  # copy, buffer is reused by the next invoke
+                if self.int8:
+                    scale, zero_point = output["quantization"]
+                    x = (x.astype(np.float32) - zero_point) * scale  # re-scale
+                y.append(x)
+        finally:
+            self.tflite_idle.put(interpreter)
+        return y
+
     def from_numpy(self, x):
         """Converts a NumPy array to a torch tensor, maintaining device compatibility."""
         return torch.from_numpy(x).to(self.device) if isinstance(x, np.ndarray) else x
@@ -779,7 +879,10 @@ class DetectMultiBackend(nn.Module):
     def warmup(self, imgsz=(1, 3, 640, 640)):
         """Performs a single inference warmup to initialize model weights, accepting an `imgsz` tuple for image size."""
         warmup_types = self.pt, self.jit, self.onnx, self.engine, self.saved_model, self.pb, self.triton
-        if any(warmup_types) and (self.device.type != "cpu" or self.triton):
+        if self.pt and self.compile:  # compile at warmup, report compile time vs speedup
+            im = torch.zeros(*imgsz, dtype=torch.half if self.fp16 else torch.float, device=self.device)  # input
+            profile_compile(self.model, im)
+        elif any(warmup_types) and (self.device.type != "cpu" or self.triton):
             im = torch.empty(*imgsz, dtype=torch.half if self.fp16 else torch.float, device=self.device)  # input
             for _ in range(2 if self.jit else 1):  #
                 self.forward(im)  # warmup
@@ -900,8 +1003,10 @@ class AutoShape(nn.Module):
                 ims[i] = im if im.data.contiguous else np.ascontiguousarray(im)  # update
             shape1 = [make_divisible(x, self.stride) for x in np.array(shape1).max(0)]  # inf shape
             x = [letterbox(im, shape1, auto=False)[0] for im in ims]  # pad
-            x = np.ascontiguousarray(np.array(x).transpose((0, 3, 1, 2)))  # stack and BHWC to BCHW
-            x = torch.from_numpy(x).to(p.device).type_as(p) / 255  # uint8 to fp16/32
+            x = torch.from_numpy(np.array(x)).permute(0, 3, 1, 2)  # stack and BHWC to BCHW, channels_last strides
+            nhwc = p.dim() == 4 and p.is_contiguous(memory_format=torch.channels_last)  # channels_last model
+            x = x.contiguous(memory_format=torch.channels_last if nhwc else torch.contiguous_format)
+            x = x.to(p.device).type_as(p) / 255  # uint8 to fp16/32
 
         with amp.autocast(autocast):
             # Inference
@@ -8,6 +8,7 @@ import torch
 import torch.nn as nn
 
 from utils.downloads import attempt_download
+from utils.torch_utils import load_qat
 
 
 class Sum(nn.Module):
@@ -97,6 +98,8 @@ def attempt_load(weights, device=None, inplace=True, fuse=True):
     for w in weights if isinstance(weights, list) else [weights]:
         ckpt = torch.load(attempt_download(w), map_location="cpu")  # load
         ckpt = (ckpt.get("ema") or ckpt["model"]).to(device).float()  # FP32 model
+        if hasattr(ckpt, "qat"):  # INT8 quantization-aware trained model
+            ckpt = load_qat(ckpt)
 
         # Model compatibility updates
         if not hasattr(ckpt, "stride"):
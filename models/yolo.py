@@ -209,9 +209,13 @@ class BaseModel(nn.Module):
         m = self.model[-1]  # Detect()
         if isinstance(m, (Detect, Segment)):
             m.stride = fn(m.stride)
-            m.grid = list(map(fn, m.grid))
-            if isinstance(m.anchor_grid, list):
-                m.anchor_grid = list(map(fn, m.anchor_grid))
+            if any(g.dim() == 5 for g in m.grid):  # rank-5 grids reject to(memory_format=torch.channels_last)
+                m.grid = [torch.empty(0, device=m.stride.device) for _ in m.grid]  # rebuilt on next inference
+                m.anchor_grid = [torch.empty(0, device=m.stride.device) for _ in m.grid]
+            else:
+                m.grid = list(map(fn, m.grid))
+                if isinstance(m.anchor_grid, list):
+                    m.anchor_grid = list(map(fn, m.anchor_grid))
         return self
 
 
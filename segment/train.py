@@ -81,6 +81,7 @@ from utils.segment.plots import plot_images_and_masks, plot_results_with_masks
 from utils.torch_utils import (
     EarlyStopping,
     ModelEMA,
+    clip_gradients,
     de_parallel,
     select_device,
     smart_DDP,
@@ -394,7 +395,7 @@ def train(hyp, opt, device, callbacks):
             # Optimize - https://pytorch.org/docs/master/notes/amp_examples.html
             if ni - last_opt_step >= accumulate:
                 scaler.unscale_(optimizer)  # unscale gradients
-                torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=10.0)  # clip gradients
+                clip_gradients(model, max_norm=10.0)  # clip gradients
                 scaler.step(optimizer)  # optimizer.step
                 scaler.update()
                 optimizer.zero_grad()
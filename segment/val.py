@@ -61,7 +61,7 @@ from utils.general import (
     xywh2xyxy,
     xyxy2xywh,
 )
-from utils.metrics import ConfusionMatrix, box_iou
+from utils.metrics import ConfusionMatrix, box_iou, match_predictions
 from utils.plots import output_to_target, plot_val_study
 from utils.segment.dataloaders import create_dataloader
 from utils.segment.general import mask_iou, process_mask, process_mask_native, scale_image
@@ -136,19 +136,7 @@ def process_batch(detections, labels, iouv, pred_masks=None, gt_masks=None, over
     else:  # boxes
         iou = box_iou(labels[:, 1:], detections[:, :4])
 
-    correct = np.zeros((detections.shape[0], iouv.shape[0])).astype(bool)
-    correct_class = labels[:, 0:1] == detections[:, 5]
-    for i in range(len(iouv)):
-        x = torch.where((iou >= iouv[i]) & correct_class)  # IoU > threshold and classes match
-        if x[0].shape[0]:
-            matches = torch.cat((torch.stack(x, 1), iou[x[0], x[1]][:, None]), 1).cpu().numpy()  # [label, detect, iou]
-            if x[0].shape[0] > 1:
-                matches = matches[matches[:, 2].argsort()[::-1]]
-                matches = matches[np.unique(matches[:, 1], return_index=True)[1]]
-                # matches = matches[matches[:, 2].argsort()[::-1]]
-                matches = matches[np.unique(matches[:, 0], return_index=True)[1]]
-            correct[matches[:, 1].astype(int), i] = True
-    return torch.tensor(correct, dtype=torch.bool, device=iouv.device)
+    return match_predictions(iou, labels[:, 0:1] == detections[:, 5], iouv)  # all IoU thresholds at once
 
 
 @smart_inference_mode()
@@ -15,14 +15,18 @@ Tutorial:   https://docs.ultralytics.com/yolov5/tutorials/train_custom_data
 """
 
 import argparse
+import contextlib
 import math
 import os
 import random
 import subprocess
 import sys
 import time
-from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from copy import copy, deepcopy
 from datetime import datetime, timedelta
+from functools import partial
+from itertools import islice
 from pathlib import Path
 
 try:
@@ -33,6 +37,7 @@ except ImportError:
 import numpy as np
 import torch
 import torch.distributed as dist
+import torch.multiprocessing as mp
 import torch.nn as nn
 import yaml
 from torch.optim import lr_scheduler
@@ -50,8 +55,9 @@ from models.yolo import Model
 from utils.autoanchor import check_anchors
 from utils.autobatch import check_train_batch_size
 from utils.callbacks import Callbacks
-from utils.dataloaders import create_dataloader
+from utils.dataloaders import ValCache, create_dataloader
 from utils.downloads import attempt_download, is_url
+from utils.evolve import load_evolve, propose
 from utils.general import (
     LOGGER,
     TQDM_BAR_FORMAT,
@@ -66,6 +72,7 @@ from utils.general import (
     check_yaml,
     colorstr,
     get_latest_run,
+    get_rng_states,
     increment_path,
     init_seeds,
     intersect_dicts,
@@ -75,22 +82,31 @@ from utils.general import (
     one_cycle,
     print_args,
     print_mutation,
+    set_rng_states,
     strip_optimizer,
     yaml_save,
 )
 from utils.loggers import LOGGERS, Loggers
 from utils.loggers.comet.comet_utils import check_comet_resume
-from utils.loss import ComputeLoss
+from utils.loss import ComputeLoss, TargetAssigner
 from utils.metrics import fitness
 from utils.plots import plot_evolve
+from utils.prune import prune_channels
 from utils.torch_utils import (
+    CheckpointWriter,
     EarlyStopping,
     ModelEMA,
+    clip_gradients,
     de_parallel,
+    dump_qat,
+    prepare_int8,
     select_device,
+    smart_autocast,
+    smart_compile,
     smart_DDP,
     smart_optimizer,
     smart_resume,
+    smart_sync,
     torch_distributed_zero_first,
 )
 
@@ -134,6 +150,7 @@ def train(hyp, opt, device, callbacks):
         - Datasets: https://github.com/ultralytics/yolov5/tree/master/data
         - Tutorial: https://docs.ultralytics.com/yolov5/tutorials/train_custom_data
     """
+    t_setup = time.time()  # setup time, i.e. per evolution trial
     save_dir, epochs, batch_size, weights, single_cls, evolve, data, cfg, resume, noval, nosave, workers, freeze = (
         Path(opt.save_dir),
         opt.epochs,
@@ -221,7 +238,19 @@ def train(hyp, opt, device, callbacks):
         LOGGER.info(f"Transferred {len(csd)}/{len(model.state_dict())} items from {weights}")  # report
     else:
         model = Model(cfg, ch=3, nc=nc, anchors=hyp.get("anchors")).to(device)  # create
-    amp = check_amp(model)  # check AMP
+    if opt.prune and not resume:  # structured channel pruning, fine-tuned below
+        assert pretrained, "--prune requires pretrained --weights *.pt"
+        model = prune_channels(model, opt.prune, opt.prune_method, opt.imgsz).to(device)
+        yaml_save(save_dir / "pruned.yaml", model.yaml)
+    if opt.qat:  # quantization-aware training, fake-quantize folded Conv+BN layers
+        assert pretrained, "--qat requires pretrained --weights *.pt"
+        model = prepare_int8(model.train(), torch.zeros(1, 3, 64, 64, device=device), qat=True)
+        if hasattr(ckpt["model"], "qat"):  # QAT checkpoint, load fake-quant state
+            model.load_state_dict(ckpt["model"].qat)
+    assert not (opt.bf16 and opt.qat), "--bf16 and --qat are not compatible"
+    amp = False if opt.qat or opt.bf16 else check_amp(model)  # check AMP, QAT fake-quant runs in FP32
+    if opt.channels_last:  # NHWC weights, batches are collated to match
+        model.to(memory_format=torch.channels_last)
 
     # Freeze
     freeze = [f"model.{x}." for x in (freeze if len(freeze) > 1 else range(freeze[0]))]  # layers to freeze
@@ -245,7 +274,8 @@ def train(hyp, opt, device, callbacks):
     nbs = 64  # nominal batch size
     accumulate = max(round(nbs / batch_size), 1)  # accumulate loss before optimizing
     hyp["weight_decay"] *= batch_size * accumulate / nbs  # scale weight_decay
-    optimizer = smart_optimizer(model, opt.optimizer, hyp["lr0"], hyp["momentum"], hyp["weight_decay"])
+    zero = opt.zero and RANK != -1  # ZeRO-sharded optimizer state
+    optimizer = smart_optimizer(model, opt.optimizer, hyp["lr0"], hyp["momentum"], hyp["weight_decay"], zero=zero)
 
     # Scheduler
     if opt.cos_lr:
@@ -259,14 +289,16 @@ def train(hyp, opt, device, callbacks):
     scheduler = lr_scheduler.LambdaLR(optimizer, lr_lambda=lf)  # plot_lr_scheduler(optimizer, scheduler, epochs)
 
     # EMA
-    ema = ModelEMA(model) if RANK in {-1, 0} else None
+    ema = ModelEMA(model, every=opt.ema_every)  # on every rank for distributed validation
 
     # Resume
-    best_fitness, start_epoch = 0.0, 0
+    best_fitness, start_epoch, iteration = 0.0, 0, None
     if pretrained:
         if resume:
             best_fitness, start_epoch, epochs = smart_resume(ckpt, optimizer, ema, weights, epochs, resume)
+            iteration = ckpt.get("iteration")  # mid-epoch training state, saved with --save-iters
         del ckpt, csd
+    start_batch = iteration["batch"] if iteration else 0
 
     # DP mode
     if cuda and RANK == -1 and torch.cuda.device_count() > 1:
@@ -282,6 +314,7 @@ def train(hyp, opt, device, callbacks):
         LOGGER.info("Using SyncBatchNorm()")
 
     # Trainloader
+    m = de_parallel(model).model[-1]  # Detect()
     train_loader, dataset = create_dataloader(
         train_path,
         imgsz,
@@ -299,28 +332,37 @@ def train(hyp, opt, device, callbacks):
         prefix=colorstr("train: "),
         shuffle=True,
         seed=opt.seed,
+        channels_last=opt.channels_last,
+        resume=(start_epoch, start_batch) if opt.save_iters else None,  # exact batches for mid-epoch resumes
+        reuse=bool(evolve),  # evolution trials share datasets, image caches and workers
+        assigner=TargetAssigner(m.anchors, m.stride, hyp["anchor_t"]) if opt.worker_targets else None,
     )
     labels = np.concatenate(dataset.labels, 0)
     mlc = int(labels[:, 0].max())  # max label class
     assert mlc < nc, f"Label class {mlc} exceeds nc={nc} in {data}. Possible class labels are 0-{nc - 1}"
 
+    val_loader = create_dataloader(
+        val_path,
+        imgsz,
+        batch_size // WORLD_SIZE * 2,
+        gs,
+        single_cls,
+        hyp=hyp,
+        cache=None if noval else opt.cache,
+        rect=True,
+        rank=LOCAL_RANK,
+        workers=workers * 2,
+        pad=0.5,
+        prefix=colorstr("val: "),
+        channels_last=opt.channels_last,
+        reuse=bool(evolve),
+        shard=True,  # whole val batches split across DDP ranks
+    )[0]
+    if opt.val_cache:  # letterboxed val batches written on the first validation, memory-mapped after
+        val_loader = ValCache(val_loader, save_dir / f"val_batches_{os.getpid()}.bin")  # per DDP rank or evolve trial
+
     # Process 0
     if RANK in {-1, 0}:
-        val_loader = create_dataloader(
-            val_path,
-            imgsz,
-            batch_size // WORLD_SIZE * 2,
-            gs,
-            single_cls,
-            hyp=hyp,
-            cache=None if noval else opt.cache,
-            rect=True,
-            rank=-1,
-            workers=workers * 2,
-            pad=0.5,
-            prefix=colorstr("val: "),
-        )[0]
-
         if not resume:
             if not opt.noautoanchor:
                 check_anchors(dataset, model=model, thr=hyp["anchor_t"], imgsz=imgsz)  # run AutoAnchor
@@ -330,7 +372,10 @@ def train(hyp, opt, device, callbacks):
 
     # DDP mode
     if cuda and RANK != -1:
-        model = smart_DDP(model)
+        model = smart_DDP(model, comm_hook=opt.ddp_hook)
+
+    # torch.compile
+    forward = smart_compile(model, dynamic=True if opt.multi_scale else None) if opt.compile else model
 
     # Model attributes
     nl = de_parallel(model).model[-1].nl  # number of detection layers (to scale hyps)
@@ -354,12 +399,41 @@ def train(hyp, opt, device, callbacks):
     scheduler.last_epoch = start_epoch - 1  # do not move
     scaler = torch.cuda.amp.GradScaler(enabled=amp)
     stopper, stop = EarlyStopping(patience=opt.patience), False
+    rungs = halving_rungs(epochs, opt.evolve_halving) if evolve else []  # successive-halving validation epochs
+    writer = CheckpointWriter()  # background checkpoint saves
     compute_loss = ComputeLoss(model)  # init loss class
+    if train_loader.assigner:
+        train_loader.assigner.update(compute_loss.anchors, hyp["anchor_t"])  # anchors after AutoAnchor and DDP
+    last_save = start_epoch * nb + start_batch - 1  # last mid-epoch checkpoint iteration
+    if iteration:  # resume mid-epoch
+        accumulate, last_opt_step = iteration["accumulate"], iteration["last_opt_step"]
+        scaler.load_state_dict(iteration["scaler"])
+        set_rng_states(iteration["rng"][max(RANK, 0)])
+        LOGGER.info(f"Resuming epoch {start_epoch} from batch {start_batch}/{nb}")
+
+    def checkpoint(epoch, **kwargs):
+        """Returns a training checkpoint, saved in FP32 with --save-iters so resumes continue exactly, else FP16."""
+        dump = dump_qat if opt.qat else deepcopy  # QAT models are saved as FP32 models with fake-quant state
+        dtype = torch.float32 if opt.save_iters else torch.float16
+        return {
+            "epoch": epoch,
+            "best_fitness": best_fitness,
+            "model": dump(de_parallel(model)).to(dtype),
+            "ema": dump(ema.ema).to(dtype),
+            "updates": ema.updates,
+            "optimizer": optimizer.state_dict(),
+            "opt": vars(opt),
+            "git": GIT_INFO,  # {remote, branch, commit} if a git repo
+            "date": datetime.now().isoformat(),
+            **kwargs,
+        }
+
     callbacks.run("on_train_start")
     LOGGER.info(
         f"Image sizes {imgsz} train, {imgsz} val\n"
         f"Using {train_loader.num_workers * WORLD_SIZE} dataloader workers\n"
         f"Logging results to {colorstr('bold', save_dir)}\n"
+        f"Setup took {t0 - t_setup:.1f}s\n"
         f"Starting training for {epochs} epochs..."
     )
     for epoch in range(start_epoch, epochs):  # epoch ------------------------------------------------------------------
@@ -376,15 +450,15 @@ def train(hyp, opt, device, callbacks):
         # b = int(random.uniform(0.25 * imgsz, 0.75 * imgsz + gs) // gs * gs)
         # dataset.mosaic_border = [b - imgsz, -b]  # height, width borders
 
-        mloss = torch.zeros(3, device=device)  # mean losses
-        if RANK != -1:
+        mloss = iteration["mloss"].to(device) if start_batch else torch.zeros(3, device=device)  # mean losses
+        if RANK != -1 and not opt.save_iters:  # ResumableSampler advances epochs itself
             train_loader.sampler.set_epoch(epoch)
-        pbar = enumerate(train_loader)
+        pbar = enumerate(islice(train_loader, nb - start_batch), start_batch)  # resumed epochs start mid-epoch
         LOGGER.info(("\n" + "%11s" * 7) % ("Epoch", "GPU_mem", "box_loss", "obj_loss", "cls_loss", "Instances", "Size"))
         if RANK in {-1, 0}:
-            pbar = tqdm(pbar, total=nb, bar_format=TQDM_BAR_FORMAT)  # progress bar
+            pbar = tqdm(pbar, total=nb, initial=start_batch, bar_format=TQDM_BAR_FORMAT)  # progress bar
         optimizer.zero_grad()
-        for i, (imgs, targets, paths, _) in pbar:  # batch -------------------------------------------------------------
+        for i, (imgs, targets, paths, _, *assigned) in pbar:  # batch --------------------------------------------------
             callbacks.run("on_train_batch_start")
             ni = i + nb * epoch  # number integrated batches (since train start)
             imgs = imgs.to(device, non_blocking=True).float() / 255  # uint8 to float32, 0-255 to 0.0-1.0
@@ -409,9 +483,12 @@ def train(hyp, opt, device, callbacks):
                     imgs = nn.functional.interpolate(imgs, size=ns, mode="bilinear", align_corners=False)
 
             # Forward
-            with torch.cuda.amp.autocast(amp):
-                pred = model(imgs)  # forward
-                loss, loss_items = compute_loss(pred, targets.to(device))  # loss scaled by batch_size
+            sync = ni - last_opt_step >= accumulate  # DDP all-reduces gradients only of batches stepping the optimizer
+            with smart_sync(model, sync), smart_autocast(device, amp, opt.bf16):  # --bf16 needs no GradScaler
+                pred = forward(imgs)  # forward
+                if opt.bf16:
+                    pred = [x.float() for x in pred]  # ComputeLoss in FP32, it has no autocast-eligible ops
+                loss, loss_items = compute_loss(pred, targets.to(device), *assigned)  # loss scaled by batch_size
                 if RANK != -1:
                     loss *= WORLD_SIZE  # gradient averaged between devices in DDP mode
                 if opt.quad:
@@ -423,7 +500,7 @@ def train(hyp, opt, device, callbacks):
             # Optimize - https://pytorch.org/docs/master/notes/amp_examples.html
             if ni - last_opt_step >= accumulate:
                 scaler.unscale_(optimizer)  # unscale gradients
-                torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=10.0)  # clip gradients
+                clip_gradients(model, max_norm=10.0)  # clip gradients
                 scaler.step(optimizer)  # optimizer.step
                 scaler.update()
                 optimizer.zero_grad()
@@ -441,63 +518,84 @@ def train(hyp, opt, device, callbacks):
                 )
                 callbacks.run("on_train_batch_end", model, ni, imgs, targets, paths, list(mloss))
                 if callbacks.stop_training:
+                    writer.wait()
+                    if opt.val_cache:
+                        val_loader.close()  # delete the cache file
                     return
+
+            # Save mid-epoch checkpoint after an optimizer step, with no gradients pending
+            if opt.save_iters and last_opt_step == ni and ni - last_save >= opt.save_iters and i + 1 < nb:
+                last_save = ni
+                rng = [get_rng_states()]
+                if RANK != -1:  # gather every rank's RNG states
+                    rng = [None] * WORLD_SIZE
+                    dist.all_gather_object(rng, get_rng_states())
+                if zero:
+                    optimizer.consolidate_state_dict(to=0)  # gather sharded optimizer state for checkpoint()
+                if RANK in {-1, 0} and not nosave:
+                    state = {
+                        "batch": i + 1,
+                        "accumulate": accumulate,
+                        "last_opt_step": last_opt_step,
+                        "scaler": scaler.state_dict(),
+                        "mloss": mloss.cpu(),
+                        "rng": rng,
+                    }
+                    writer.save(checkpoint(epoch - 1, iteration=state), last)  # resume restarts this epoch
             # end batch ------------------------------------------------------------------------------------------------
+        start_batch = 0  # later epochs start from the first batch
 
         # Scheduler
         lr = [x["lr"] for x in optimizer.param_groups]  # for loggers
         scheduler.step()
+        if zero:
+            optimizer.consolidate_state_dict(to=0)  # gather sharded optimizer state for checkpoint()
 
+        # mAP
         if RANK in {-1, 0}:
-            # mAP
             callbacks.run("on_train_epoch_end", epoch=epoch)
-            ema.update_attr(model, include=["yaml", "nc", "hyp", "names", "stride", "class_weights"])
-            final_epoch = (epoch + 1 == epochs) or stopper.possible_stop
-            if not noval or final_epoch:  # Calculate mAP
-                results, maps, _ = validate.run(
-                    data_dict,
-                    batch_size=batch_size // WORLD_SIZE * 2,
-                    imgsz=imgsz,
-                    half=amp,
-                    model=ema.ema,
-                    single_cls=single_cls,
-                    dataloader=val_loader,
-                    save_dir=save_dir,
-                    plots=False,
-                    callbacks=callbacks,
-                    compute_loss=compute_loss,
-                )
+        ema.update_attr(model, include=["yaml", "nc", "hyp", "names", "stride", "class_weights"])
+        final_epoch = (epoch + 1 == epochs) or stopper.possible_stop
+        if not noval or final_epoch or epoch + 1 in rungs:  # Calculate mAP on every rank, results from rank 0
+            if RANK != -1:
+                ema.broadcast(0)  # all ranks validate the rank-0 EMA saved as best.pt
+            results, maps, _ = validate.run(
+                data_dict,
+                batch_size=batch_size // WORLD_SIZE * 2,
+                imgsz=imgsz,
+                half=amp,
+                bf16=opt.bf16,
+                model=ema.ema,
+                single_cls=single_cls,
+                dataloader=val_loader,
+                save_dir=save_dir,
+                plots=False,
+                callbacks=callbacks,
+                compute_loss=compute_loss,
+            )
 
-            # Update best mAP
-            fi = fitness(np.array(results).reshape(1, -1))  # weighted combination of [P, R, mAP@.5, mAP@.5-.95]
-            stop = stopper(epoch=epoch, fitness=fi)  # early stop check
-            if fi > best_fitness:
-                best_fitness = fi
+        # Update best mAP
+        fi = fitness(np.array(results).reshape(1, -1))  # weighted combination of [P, R, mAP@.5, mAP@.5-.95]
+        stop = stopper(epoch=epoch, fitness=fi)  # early stop check
+        if fi > best_fitness:
+            best_fitness = fi
+
+        if RANK in {-1, 0}:
             log_vals = list(mloss) + list(results) + lr
             callbacks.run("on_fit_epoch_end", log_vals, epoch, best_fitness, fi)
+            stop |= callbacks.stop_training  # i.e. evolution trial cut by successive halving
 
             # Save model
             if (not nosave) or (final_epoch and not evolve):  # if save
-                ckpt = {
-                    "epoch": epoch,
-                    "best_fitness": best_fitness,
-                    "model": deepcopy(de_parallel(model)).half(),
-                    "ema": deepcopy(ema.ema).half(),
-                    "updates": ema.updates,
-                    "optimizer": optimizer.state_dict(),
-                    "opt": vars(opt),
-                    "git": GIT_INFO,  # {remote, branch, commit} if a git repo
-                    "date": datetime.now().isoformat(),
-                }
+                ckpt = checkpoint(epoch)
 
-                # Save last, best and delete
-                torch.save(ckpt, last)
-                if best_fitness == fi:
-                    torch.save(ckpt, best)
+                # Save last, link best and delete, written in the background
+                links = [best] if best_fitness == fi else []
                 if opt.save_period > 0 and epoch % opt.save_period == 0:
-                    torch.save(ckpt, w / f"epoch{epoch}.pt")
+                    links.append(w / f"epoch{epoch}.pt")
+                callback = partial(callbacks.run, "on_model_save", last, epoch, final_epoch, best_fitness, fi)
+                writer.save(ckpt, last, links, callback=callback)  # callback runs once files are in place
                 del ckpt
-                callbacks.run("on_model_save", last, epoch, final_epoch, best_fitness, fi)
 
         # EarlyStopping
         if RANK != -1:  # if DDP training
@@ -511,6 +609,10 @@ def train(hyp, opt, device, callbacks):
         # end epoch ----------------------------------------------------------------------------------------------------
     # end training -----------------------------------------------------------------------------------------------------
     if RANK in {-1, 0}:
+        writer.wait()  # last checkpoint written
+        if RANK != -1:  # validate best.pt on the full val set
+            val_loader.sampler.rank, val_loader.sampler.world_size = 0, 1
+            val_loader.reset()
         LOGGER.info(f"\n{epoch - start_epoch + 1} epochs completed in {(time.time() - t0) / 3600:.3f} hours.")
         for f in last, best:
             if f.exists():
@@ -521,12 +623,14 @@ def train(hyp, opt, device, callbacks):
                         data_dict,
                         batch_size=batch_size // WORLD_SIZE * 2,
                         imgsz=imgsz,
-                        model=attempt_load(f, device).half(),
+                        half=not opt.qat,  # QAT fake-quant runs in FP32
+                        bf16=opt.bf16,
+                        model=attempt_load(f, device),
                         iou_thres=0.65 if is_coco else 0.60,  # best pycocotools at iou 0.65
                         single_cls=single_cls,
                         dataloader=val_loader,
                         save_dir=save_dir,
-                        save_json=is_coco,
+                        coco_eval=is_coco,
                         verbose=True,
                         plots=plots,
                         callbacks=callbacks,
@@ -534,9 +638,15 @@ def train(hyp, opt, device, callbacks):
                     )  # val best model with plots
                     if is_coco:
                         callbacks.run("on_fit_epoch_end", list(mloss) + list(results) + lr, epoch, best_fitness, fi)
+                    if opt.qat:  # convert QAT weights to a CPU INT8 TorchScript model
+                        from export import run as export
+
+                        export(weights=f, imgsz=[imgsz], include=["torchscript"], int8=True)
 
         callbacks.run("on_train_end", last, best, epoch, results)
 
+    if opt.val_cache:
+        val_loader.close()  # delete the cache file
     torch.cuda.empty_cache()
     return results
 
@@ -582,8 +692,19 @@ def parse_opt(known=False):
         "--evolve_population", type=str, default=ROOT / "data/hyps", help="location for loading population"
     )
     parser.add_argument("--resume_evolve", type=str, default=None, help="resume evolve from last generation")
+    parser.add_argument("--evolve-strategy", default="ga", choices=["ga", "gp"], help="genetic or GP surrogate search")
+    parser.add_argument("--evolve-workers", type=int, default=1, help="parallel evolve trials, 0 for one per device")
+    parser.add_argument(
+        "--evolve-halving", type=int, default=0, help="cut weak evolve trials after k, 2k, 4k... epochs"
+    )
+    parser.add_argument("--evolve-quantile", type=float, default=0.5, help="successive halving cut quantile")
     parser.add_argument("--bucket", type=str, default="", help="gsutil bucket")
     parser.add_argument("--cache", type=str, nargs="?", const="ram", help="image --cache ram/disk")
+    parser.add_argument(
+        "--val-cache",
+        action="store_true",
+        help="memory-map letterboxed val batches across epochs, one file per process",
+    )
     parser.add_argument("--image-weights", action="store_true", help="use weighted image selection for training")
     parser.add_argument("--device", default="", help="cuda device, i.e. 0 or 0,1,2,3 or cpu")
     parser.add_argument("--multi-scale", action="store_true", help="vary img-size +/- 50%%")
@@ -600,7 +721,20 @@ def parse_opt(known=False):
     parser.add_argument("--patience", type=int, default=100, help="EarlyStopping patience (epochs without improvement)")
     parser.add_argument("--freeze", nargs="+", type=int, default=[0], help="Freeze layers: backbone=10, first3=0 1 2")
     parser.add_argument("--save-period", type=int, default=-1, help="Save checkpoint every x epochs (disabled if < 1)")
+    parser.add_argument(
+        "--save-iters", type=int, default=0, help="Save resumable mid-epoch checkpoint every x iterations"
+    )
     parser.add_argument("--seed", type=int, default=0, help="Global training seed")
+    parser.add_argument("--qat", action="store_true", help="INT8 quantization-aware training from --weights *.pt")
+    parser.add_argument("--prune", type=float, default=0.0, help="structured channel pruning ratio for --weights *.pt")
+    parser.add_argument("--prune-method", type=str, choices=["bn", "l1"], default="bn", help="pruning importance")
+    parser.add_argument("--compile", action="store_true", help="torch.compile the training forward pass")
+    parser.add_argument("--channels-last", action="store_true", help="train in torch.channels_last memory format")
+    parser.add_argument("--bf16", action="store_true", help="bfloat16 autocast training on CPU or CUDA, FP32 loss")
+    parser.add_argument("--ema-every", type=int, default=1, help="update EMA every k optimizer steps")
+    parser.add_argument("--worker-targets", action="store_true", help="assign targets to anchors in dataloader workers")
+    parser.add_argument("--ddp-hook", choices=["fp16", "bf16", "powersgd"], help="DDP gradient compression comm hook")
+    parser.add_argument("--zero", action="store_true", help="shard optimizer state across DDP ranks (ZeRO)")
     parser.add_argument("--local_rank", type=int, default=-1, help="Automatic DDP Multi-GPU argument, do not modify")
 
     # Logger arguments
@@ -796,9 +930,68 @@ def main(opt, callbacks=Callbacks()):
             for initial_value in initial_values:
                 population = [initial_value] + population
 
-        # Run the genetic algorithm for a fixed number of generations
+        # Resume a partially completed generation, saved after every trial
+        state_yaml, start_generation, done = save_dir / "evolve_state.yaml", 0, {}
+        if opt.exist_ok and state_yaml.is_file():  # --exist-ok reuses the save_dir of an interrupted evolution
+            with open(state_yaml, errors="ignore") as f:
+                state = yaml.safe_load(f)
+            start_generation, population, done = state["generation"], state["population"], state["results"]
+            LOGGER.info(f"Resuming evolution generation {start_generation} with {len(done)}/{pop_size} trials done")
+        elif not opt.exist_ok:
+            states = sorted(Path(opt.project).glob(f"{opt.name}*/evolve_state.yaml"), key=os.path.getmtime)
+            if states:
+                LOGGER.info(
+                    f"{colorstr('evolve: ')}found {states[-1]}, pass '--exist-ok --name {states[-1].parent.name}' to "
+                    "resume its partial generation"
+                )
+
+        # Parallel trial workers, and successive-halving rung fitness shared between trials
+        pool, workers, rungs, table, lock = evolve_pool(opt, device)
+        if opt.exist_ok and state_yaml.is_file():
+            table.update(state["rungs"])
+
         list_keys = list(hyp_GA.keys())
-        for generation in range(opt.evolve):
+        keys = (
+            "metrics/precision",
+            "metrics/recall",
+            "metrics/mAP_0.5",
+            "metrics/mAP_0.5:0.95",
+            "val/box_loss",
+            "val/obj_loss",
+            "val/cls_loss",
+            "epochs",  # trained, fewer if cut by successive halving
+        )
+
+        # Surrogate-guided search, proposing --evolve trials by expected improvement of a GP fit to evolve.csv
+        if opt.evolve_strategy == "gp":
+            rng = np.random.default_rng(opt.seed)
+            while True:
+                x, y, full = load_evolve(evolve_csv, list_keys)  # all rows, including resumed or downloaded ones
+                if len(y) >= opt.evolve:
+                    break
+                x, n = (x[full] - lower_limit) / (upper_limit - lower_limit), min(workers, opt.evolve - len(y))
+                p = propose(x, y[full], n, rng)  # fit to full-budget trials only
+                hyps = {
+                    i: {**hyp, **dict(zip(list_keys, map(float, lower_limit + v * (upper_limit - lower_limit))))}
+                    for i, v in enumerate(p)
+                }
+                if not len(y):
+                    hyps[0] = hyp.copy()  # start from --hyp
+                for i, (results, epochs) in evolve_trials(hyps, opt, device, callbacks, pool, rungs, table, lock):
+                    callbacks = Callbacks()
+                    print_mutation(keys, (*results, epochs), hyps[i], save_dir, opt.bucket)
+            if pool:
+                pool.shutdown()
+            plot_evolve(evolve_csv)
+            LOGGER.info(
+                f"Hyperparameter search finished {opt.evolve} trials\n"
+                f"Results saved to {colorstr('bold', save_dir)}\n"
+                f"Usage example: $ python train.py --hyp {evolve_yaml}"
+            )
+            return
+
+        # Run the genetic algorithm for a fixed number of generations
+        for generation in range(start_generation, opt.evolve):
             if generation >= 1:
                 save_dict = {}
                 for i in range(len(population)):
@@ -810,26 +1003,20 @@ def main(opt, callbacks=Callbacks()):
 
             # Adaptive elite size
             elite_size = min_elite_size + int((max_elite_size - min_elite_size) * (generation / opt.evolve))
-            # Evaluate the fitness of each individual in the population
-            fitness_scores = []
-            for individual in population:
-                for key, value in zip(hyp_GA.keys(), individual):
-                    hyp_GA[key] = value
-                hyp.update(hyp_GA)
-                results = train(hyp.copy(), opt, device, callbacks)
+            # Evaluate the fitness of each individual in the population, in parallel if pool
+            population = [[float(x) for x in individual] for individual in population]
+            hyps = [{**hyp, **dict(zip(list_keys, individual))} for individual in population]
+            todo = {i: hyps[i] for i in range(len(population)) if i not in done}
+            for i, (results, epochs) in evolve_trials(todo, opt, device, callbacks, pool, rungs, table, lock):
                 callbacks = Callbacks()
-                # Write mutation results
-                keys = (
-                    "metrics/precision",
-                    "metrics/recall",
-                    "metrics/mAP_0.5",
-                    "metrics/mAP_0.5:0.95",
-                    "val/box_loss",
-                    "val/obj_loss",
-                    "val/cls_loss",
-                )
-                print_mutation(keys, results, hyp.copy(), save_dir, opt.bucket)
-                fitness_scores.append(results[2])
+                # Write mutation results, in order of completion
+                print_mutation(keys, (*results, epochs), hyps[i].copy(), save_dir, opt.bucket)
+                done[i] = [*map(float, results), epochs]
+                state = {"generation": generation, "population": population, "results": done, "rungs": dict(table)}
+                yaml_save(state_yaml, state)
+            # Trials cut by successive halving lose every tournament and are never elite
+            fitness_scores = [done[i][2] if done[i][-1] >= opt.epochs else -np.inf for i in range(len(population))]
+            done = {}
 
             # Select the fittest individuals for reproduction using adaptive tournament selection
             selected_indices = []
@@ -846,13 +1033,15 @@ def main(opt, callbacks=Callbacks()):
                 selected_indices.append(winner_index)
 
             # Add the elite individuals to the selected indices
-            elite_indices = [i for i in range(pop_size) if fitness_scores[i] in sorted(fitness_scores)[-elite_size:]]
+            elites = sorted(fitness_scores)[-elite_size:]
+            elite_indices = [i for i in range(pop_size) if fitness_scores[i] > -np.inf and fitness_scores[i] in elites]
             selected_indices.extend(elite_indices)
             # Create the next generation through crossover and mutation
             next_generation = []
+            k = min(pop_size, len(selected_indices)) - 1  # fewer if cut trials left elite places empty
             for _ in range(pop_size):
-                parent1_index = selected_indices[random.randint(0, pop_size - 1)]
-                parent2_index = selected_indices[random.randint(0, pop_size - 1)]
+                parent1_index = selected_indices[random.randint(0, k)]
+                parent2_index = selected_indices[random.randint(0, k)]
                 # Adaptive crossover rate
                 crossover_rate = max(
                     crossover_rate_min, min(crossover_rate_max, crossover_rate_max - (generation / opt.evolve))
@@ -873,6 +1062,8 @@ def main(opt, callbacks=Callbacks()):
                 next_generation.append(child)
             # Replace the old population with the new generation
             population = next_generation
+        if pool:
+            pool.shutdown()
         # Print the best solution found
         best_index = fitness_scores.index(max(fitness_scores))
         best_individual = population[best_index]
@@ -917,6 +1108,106 @@ def generate_individual(input_ranges, individual_length):
     return individual
 
 
+def halving_rungs(epochs, k=0):
+    """
+    Returns the successive-halving rung epochs k, 2k, 4k... below `epochs`, at which evolution trials may be cut.
+
+    Example:
+        ```python
+        halving_rungs(100, 10)  # [10, 20, 40, 80]
+        ```
+    """
+    rungs = []
+    while 0 < k < epochs:
+        rungs.append(k)
+        k *= 2
+    return rungs
+
+
+def evolve_pool(opt, device):
+    """
+    Returns a process pool for parallel evolution trials, its size, successive-halving rungs, rung table and lock.
+
+    Each of the `opt.evolve_workers` processes owns one CUDA device, assigned round-robin over the visible devices, or
+    an equal share of the CPU threads. The rung table {epoch: [fitness, ...]} and its lock are shared with the workers
+    through a multiprocessing Manager. With a single worker the pool is None and trials train in this process.
+    """
+    rungs = halving_rungs(opt.epochs, opt.evolve_halving)
+    cuda = device.type == "cuda"
+    ids = os.environ.get("CUDA_VISIBLE_DEVICES", ",".join(map(str, range(torch.cuda.device_count())))).split(",")
+    n = opt.evolve_workers or (len(ids) if cuda else max(os.cpu_count() // 4, 1))
+    if n == 1:
+        return None, n, rungs, {}, contextlib.nullcontext()
+    ctx = mp.get_context("spawn")  # CUDA can not be re-initialized in forked workers
+    manager = ctx.Manager()
+    slots = manager.Queue()
+    for i in range(n):
+        slots.put((ids[i % len(ids)] if cuda else "-1", max(os.cpu_count() // n, 1)))
+    LOGGER.info(
+        f"{colorstr('evolve: ')}training {n} trials in parallel on {'CUDA ' + ','.join(ids) if cuda else 'CPU'}"
+    )
+    pool = ProcessPoolExecutor(n, mp_context=ctx, initializer=evolve_worker, initargs=(slots,))
+    return pool, n, rungs, manager.dict(), manager.Lock()
+
+
+def evolve_worker(slots):
+    """Initializes an evolution pool process with a (device, threads) slot, device '-1' for CPU."""
+    device, threads = slots.get()
+    os.environ["CUDA_VISIBLE_DEVICES"] = device  # before CUDA initialization
+    torch.set_num_threads(threads)
+
+
+def evolve_trial(hyp, opt, device=None, callbacks=None, rungs=(), table=None, lock=None):
+    """
+    Trains one evolution trial and returns its results and epochs trained, cut early by successive halving at `rungs`.
+
+    At each rung the trial fitness is added to the shared `table`, and training stops if it is below the
+    `opt.evolve_quantile` quantile of at least 4 earlier trials at that rung. `device` None selects the pool worker's
+    device.
+    """
+    callbacks, epochs = callbacks or Callbacks(), opt.epochs
+    if device is None:
+        device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+
+    def cut(log_vals, epoch, best_fitness, fi):
+        """Stops the trial if its fitness at a rung is in the bottom quantile of earlier trials."""
+        nonlocal epochs
+        if epoch + 1 in rungs:
+            with lock:
+                seen = table.get(epoch + 1, [])
+                table[epoch + 1] = [*seen, fi.item()]
+            if len(seen) >= 4 and fi.item() < np.quantile(seen, opt.evolve_quantile):
+                LOGGER.info(f"{colorstr('evolve: ')}trial cut after {epoch + 1} epochs, fitness {fi.item():.4f}")
+                callbacks.stop_training, epochs = True, epoch + 1
+
+    callbacks.register_action("on_fit_epoch_end", name="successive_halving", callback=cut)
+    results = train(hyp, opt, device, callbacks)
+    return results, epochs
+
+
+def evolve_trials(hyps, opt, device, callbacks, pool=None, rungs=(), table=None, lock=None):
+    """
+    Yields (index, (results, epochs)) of the {index: hyp} trials `hyps` as they complete, in parallel if `pool`.
+
+    Each trial trains in its own `opt.save_dir` subdirectory trial0, trial1..., numbered on from earlier batches, so
+    parallel trials never share results.csv or validation caches. evolve.csv, hyp_evolve.yaml and evolve_state.yaml
+    stay at the top level.
+    """
+    root, opts = Path(opt.save_dir), {i: copy(opt) for i in hyps}
+    n = len(list(root.glob("trial*")))  # trials of earlier batches, generations or runs
+    for k, o in enumerate(opts.values()):
+        o.save_dir = str(root / f"trial{n + k}")
+        Path(o.save_dir).mkdir(parents=True, exist_ok=True)
+    if pool:
+        futures = {pool.submit(evolve_trial, h, opts[i], None, None, rungs, table, lock): i for i, h in hyps.items()}
+        for f in as_completed(futures):
+            yield futures[f], f.result()
+    else:
+        for i, h in hyps.items():
+            yield i, evolve_trial(h, opts[i], device, callbacks, rungs, table, lock)
+            callbacks = Callbacks()
+
+
 def run(**kwargs):
     """
     Execute YOLOv5 training with specified options, allowing optional overrides through keyword arguments.
@@ -939,8 +1230,18 @@ def run(**kwargs):
             value.
         evolve_population (str, optional): Directory for loading population during evolution. Defaults to ROOT / 'data/ hyps'.
         resume_evolve (str, optional): Resume hyperparameter evolution from the last generation. Defaults to None.
+        evolve_strategy (str, optional): Hyperparameter search, 'ga' genetic algorithm over --evolve generations or 'gp'
+            Gaussian process surrogate proposing --evolve trials by expected improvement. Defaults to 'ga'.
+        evolve_workers (int, optional): Evolution trials trained in parallel, one per CUDA device or CPU thread share.
+            0 uses one per CUDA device or per 4 CPU cores. Defaults to 1.
+        evolve_halving (int, optional): Successive halving budget k, cutting evolution trials whose fitness after k, 2k,
+            4k... epochs is in the bottom `evolve_quantile` of earlier trials. Disabled if < 1. Defaults to 0.
+        evolve_quantile (float, optional): Successive halving cut quantile. Defaults to 0.5.
         bucket (str, optional): gsutil bucket for saving checkpoints. Defaults to an empty string.
         cache (str, optional): Cache image data in 'ram' or 'disk'. Defaults to None.
+        val_cache (bool, optional): Write the letterboxed val batches and native-space labels once, to a memory-mapped
+            file in `save_dir` read by later validations, deleted after training. The file is named by process ID, so
+            DDP ranks and parallel evolution trials never share one. Defaults to False.
         image_weights (bool, optional): Use weighted image selection for training. Defaults to False.
         device (str, optional): CUDA device identifier, e.g., '0', '0,1,2,3', or 'cpu'. Defaults to an empty string.
         multi_scale (bool, optional): Use multi-scale training, varying image size by ±50%. Defaults to False.
@@ -957,7 +1258,27 @@ def run(**kwargs):
         patience (int, optional): Patience for early stopping, measured in epochs without improvement. Defaults to 100.
         freeze (list, optional): Layers to freeze, e.g., backbone=10, first 3 layers = [0, 1, 2]. Defaults to [0].
         save_period (int, optional): Frequency in epochs to save checkpoints. Disabled if < 1. Defaults to -1.
+        save_iters (int, optional): Save a resumable mid-epoch last.pt every x iterations, with the dataloader position,
+            RNG states, GradScaler and accumulation state. Disabled if < 1. Defaults to 0.
         seed (int, optional): Global training random seed. Defaults to 0.
+        qat (bool, optional): Fine-tune --weights with INT8 quantization-aware training. Defaults to False.
+        prune (float, optional): Ratio of channels to prune from --weights before fine-tuning. Defaults to 0.0.
+        prune_method (str, optional): Channel importance for pruning, 'bn' (BN gamma) or 'l1' (filter norm). Defaults
+            to 'bn'.
+        compile (bool, optional): Run the training forward pass through torch.compile. Defaults to False.
+        channels_last (bool, optional): Train with model weights and batches in torch.channels_last memory format.
+            Defaults to False.
+        bf16 (bool, optional): Train under bfloat16 autocast on CPU or CUDA without a GradScaler. ComputeLoss and EMA
+            weights stay in FP32. Defaults to False.
+        ema_every (int, optional): Update the EMA every k optimizer steps with a decay corrected for the skipped steps.
+            Defaults to 1.
+        worker_targets (bool, optional): Assign targets to anchors and grid cells in the dataloader workers, taking
+            build_targets() off the training step. Batches of other grid shapes (--multi-scale) or collated before
+            AutoAnchor are assigned in the training process. Defaults to False.
+        ddp_hook (str, optional): DDP communication hook compressing gradient all-reduces, 'fp16' or 'bf16' casts or
+            'powersgd' rank-1 approximation after 1000 uncompressed iterations. Defaults to None.
+        zero (bool, optional): Shard optimizer state across DDP ranks with a ZeroRedundancyOptimizer. Defaults to
+            False.
         local_rank (int, optional): Automatic DDP Multi-GPU argument. Do not modify. Defaults to -1.
 
     Returns:
@@ -1,7 +1,9 @@
 # Ultralytics 🚀 AGPL-3.0 License - https://ultralytics.com/license
 """AutoAnchor utils."""
 
-import random
+import math
+import weakref
+from pathlib import Path
 
 import numpy as np
 import torch
@@ -12,6 +14,7 @@ from utils import TryExcept
 from utils.general import LOGGER, TQDM_BAR_FORMAT, colorstr
 
 PREFIX = colorstr("AutoAnchor: ")
+CHECKED = weakref.WeakKeyDictionary()  # check_anchors() results {dataset: {(thr, imgsz, anchors): anchors}}
 
 
 def check_anchor_order(m):
@@ -26,19 +29,29 @@ def check_anchor_order(m):
 
 @TryExcept(f"{PREFIX}ERROR")
 def check_anchors(dataset, model, thr=4.0, imgsz=640):
-    """Evaluates anchor fit to dataset and adjusts if necessary, supporting customizable threshold and image size."""
+    """
+    Evaluates anchor fit to dataset and adjusts if necessary, supporting customizable threshold and image size.
+
+    Results are remembered per dataset object, so a reused dataset (i.e. across evolution trials) skips the check.
+    """
     m = model.module.model[-1] if hasattr(model, "module") else model.model[-1]  # Detect()
+    key = (thr, imgsz, m.anchors.cpu().numpy().tobytes())
+    if key in CHECKED.get(dataset, {}):
+        m.anchors[:] = CHECKED[dataset][key].to(m.anchors.device)
+        LOGGER.info(f"\n{PREFIX}Reusing anchors checked for this dataset ✅")
+        return
     shapes = imgsz * dataset.shapes / dataset.shapes.max(1, keepdims=True)
     scale = np.random.uniform(0.9, 1.1, size=(shapes.shape[0], 1))  # augment scale
-    wh = torch.tensor(np.concatenate([l[:, 3:5] * s for s, l in zip(shapes * scale, dataset.labels)])).float()  # wh
+    wh = np.concatenate([l[:, 3:5] * s for s, l in zip(shapes * scale, dataset.labels)])  # wh
+    wh, w = (torch.tensor(x).float() for x in subsample_wh(wh))  # stratified sample, weights
 
     def metric(k):  # compute metric
         """Computes ratio metric, anchors above threshold, and best possible recall for YOLOv5 anchor evaluation."""
         r = wh[:, None] / k[None]
         x = torch.min(r, 1 / r).min(2)[0]  # ratio metric
         best = x.max(1)[0]  # best_x
-        aat = (x > 1 / thr).float().sum(1).mean()  # anchors above threshold
-        bpr = (best > 1 / thr).float().mean()  # best possible recall
+        aat = ((x > 1 / thr).float().sum(1) * w).mean()  # anchors above threshold
+        bpr = ((best > 1 / thr).float() * w).mean()  # best possible recall
         return bpr, aat
 
     stride = m.stride.to(m.anchors.device).view(-1, 1, 1)  # model strides
@@ -50,7 +63,7 @@ def check_anchors(dataset, model, thr=4.0, imgsz=640):
     else:
         LOGGER.info(f"{s}Anchors are a poor fit to dataset ⚠️, attempting to improve...")
         na = m.anchors.numel() // 2  # number of anchors
-        anchors = kmean_anchors(dataset, n=na, img_size=imgsz, thr=thr, gen=1000, verbose=False)
+        anchors = cached_kmean_anchors(dataset, n=na, img_size=imgsz, thr=thr)
         new_bpr = metric(anchors)[0]
         if new_bpr > bpr:  # replace anchors
             anchors = torch.tensor(anchors, device=m.anchors.device).type_as(m.anchors)
@@ -61,18 +74,74 @@ def check_anchors(dataset, model, thr=4.0, imgsz=640):
         else:
             s = f"{PREFIX}Done ⚠️ (original anchors better than new anchors, proceeding with original anchors)"
         LOGGER.info(s)
+    CHECKED.setdefault(dataset, {})[key] = m.anchors.clone()
+
 
+def subsample_wh(wh, eps=0.005, strata=32, seed=0):
+    """
+    Returns a stratified sample of label `wh` (n, 2) and its weights (mean 1), or all labels if not fewer.
+
+    The sample size bounds the 95% confidence error of recall and fitness metrics in [0, 1] by `eps` (i.e. 38416 labels
+    at 0.005), stratified over `strata` quantiles of label area with proportional allocation, so metrics of the weighted
+    sample track those of all labels at a fixed cost regardless of dataset size.
+    """
+    n, m = len(wh), math.ceil((1.96 * 0.5 / eps) ** 2)  # labels, sample size
+    if n <= m:
+        return wh, np.ones(n, dtype=np.float32)
+    a = np.log(wh.prod(1).clip(min=1e-9))  # log area
+    s = np.searchsorted(np.quantile(a, np.linspace(0, 1, strata + 1)[1:-1]), a).astype(np.uint8)  # stratum per label
+    c = np.bincount(s, minlength=strata)  # labels per stratum
+    rng, i, w = np.random.default_rng(seed), [], []
+    for ci, si in zip(c, np.split(np.argsort(s, kind="stable"), np.cumsum(c)[:-1])):
+        if ci:
+            k = max(1, round(m * ci / n))  # proportional allocation
+            i.append(rng.choice(si, k, replace=False))
+            w.append(np.full(k, ci / k))
+    w = np.concatenate(w)
+    return wh[np.concatenate(i)], (w / w.mean()).astype(np.float32)
+
+
+def cached_kmean_anchors(dataset, n=9, img_size=640, thr=4.0, **kwargs):
+    """
+    Returns kmean_anchors() of `dataset`, cached in a *.anchors.cache file next to its label cache.
 
-def kmean_anchors(dataset="./data/coco128.yaml", n=9, img_size=640, thr=4.0, gen=1000, verbose=True):
+    Results are keyed by the label cache hash, `img_size`, `thr` and `n`, so unchanged datasets skip evolution on later
+    runs. Datasets without a label cache (i.e. *.yaml paths) always evolve.
+    """
+    path, h = getattr(dataset, "cache_path", None), getattr(dataset, "label_hash", None)
+    if path is None:
+        return kmean_anchors(dataset, n=n, img_size=img_size, thr=thr, verbose=False, **kwargs)
+    path, key = Path(path).with_suffix(".anchors.cache"), f"{h}-{img_size}-{thr}-{n}"
+    try:
+        cache = np.load(path, allow_pickle=True).item()  # load dict
+    except Exception:
+        cache = {}
+    if key in cache:
+        LOGGER.info(f"{PREFIX}Using anchors cached in {path}")
+        return cache[key]
+    cache[key] = kmean_anchors(dataset, n=n, img_size=img_size, thr=thr, verbose=False, **kwargs)
+    try:
+        np.save(path, cache)  # save cache for next time
+        path.with_suffix(".cache.npy").rename(path)  # remove .npy suffix
+    except Exception as e:
+        LOGGER.warning(f"{PREFIX}WARNING ⚠️ Cache directory {path.parent} is not writeable: {e}")  # not writeable
+    return cache[key]
+
+
+def kmean_anchors(dataset="./data/coco128.yaml", n=9, img_size=640, thr=4.0, gen=100, pop=16, verbose=True):
     """
     Creates kmeans-evolved anchors from training dataset.
 
+    Each generation mutates a population of `pop` anchor sets and evaluates them in one batched tensor op, keeping the
+    fittest if it improves. Labels are subsampled by subsample_wh() on large datasets.
+
     Arguments:
         dataset: path to data.yaml, or a loaded dataset
         n: number of anchors
         img_size: image size used for training
         thr: anchor-label wh ratio threshold hyperparameter hyp['anchor_t'] used for training, default=4.0
         gen: generations to evolve anchors using genetic algorithm
+        pop: anchor sets mutated and evaluated per generation
         verbose: print all results
 
     Return:
@@ -94,19 +163,25 @@ def kmean_anchors(dataset="./data/coco128.yaml", n=9, img_size=640, thr=4.0, gen
         return x, x.max(1)[0]  # x, best_x
 
     def anchor_fitness(k):  # mutation fitness
-        """Evaluates fitness of YOLOv5 anchors by computing recall and ratio metrics for an anchor evolution process."""
-        _, best = metric(torch.tensor(k, dtype=torch.float32), wh)
-        return (best * (best > thr).float()).mean()  # fitness
+        """Evaluates fitness of anchor sets `k` (pop, n, 2) as the weighted mean best ratio metric past threshold."""
+        k = torch.tensor(k, dtype=torch.float32).log()
+        f, b = torch.zeros(len(k)), max(1, 2**22 // k[..., 0].numel())  # fitness, labels per chunk
+        for i in range(0, len(w), b):
+            dw, dh = ((k[..., j, None] - lwh[j, i : i + b]).abs_() for j in range(2))  # log ratios (pop, n, b)
+            best = (-torch.maximum(dw, dh).amin(1)).exp()  # best_x (pop, b)
+            f += (best * (best > thr) * w[i : i + b]).sum(1)
+        return f / w.sum()
 
     def print_results(k, verbose=True):
         """Sorts and logs kmeans-evolved anchor metrics and best possible recall values for YOLOv5 anchor evaluation."""
         k = k[np.argsort(k.prod(1))]  # sort small to large
         x, best = metric(k, wh0)
-        bpr, aat = (best > thr).float().mean(), (x > thr).float().mean() * n  # best possible recall, anch > thr
+        wx, ws = w0[:, None].expand_as(x), w0.sum()  # label weights
+        bpr, aat = ((best > thr).float() * w0).sum() / ws, ((x > thr).float() * wx).sum() / ws  # recall, anch > thr
         s = (
             f"{PREFIX}thr={thr:.2f}: {bpr:.4f} best possible recall, {aat:.2f} anchors past thr\n"
-            f"{PREFIX}n={n}, img_size={img_size}, metric_all={x.mean():.3f}/{best.mean():.3f}-mean/best, "
-            f"past_thr={x[x > thr].mean():.3f}-mean: "
+            f"{PREFIX}n={n}, img_size={img_size}, metric_all={(x * wx).sum() / wx.sum():.3f}/"
+            f"{(best * w0).sum() / ws:.3f}-mean/best, past_thr={(x * wx)[x > thr].sum() / wx[x > thr].sum():.3f}-mean: "
         )
         for x in k:
             s += "%i,%i, " % (round(x[0]), round(x[1]))
@@ -129,7 +204,9 @@ def kmean_anchors(dataset="./data/coco128.yaml", n=9, img_size=640, thr=4.0, gen
     i = (wh0 < 3.0).any(1).sum()
     if i:
         LOGGER.info(f"{PREFIX}WARNING ⚠️ Extremely small objects found: {i} of {len(wh0)} labels are <3 pixels in size")
-    wh = wh0[(wh0 >= 2.0).any(1)].astype(np.float32)  # filter > 2 pixels
+    wh0, w0 = subsample_wh(wh0)  # stratified sample, weights
+    i = (wh0 >= 2.0).any(1)
+    wh, w = wh0[i].astype(np.float32), w0[i]  # filter > 2 pixels
     # wh = wh * (npr.rand(wh.shape[0], 1) * 0.9 + 0.1)  # multiply by random scale 0-1
 
     # Kmeans init
@@ -142,7 +219,8 @@ def kmean_anchors(dataset="./data/coco128.yaml", n=9, img_size=640, thr=4.0, gen
     except Exception:
         LOGGER.warning(f"{PREFIX}WARNING ⚠️ switching strategies from kmeans to random init")
         k = np.sort(npr.rand(n * 2)).reshape(n, 2) * img_size  # random init
-    wh, wh0 = (torch.tensor(x, dtype=torch.float32) for x in (wh, wh0))
+    wh, wh0, w, w0 = (torch.tensor(x, dtype=torch.float32) for x in (wh, wh0, w, w0))
+    lwh = wh.log().T.contiguous()  # log wh (2, n) for anchor_fitness()
     k = print_results(k, verbose=False)
 
     # Plot
@@ -158,16 +236,18 @@ def kmean_anchors(dataset="./data/coco128.yaml", n=9, img_size=640, thr=4.0, gen
     # fig.savefig('wh.png', dpi=200)
 
     # Evolve
-    f, sh, mp, s = anchor_fitness(k), k.shape, 0.9, 0.1  # fitness, generations, mutation prob, sigma
+    f, sh, mp, s = anchor_fitness(k[None])[0], k.shape, 0.9, 0.1  # fitness, generations, mutation prob, sigma
     pbar = tqdm(range(gen), bar_format=TQDM_BAR_FORMAT)  # progress bar
     for _ in pbar:
-        v = np.ones(sh)
-        while (v == 1).all():  # mutate until a change occurs (prevent duplicates)
-            v = ((npr.random(sh) < mp) * random.random() * npr.randn(*sh) * s + 1).clip(0.3, 3.0)
-        kg = (k.copy() * v).clip(min=2.0)
+        v = np.ones((pop, *sh))
+        while (i := (v == 1).all((1, 2))).any():  # mutate until a change occurs (prevent duplicates)
+            m = i.sum()  # duplicates
+            v[i] = ((npr.random((m, *sh)) < mp) * npr.random((m, 1, 1)) * npr.randn(m, *sh) * s + 1).clip(0.3, 3.0)
+        kg = (k * v).clip(min=2.0)  # population
         fg = anchor_fitness(kg)
-        if fg > f:
-            f, k = fg, kg.copy()
+        j = fg.argmax()
+        if fg[j] > f:
+            f, k = fg[j], kg[j].copy()
             pbar.desc = f"{PREFIX}Evolving anchors with Genetic Algorithm: fitness = {f:.4f}"
             if verbose:
                 print_results(k, verbose)
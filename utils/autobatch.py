@@ -4,10 +4,13 @@
 from copy import deepcopy
 
 import numpy as np
+import psutil
 import torch
 
 from utils.general import LOGGER, colorstr
-from utils.torch_utils import profile
+from utils.torch_utils import profile, smart_inference_mode, time_sync
+
+PREFIX = colorstr("AutoBatch: ")
 
 
 def check_train_batch_size(model, imgsz=640, amp=True):
@@ -25,14 +28,12 @@ def autobatch(model, imgsz=640, fraction=0.8, batch_size=16):
     #     print(autobatch(model))
 
     # Check device
-    prefix = colorstr("AutoBatch: ")
-    LOGGER.info(f"{prefix}Computing optimal batch size for --imgsz {imgsz}")
+    LOGGER.info(f"{PREFIX}Computing optimal batch size for --imgsz {imgsz}")
     device = next(model.parameters()).device  # get model device
     if device.type == "cpu":
-        LOGGER.info(f"{prefix}CUDA not detected, using default CPU batch-size {batch_size}")
-        return batch_size
+        return autobatch_cpu(model, imgsz, fraction, batch_size)
     if torch.backends.cudnn.benchmark:
-        LOGGER.info(f"{prefix} ⚠️ Requires torch.backends.cudnn.benchmark=False, using default batch-size {batch_size}")
+        LOGGER.info(f"{PREFIX} ⚠️ Requires torch.backends.cudnn.benchmark=False, using default batch-size {batch_size}")
         return batch_size
 
     # Inspect CUDA memory
@@ -43,7 +44,7 @@ def autobatch(model, imgsz=640, fraction=0.8, batch_size=16):
     r = torch.cuda.memory_reserved(device) / gb  # GiB reserved
     a = torch.cuda.memory_allocated(device) / gb  # GiB allocated
     f = t - (r + a)  # GiB free
-    LOGGER.info(f"{prefix}{d} ({properties.name}) {t:.2f}G total, {r:.2f}G reserved, {a:.2f}G allocated, {f:.2f}G free")
+    LOGGER.info(f"{PREFIX}{d} ({properties.name}) {t:.2f}G total, {r:.2f}G reserved, {a:.2f}G allocated, {f:.2f}G free")
 
     # Profile batch sizes
     batch_sizes = [1, 2, 4, 8, 16]
@@ -51,7 +52,7 @@ def autobatch(model, imgsz=640, fraction=0.8, batch_size=16):
         img = [torch.empty(b, 3, imgsz, imgsz) for b in batch_sizes]
         results = profile(img, model, n=3, device=device)
     except Exception as e:
-        LOGGER.warning(f"{prefix}{e}")
+        LOGGER.warning(f"{PREFIX}{e}")
 
     # Fit a solution
     y = [x[2] for x in results if x]  # memory [2]
@@ -63,8 +64,95 @@ def autobatch(model, imgsz=640, fraction=0.8, batch_size=16):
             b = batch_sizes[max(i - 1, 0)]  # select prior safe point
     if b < 1 or b > 1024:  # b outside of safe range
         b = batch_size
-        LOGGER.warning(f"{prefix}WARNING ⚠️ CUDA anomaly detected, recommend restart environment and retry command.")
+        LOGGER.warning(f"{PREFIX}WARNING ⚠️ CUDA anomaly detected, recommend restart environment and retry command.")
 
     fraction = (np.polyval(p, b) + r + a) / t  # actual fraction predicted
-    LOGGER.info(f"{prefix}Using batch-size {b} for {d} {t * fraction:.2f}G/{t:.2f}G ({fraction * 100:.0f}%) ✅")
+    LOGGER.info(f"{PREFIX}Using batch-size {b} for {d} {t * fraction:.2f}G/{t:.2f}G ({fraction * 100:.0f}%) ✅")
+    return b
+
+
+def autobatch_cpu(model, imgsz=640, fraction=0.8, batch_size=16, batch_sizes=(1, 2, 4, 8, 16, 32, 64), n=2):
+    """
+    Estimates the CPU training batch size of highest images/s whose peak RSS fits in `fraction` of available RAM.
+
+    Forward and backward passes are timed at increasing `batch_sizes`, sampling process RSS after each pass. A linear
+    fit of RSS growth over batch size gives the largest batch that fits in memory. Profiling stops before a batch
+    predicted not to fit, or once throughput stops improving by 5%. Returns `batch_size` if no batch size could be
+    profiled.
+    """
+    process, mem, gb = psutil.Process(), psutil.virtual_memory(), 1 << 30
+    base = process.memory_info().rss
+    limit = mem.available * fraction  # bytes of RSS growth allowed
+    LOGGER.info(f"{PREFIX}CPU {base / gb:.2f}G RSS, {mem.available / gb:.2f}/{mem.total / gb:.2f}G RAM available")
+
+    results = []  # (batch size, RSS growth, images/s)
+    for b in batch_sizes:
+        if len(results) > 1 and np.polyval(np.polyfit(*zip(*[r[:2] for r in results]), deg=1), b) > limit:
+            break  # predicted not to fit
+        im = torch.zeros(b, 3, imgsz, imgsz)
+        try:
+            peak, t = 0, 0.0
+            for i in range(n + 1):  # first pass is warmup
+                t0 = time_sync()
+                y = model(im)
+                peak = max(peak, process.memory_info().rss)
+                sum(x.sum() for x in y).backward()
+                peak = max(peak, process.memory_info().rss)
+                t += (time_sync() - t0) if i else 0.0
+            model.zero_grad(set_to_none=True)
+        except RuntimeError as e:  # out of memory
+            LOGGER.warning(f"{PREFIX}batch-size {b} failed: {e}")
+            break
+        results.append((b, peak - base, b * n / t))
+        LOGGER.info(f"{PREFIX}batch-size {b}: {(peak - base) / gb:.2f}G RSS growth, {results[-1][2]:.1f} images/s")
+        if len(results) > 1 and results[-1][2] < 1.05 * max(r[2] for r in results[:-1]):
+            break  # throughput saturated
+
+    if not results:
+        LOGGER.warning(f"{PREFIX}WARNING ⚠️ CPU profiling failed, using default batch-size {batch_size}")
+        return batch_size
+    b, growth, ips = max(results, key=lambda r: r[2])
+    LOGGER.info(f"{PREFIX}Using batch-size {b} for CPU, {growth / gb:.2f}G RSS growth, {ips:.1f} images/s ✅")
+    return b
+
+
+@smart_inference_mode()
+def autobatch_inference(model, imgsz=640, fraction=0.8, batch_sizes=(1, 2, 4, 8, 16, 32, 64), n=3):
+    """
+    Returns the inference batch size of highest images/s for a DetectMultiBackend model of any format.
+
+    Sweeps increasing `batch_sizes` until the backend rejects a batch (i.e. fixed-batch exports), CUDA memory reserved
+    or process RSS exceeds `fraction` of the device total, or throughput stops improving by 5%.
+
+    Example: from utils.autobatch import *; autobatch_inference(DetectMultiBackend('yolov5s.onnx'), 640)
+    """
+    h, w = (imgsz, imgsz) if isinstance(imgsz, int) else imgsz
+    device = model.device
+    cuda = device.type == "cuda"
+    process = psutil.Process()
+    total = torch.cuda.get_device_properties(device).total_memory if cuda else psutil.virtual_memory().total
+    results = []  # (batch size, images/s)
+    for b in batch_sizes:
+        im = torch.zeros(b, 3, h, w, dtype=torch.half if model.fp16 else torch.float, device=device)
+        try:
+            model(im)  # warmup
+            t0 = time_sync()
+            for _ in range(n):
+                model(im)
+            t = time_sync() - t0
+        except Exception as e:  # backend batch or memory limit
+            LOGGER.info(
+                f"{PREFIX}batch-size {b} not supported: {str(e).splitlines()[0] if str(e) else type(e).__name__}"
+            )
+            break
+        finally:
+            torch.cuda.empty_cache() if cuda else None
+        results.append((b, b * n / t))
+        used = torch.cuda.memory_reserved(device) if cuda else process.memory_info().rss
+        LOGGER.info(f"{PREFIX}batch-size {b}: {results[-1][1]:.1f} images/s, {used / total:.0%} memory")
+        if used > fraction * total or (len(results) > 1 and results[-1][1] < 1.05 * max(r[1] for r in results[:-1])):
+            break
+
+    b, ips = max(results, key=lambda r: r[1]) if results else (1, 0.0)
+    LOGGER.info(f"{PREFIX}Using inference batch-size {b}, {ips:.1f} images/s at {h}x{w} ✅")
     return b
@@ -0,0 +1,327 @@
+# Ultralytics 🚀 AGPL-3.0 License - https://ultralytics.com/license
+"""Vectorized COCO bbox evaluation utils, reproducing pycocotools COCOeval without its JSON round-trip."""
+
+import json
+from collections import defaultdict
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+from utils.general import LOGGER
+from utils.metrics import segment_cummax
+
+IOU_THRS = np.linspace(0.5, 0.95, 10)  # COCOeval Params defaults
+REC_THRS = np.linspace(0.0, 1.0, 101)
+MAX_DETS = (1, 10, 100)
+AREA_RNG = np.array([[0, 1e10], [0, 32**2], [32**2, 96**2], [96**2, 1e10]])
+AREA_LBL = ("all", "small", "medium", "large")
+EMPTY = np.zeros(0, int), np.zeros((0, 4)), np.zeros(0), np.zeros(0, bool)  # (category index, box, area, iscrowd)
+
+
+def json_round(x, n):
+    """Rounds array `x` to `n` decimals exactly like Python round(), i.e. to the values a COCO results JSON stores."""
+    x = np.asarray(x, dtype=np.float64)
+    y = x * 10.0**n
+    out = np.rint(y) / 10.0**n  # nearest float to the rounded decimal
+    tie = np.abs(np.abs(y - np.floor(y)) - 0.5) < 1e-6  # near-ties, decided on exact values
+    out[tie] = [round(v, n) for v in x[tie].tolist()]
+    return out
+
+
+def segment_cumsum(x, lengths):
+    """Returns the cumulative sum of `x` along its first axis within consecutive segments of `lengths`."""
+    c, s = x.cumsum(0), (np.cumsum(lengths) - lengths)[lengths > 0]
+    return c - np.repeat(c[s] - x[s], lengths[lengths > 0], 0)
+
+
+def coco_iou(d, g, crowd):
+    """
+    Returns the (..., D, G) IoU of [x, y, w, h] boxes `d` (..., D, 4) and `g` (..., G, 4) like pycocotools
+    maskUtils.iou(), dividing the intersection with `crowd` boxes of `g` by the detection area.
+    """
+    dx, dy, dw, dh = (d[..., :, None, i] for i in range(4))
+    gx, gy, gw, gh = (g[..., None, :, i] for i in range(4))
+    w = np.minimum(dw + dx, gw + gx) - np.maximum(dx, gx)
+    h = np.minimum(dh + dy, gh + gy) - np.maximum(dy, gy)
+    i, da = w * h, dw * dh
+    with np.errstate(divide="ignore", invalid="ignore"):
+        iou = i / np.where(crowd[..., None, :], da, da + gw * gh - i)
+    return np.where((w > 0) & (h > 0), iou, 0.0)
+
+
+class COCOEvaluator:
+    """
+    COCO bbox evaluator computing the pycocotools COCOeval AP, AP50, AP75, APs/m/l and AR@1/10/100 of in-memory
+    detections.
+
+    Ground truth comes from an annotations JSON through from_json(), or image by image through add_labels(). update()
+    adds the [x, y, w, h] detections of one image, rounded like the results JSON pycocotools reads, and every `chunk`
+    images are matched at once with COCOeval's greedy rule: for all (image, category) pairs, area ranges and IoU
+    thresholds together, looping only over the up to 100 score-ranked detections of a pair. Only per-detection match
+    bits are kept. Chunks are independent, so `workers` threads match them in parallel, and evaluators of disjoint
+    images (i.e. DDP ranks) merge with `+=` before evaluate().
+
+    Example: from utils.cocoeval import *; evaluate_json('instances_val2017.json', 'predictions.json')
+    """
+
+    def __init__(self, cat_ids, img_ids=None, chunk=256, workers=0):
+        """Initializes an evaluator of categories `cat_ids` on images `img_ids`, or all images added if None."""
+        self.cat_ids = np.unique(np.asarray(cat_ids))
+        self.img_ids = None if img_ids is None else set(img_ids)
+        self.chunk, self.workers = chunk, workers
+        self.gt = {}  # image_id: (category index, [x, y, w, h] box, area, iscrowd) labels in annotation order
+        self.seen = set()  # images added
+        self.pending, self.results = [], []  # unmatched images, matched chunks
+        self.stats = None
+
+    @classmethod
+    def from_json(cls, file, img_ids=None, **kwargs):
+        """
+        Initializes an evaluator with the labels and categories of COCO annotations JSON `file`, on all its images or
+        `img_ids`.
+        """
+        with open(file) as f:
+            data = json.load(f)
+        coco = cls([x["id"] for x in data["categories"]], img_ids or [x["id"] for x in data["images"]], **kwargs)
+        anns = defaultdict(list)
+        for x in data["annotations"]:
+            anns[x["image_id"]].append(x)
+        for i, a in anns.items():
+            coco.add_labels(i, [x["bbox"] for x in a], [x["category_id"] for x in a], areas=[x["area"] for x in a],
+                            iscrowd=[x.get("iscrowd", 0) for x in a])  # fmt: skip
+        return coco
+
+    def add_labels(self, image_id, boxes, cats, areas=None, iscrowd=None):
+        """Adds the labels of one image, [x, y, w, h] `boxes` of category IDs `cats`, areas defaulting to w * h."""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        k = np.searchsorted(self.cat_ids, cats)
+        i = (k < len(self.cat_ids)) & (self.cat_ids[k.clip(max=len(self.cat_ids) - 1)] == np.asarray(cats))
+        area = boxes[:, 2] * boxes[:, 3] if areas is None else np.asarray(areas, dtype=np.float64)
+        crowd = np.zeros(len(boxes), bool) if iscrowd is None else np.asarray(iscrowd, bool)
+        self.gt[image_id] = k[i], boxes[i], area[i], crowd[i]
+        self.seen.add(image_id)
+
+    def update(self, image_id, boxes, scores, cats):
+        """Adds the detections of one image, [x, y, w, h] `boxes` with `scores` and category IDs `cats`."""
+        if self.img_ids is not None and image_id not in self.img_ids:
+            return
+        boxes = json_round(boxes, 3).reshape(-1, 4)
+        self.pending.append((image_id, boxes, json_round(scores, 5), np.asarray(cats).reshape(-1)))
+        self.seen.add(image_id)
+        if len(self.pending) >= self.chunk * max(self.workers, 1):
+            self.flush()
+
+    def flush(self):
+        """Matches all pending images, in chunks of `chunk` images across `workers` threads."""
+        chunks = [self.pending[i : i + self.chunk] for i in range(0, len(self.pending), self.chunk)]
+        if self.workers > 1 and len(chunks) > 1:
+            with ThreadPool(self.workers) as pool:
+                self.results += pool.map(self.match, chunks)
+        else:
+            self.results += [self.match(x) for x in chunks]
+        self.pending = []
+
+    def __iadd__(self, other):
+        """Merges evaluator `other` of the same categories, usually of other images, into this one."""
+        self.gt.update(other.gt)
+        self.seen |= other.seen
+        self.pending += other.pending
+        self.results += other.results
+        return self
+
+    def labeled(self):
+        """Returns whether any evaluated image has labels, i.e. False for COCO test-dev images."""
+        ids = self.gt.keys() if self.img_ids is None else self.img_ids & self.gt.keys()
+        return any(len(self.gt[i][0]) for i in ids)
+
+    def match(self, dets):
+        """
+        Returns image IDs, category indices, ranks within their pair, scores and packed (A, T) true and false positive
+        bits of the detections in list `dets` of (image_id, boxes, scores, cats), matched like COCOeval.evaluateImg().
+        """
+        K, A, T, D = len(self.cat_ids), len(AREA_RNG), len(IOU_THRS), MAX_DETS[-1]
+        ids, boxes, scores, cats = zip(*dets)
+        img = np.repeat(np.arange(len(dets)), [len(x) for x in scores])
+        box, score, cat = np.concatenate(boxes), np.concatenate(scores), np.concatenate(cats)
+        k = np.searchsorted(self.cat_ids, cat).clip(max=K - 1)
+
+        # Detections of evaluated categories by (image, category) pair and score, top D of each pair
+        i = np.nonzero(self.cat_ids[k] == cat)[0]
+        i = i[np.lexsort((-score[i], k[i], img[i]))]  # stable, as COCOeval mergesort
+        pair = img[i] * K + k[i]
+        start = np.r_[True, pair[1:] != pair[:-1]] if len(i) else np.zeros(0, bool)
+        rank = np.arange(len(i)) - np.maximum.accumulate(np.where(start, np.arange(len(i)), 0))
+        i, pair, rank = i[rank < D], pair[rank < D], rank[rank < D]
+        box, score, k, img = box[i], score[i], k[i], img[i]
+
+        # Labels of the chunk images by pair, in annotation order
+        labels = [self.gt.get(x, EMPTY) for x in ids]
+        gk, gbox, garea, gcrowd = (np.concatenate(x) for x in zip(*labels))
+        gpair = np.repeat(np.arange(len(ids)), [len(x[0]) for x in labels]) * K + gk
+        j = np.argsort(gpair, kind="stable")
+        gpair, gbox, garea, gcrowd = gpair[j], gbox[j], garea[j], gcrowd[j]
+        gig = gcrowd[:, None] | (garea[:, None] < AREA_RNG[:, 0]) | (garea[:, None] > AREA_RNG[:, 1])  # (G, A)
+
+        # Greedy matching of pairs with labels, bucketed by label count
+        u, ds, dn = np.unique(pair, return_index=True, return_counts=True)
+        gs, gn = np.searchsorted(gpair, u), np.searchsorted(gpair, u, "right") - np.searchsorted(gpair, u)
+        matched, ignored = np.zeros((len(i), A, T), bool), np.zeros((len(i), A, T), bool)
+        thr = np.minimum(IOU_THRS, 1 - 1e-10)[:, None]  # (T, 1)
+        nb = np.ceil(np.log2(gn.clip(1))).astype(int)  # bucket of up to 2 ** nb labels
+        for b in np.unique(nb[gn > 0]):
+            p = np.nonzero((nb == b) & (gn > 0))[0]
+            nd, G = dn[p].max(), 2**b
+            di = ds[p, None] + np.arange(nd).clip(max=dn[p, None] - 1)  # (P, nd) detection indices
+            gi = gs[p, None] + np.arange(G).clip(max=gn[p, None] - 1)  # (P, G) label indices
+            iou = coco_iou(box[di], gbox[gi], gcrowd[gi])
+            iou[(np.arange(nd) >= dn[p, None])[..., None] | (np.arange(G) >= gn[p, None])[:, None]] = -1  # padding
+            keep = iou.max(-1) >= thr.min()  # (P, nd) detections able to match, greedy order kept below
+            o = np.argsort(~keep, axis=1, kind="stable")[:, : keep.sum(1).max()]
+            iou, di, keep = (
+                np.take_along_axis(iou, o[..., None], 1),
+                np.take_along_axis(di, o, 1),
+                np.take_along_axis(keep, o, 1),
+            )
+            ig, crowd = gig[gi].transpose(0, 2, 1)[:, :, None], gcrowd[gi][:, None, None]  # (P, A, 1, G), (P, 1, 1, G)
+            gm = np.zeros((len(p), A, T, G), bool)  # matched labels
+            for d in range(o.shape[1]):
+                x = iou[:, None, None, d]  # (P, 1, 1, G)
+                ok = (x >= thr) & (~gm | crowd)  # unmatched or crowd labels above each threshold
+                x = np.where(ok & ~(ig & (ok & ~ig).any(-1, keepdims=True)), x, -1)  # not ignored labels first
+                m = G - 1 - x[..., ::-1].argmax(-1)  # best IoU, ties to the last label like COCOeval
+                hit = x.max(-1) > -1
+                gm |= hit[..., None] & (np.arange(G) == m[..., None])
+                matched[di[:, d]] |= hit & keep[:, d, None, None]
+                ignored[di[:, d]] |= hit & np.take_along_axis(ig, m[..., None], -1)[..., 0] & keep[:, d, None, None]
+
+        # Unmatched detections outside the area range are ignored
+        area = box[:, 2] * box[:, 3]
+        ignored |= ~matched & ((area[:, None] < AREA_RNG[:, 0]) | (area[:, None] > AREA_RNG[:, 1]))[..., None]
+        tp, fp = (np.packbits(x.reshape(len(i), -1), axis=1) for x in (matched & ~ignored, ~matched & ~ignored))
+        return np.array(ids)[img], k, rank, score, tp, fp
+
+    def accumulate(self):
+        """
+        Returns COCOeval precision (T, R, K, A, M) and recall (T, K, A, M) arrays, -1 for categories without labels.
+        """
+        self.flush()
+        T, R, K, A, M = len(IOU_THRS), len(REC_THRS), len(self.cat_ids), len(AREA_RNG), len(MAX_DETS)
+        precision, recall = -np.ones((T, R, K, A, M)), -np.ones((T, K, A, M))
+        imgs = np.unique(list(self.seen if self.img_ids is None else self.img_ids))
+
+        # Not ignored labels per category and area range
+        gk, _, garea, gcrowd = (np.concatenate(x) for x in zip(EMPTY, *[self.gt[x] for x in imgs if x in self.gt]))
+        ok = ~gcrowd[:, None] & (garea[:, None] >= AREA_RNG[:, 0]) & (garea[:, None] <= AREA_RNG[:, 1])
+        npig = np.stack([np.bincount(gk[x], minlength=K) for x in ok.T], 1)  # (K, A)
+
+        # Detections by category, score and image order, as COCOeval.accumulate() mergesort
+        empty = np.zeros(0, imgs.dtype), *np.zeros((3, 0), int), *np.zeros((2, 0, (A * T + 7) // 8), np.uint8)
+        ids, k, rank, score, tp, fp = (np.concatenate(x) for x in zip(empty, *self.results))
+        i = np.lexsort((rank, np.searchsorted(imgs, ids), -score, k))
+        k, rank = k[i], rank[i]
+        tp, fp = (np.unpackbits(x[i], axis=1, count=A * T).reshape(-1, A, T).astype(bool) for x in (tp, fp))
+        for m, max_det in enumerate(MAX_DETS):
+            j = rank < max_det
+            c = k[j]
+            n = np.bincount(c, minlength=K)  # detections per category
+            s = n.cumsum() - n  # category segment starts
+            for a in range(A):
+                kk = np.nonzero(npig[:, a])[0]  # evaluated categories
+                recall[:, kk, a, m], precision[:, :, kk, a, m] = 0, 0
+                if not len(c):
+                    continue
+                tpc, fpc = (segment_cumsum(x[j, a], n).astype(float).T for x in (tp, fp))  # (T, n)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    rc = tpc / npig[c, a]
+                pr = segment_cummax(tpc / (fpc + tpc + np.spacing(1)), n)  # precision envelopes
+                recall[:, kk, a, m] = np.where(n[kk] > 0, rc[:, (s[kk] + n[kk] - 1).clip(0)], 0)
+
+                # Precision at each recall threshold, 0 beyond the maximum recall
+                q = np.searchsorted(REC_THRS, rc, "right")  # first threshold above each recall
+                q = np.bincount(((np.arange(T)[:, None] * K + c) * (R + 1) + q).ravel(), minlength=T * K * (R + 1))
+                q = q.reshape(T, K, R + 1).cumsum(2)[:, kk, :R]  # (T, kk, R) first detection reaching each threshold
+                pt = np.take_along_axis(pr, (s[kk, None] + q).clip(max=len(c) - 1).reshape(T, -1), 1)
+                precision[:, :, kk, a, m] = np.where(q < n[kk, None], pt.reshape(q.shape), 0).transpose(0, 2, 1)
+        return precision, recall
+
+    def evaluate(self):
+        """Returns and logs the 12 COCOeval.summarize() stats: AP, AP50, AP75, APs/m/l, AR@1/10/100 and ARs/m/l."""
+        precision, recall = self.accumulate()
+
+        def summarize(ap=1, iou=None, area="all", max_det=100):
+            """Returns and logs the mean precision (ap=1) or recall over valid categories like COCOeval."""
+            a, m = [AREA_LBL.index(area)], [MAX_DETS.index(max_det)]
+            s = precision if ap else recall
+            s = s[np.where(iou == IOU_THRS)[0]] if iou is not None else s
+            s = s[:, :, :, a, m] if ap else s[:, :, a, m]
+            mean = np.mean(s[s > -1]) if len(s[s > -1]) else -1
+            t = f"{IOU_THRS[0]:0.2f}:{IOU_THRS[-1]:0.2f}" if iou is None else f"{iou:0.2f}"
+            name = "Average Precision  (AP)" if ap else "Average Recall     (AR)"
+            LOGGER.info(f" {name} @[ IoU={t:<9} | area={area:>6s} | maxDets={max_det:>3d} ] = {mean:0.3f}")
+            return mean
+
+        self.stats = np.array(
+            [
+                summarize(1),
+                summarize(1, iou=0.5),
+                summarize(1, iou=0.75),
+                summarize(1, area="small"),
+                summarize(1, area="medium"),
+                summarize(1, area="large"),
+                summarize(0, max_det=1),
+                summarize(0, max_det=10),
+                summarize(0),
+                summarize(0, area="small"),
+                summarize(0, area="medium"),
+                summarize(0, area="large"),
+            ]
+        )
+        return self.stats
+
+
+class COCOJSONWriter:
+    """Streams COCO results to a JSON list file image by image, one detection per line, without holding them all."""
+
+    def __init__(self, file):
+        """Opens results JSON `file` for writing."""
+        self.file, self.n = file, 0
+        self.f = open(file, "w")  # noqa: SIM115
+        self.f.write("[")
+
+    def write(self, image_id, boxes, scores, cats):
+        """Writes the detections of one image, [x, y, w, h] `boxes` with `scores` and category IDs `cats`."""
+        boxes, scores = json_round(boxes, 3).reshape(-1, 4).tolist(), json_round(scores, 5).tolist()
+        for b, s, c in zip(boxes, scores, np.asarray(cats).reshape(-1).tolist()):
+            x = {"image_id": image_id, "category_id": c, "bbox": b, "score": s}
+            self.f.write(("\n" if self.n == 0 else ",\n") + json.dumps(x))
+            self.n += 1
+
+    def extend(self, file):
+        """Appends the detections of results JSON `file` written by another COCOJSONWriter, i.e. of other DDP ranks."""
+        with open(file) as f:
+            for line in f:
+                line = line.strip().rstrip(",")
+                if line.startswith("{"):
+                    self.f.write(("\n" if self.n == 0 else ",\n") + line)
+                    self.n += 1
+
+    def close(self):
+        """Terminates the JSON list and closes the file."""
+        self.f.write("\n]\n")
+        self.f.close()
+
+
+def evaluate_json(anno_json, pred_json, img_ids=None, workers=0):
+    """
+    Evaluates COCO results JSON `pred_json` against annotations JSON `anno_json` like pycocotools COCOeval 'bbox' on
+    all annotated images or `img_ids`, returning the 12 COCOeval stats.
+    """
+    coco = COCOEvaluator.from_json(anno_json, img_ids, workers=workers)
+    with open(pred_json) as f:
+        dets = defaultdict(list)
+        for x in json.load(f):
+            dets[x["image_id"]].append((*x["bbox"], x["score"], x["category_id"]))
+    for i, d in dets.items():
+        d = np.array(d, dtype=np.float64)
+        coco.update(i, d[:, :4], d[:, 4], d[:, 5].astype(int))
+    return coco.evaluate()
@@ -10,6 +10,7 @@ import os
 import random
 import shutil
 import time
+from functools import partial
 from itertools import repeat
 from multiprocessing.pool import Pool, ThreadPool
 from pathlib import Path
@@ -48,6 +49,7 @@ from utils.general import (
     cv2,
     is_colab,
     is_kaggle,
+    scale_boxes,
     segments2boxes,
     unzip_file,
     xyn2xy,
@@ -65,6 +67,7 @@ LOCAL_RANK = int(os.getenv("LOCAL_RANK", -1))  # https://pytorch.org/docs/stable
 RANK = int(os.getenv("RANK", -1))
 WORLD_SIZE = int(os.getenv("WORLD_SIZE", 1))
 PIN_MEMORY = str(os.getenv("PIN_MEMORY", True)).lower() == "true"  # global pin_memory for dataloaders
+DATALOADERS = {}  # create_dataloader(reuse=True) cache, i.e. shared by evolution trials in one process
 
 # Get orientation exif tag
 for orientation in ExifTags.TAGS.keys():
@@ -157,6 +160,63 @@ class SmartDistributedSampler(distributed.DistributedSampler):
         return iter(idx)
 
 
+class ResumableSampler(torch.utils.data.Sampler):
+    """
+    Sampler yielding (index, seed) pairs in a per-epoch seeded order, resumable from any sample of any epoch.
+
+    Each epoch is shuffled by a generator seeded with `seed + epoch`, which also draws one augmentation seed per sample
+    that LoadImagesAndLabels uses to reseed `random` and `np.random`, so batches are independent of dataloader worker
+    RNG state. The epoch advances on every __iter__() as InfiniteDataLoader prefetches across epoch boundaries.
+    """
+
+    def __init__(self, dataset, shuffle=True, seed=0, epoch=0, start=0, rank=-1, world_size=1):
+        """Initializes the sampler at sample `start` of `epoch`, sharding samples across `world_size` DDP ranks."""
+        self.n, self.shuffle, self.seed = len(dataset), shuffle, seed
+        self.epoch, self.start = epoch, start  # next epoch and its first sample on this rank
+        self.rank, self.world_size = max(rank, 0), world_size
+
+    def __len__(self):
+        """Returns the number of samples per epoch on this rank."""
+        return math.ceil(self.n / self.world_size)
+
+    def __iter__(self):
+        """Yields the (index, augmentation seed) pairs of the next epoch from the start sample."""
+        g = torch.Generator()
+        g.manual_seed(self.seed + self.epoch)
+        idx = (torch.randperm(self.n, generator=g) if self.shuffle else torch.arange(self.n)).tolist()
+        seeds = torch.randint(2**31, (self.n,), generator=g).tolist()
+        pad = len(self) * self.world_size - self.n  # pad to evenly divisible
+        idx, seeds = (
+            (idx + idx[:pad])[self.rank :: self.world_size],
+            (seeds + seeds[:pad])[self.rank :: self.world_size],
+        )
+        start, self.epoch, self.start = self.start, self.epoch + 1, 0
+        return iter(list(zip(idx, seeds))[start:])
+
+
+class ShardedSampler(torch.utils.data.Sampler):
+    """
+    Sampler splitting the sequential batches of a dataset across DDP ranks without padding, i.e. for validation.
+
+    Rank r yields batches r, r + world_size, ... so every batch, and with rect=True every batch shape, is the one
+    single-process sampling at the same batch size would build. Set `world_size=1` to sample the full dataset.
+    """
+
+    def __init__(self, dataset, batch_size, rank=-1, world_size=1):
+        """Initializes the sampler over `dataset` in batches of `batch_size`, sharded across `world_size` ranks."""
+        self.n, self.batch_size = len(dataset), batch_size
+        self.rank, self.world_size = max(rank, 0), world_size
+
+    def __len__(self):
+        """Returns the number of samples on this rank."""
+        return len(list(iter(self)))
+
+    def __iter__(self):
+        """Yields the dataset indices of the batches of this rank in order."""
+        bs, nb = self.batch_size, math.ceil(self.n / self.batch_size)
+        return iter([i for b in range(self.rank, nb, self.world_size) for i in range(b * bs, min(b * bs + bs, self.n))])
+
+
 def create_dataloader(
     path,
     imgsz,
@@ -175,11 +235,42 @@ def create_dataloader(
     prefix="",
     shuffle=False,
     seed=0,
+    channels_last=False,
+    resume=None,
+    reuse=False,
+    assigner=None,
+    shard=False,
 ):
-    """Creates and returns a configured DataLoader instance for loading and processing image datasets."""
+    """
+    Creates and returns a configured DataLoader instance for loading and processing image datasets, collating image
+    batches in torch.channels_last memory format if `channels_last=True`.
+
+    `resume=(epoch, batch)` samples with a ResumableSampler from that batch, seeding augmentation per sample so any
+    batch of any epoch can be reproduced exactly, i.e. after resuming a mid-epoch checkpoint.
+
+    `reuse=True` returns the dataloader and dataset built earlier in this process with the same arguments, rebound to
+    `hyp`, without re-reading labels or cached images and with its workers restarted at a new epoch, i.e. for evolution
+    trials.
+
+    `assigner` (a TargetAssigner) assigns targets to anchors in the workers, appending its output to each batch.
+
+    `shard=True` splits whole batches across DDP ranks with a ShardedSampler, without padding, for distributed
+    validation.
+    """
     if rect and shuffle:
         LOGGER.warning("WARNING ⚠️ --rect is incompatible with DataLoader shuffle, setting shuffle=False")
         shuffle = False
+    reuse = reuse and resume is None and not image_weights  # only InfiniteDataLoader can restart its workers
+    key = (str(path), imgsz, batch_size, int(stride), single_cls, augment, cache, pad, rect, rank, workers, quad)
+    key += (prefix, shuffle, seed, channels_last, tuple(hyp or ()), assigner is not None, shard)
+    key += (str({k: v for k, v in (hyp or {}).items() if not isinstance(v, (int, float))}),)  # non-numeric hyps
+    if reuse and key in DATALOADERS:
+        loader, dataset = DATALOADERS[key]
+        dataset.hyp = hyp
+        if assigner is not None:
+            loader.assigner.update(assigner.anchors, assigner.anchor_t.item())  # shared with running workers
+        loader.reset()
+        return loader, dataset
     with torch_distributed_zero_first(rank):  # init dataset *.cache only once if DDP
         dataset = LoadImagesAndLabels(
             path,
@@ -194,17 +285,28 @@ def create_dataloader(
             pad=pad,
             image_weights=image_weights,
             prefix=prefix,
-            rank=rank,
+            rank=-1 if shard or resume is not None else rank,  # ShardedSampler, ResumableSampler index the full dataset
         )
 
     batch_size = min(batch_size, len(dataset))
     nd = torch.cuda.device_count()  # number of CUDA devices
     nw = min([os.cpu_count() // max(nd, 1), batch_size if batch_size > 1 else 0, workers])  # number of workers
     sampler = None if rank == -1 else SmartDistributedSampler(dataset, shuffle=shuffle)
+    if shard and rank != -1:
+        sampler = ShardedSampler(dataset, batch_size, RANK, WORLD_SIZE)
+    if resume is not None:
+        assert not image_weights, "resumable sampling is not compatible with --image-weights"
+        epoch, batch = resume
+        sampler = ResumableSampler(dataset, shuffle, seed, epoch, batch * batch_size, RANK, WORLD_SIZE)  # global rank
     loader = DataLoader if image_weights else InfiniteDataLoader  # only DataLoader allows for attribute updates
     generator = torch.Generator()
     generator.manual_seed(6148914691236517205 + seed + RANK)
-    return loader(
+    collate_fn = LoadImagesAndLabels.collate_fn4 if quad else LoadImagesAndLabels.collate_fn
+    if channels_last:
+        collate_fn = partial(collate_fn, memory_format=torch.channels_last)
+    if assigner is not None:
+        collate_fn = partial(collate_fn, assigner=assigner)
+    loader = loader(
         dataset,
         batch_size=batch_size,
         shuffle=shuffle and sampler is None,
@@ -212,10 +314,15 @@ def create_dataloader(
         sampler=sampler,
         drop_last=quad,
         pin_memory=PIN_MEMORY,
-        collate_fn=LoadImagesAndLabels.collate_fn4 if quad else LoadImagesAndLabels.collate_fn,
+        collate_fn=collate_fn,
         worker_init_fn=seed_worker,
         generator=generator,
-    ), dataset
+        persistent_workers=reuse and nw > 0,
+    )
+    loader.assigner = assigner
+    if reuse:
+        DATALOADERS[key] = loader, dataset
+    return loader, dataset
 
 
 class InfiniteDataLoader(dataloader.DataLoader):
@@ -233,6 +340,10 @@ class InfiniteDataLoader(dataloader.DataLoader):
         object.__setattr__(self, "batch_sampler", _RepeatSampler(self.batch_sampler))
         self.iterator = super().__iter__()
 
+    def reset(self):
+        """Restarts iteration at a new epoch, reusing persistent workers and dropping batches they prefetched."""
+        self.iterator = super().__iter__()
+
     def __len__(self):
         """Returns the length of the batch sampler's sampler in the InfiniteDataLoader."""
         return len(self.batch_sampler.sampler)
@@ -261,6 +372,85 @@ class _RepeatSampler:
             yield from iter(self.sampler)
 
 
+class ValCache:
+    """
+    Validation dataloader replaying batches letterboxed once into a memory-mapped uint8 file, i.e. across epochs.
+
+    The first pass iterates `loader`, appending each image batch to `file` in the memory layout the loader collated it
+    in, and keeping its targets, paths and shapes, and the native-space labels `labelsn` (class, xyxy pixels of the
+    original image) of every image in order. Later passes map the file copy-on-write and yield the same batches without
+    decoding, letterboxing or collating, so validation costs inference and metrics only. The cache holds the batches of
+    the current sampler and is rebuilt on reset() if the sampler changed, i.e. after re-sharding DDP validation.
+    """
+
+    def __init__(self, loader, file):
+        """Initializes the cache of dataloader `loader` in `file`, written on the first pass."""
+        self.loader, self.file = loader, Path(file)
+        self.indices, self.batches, self.labelsn, self.data = None, [], [], None
+
+    @property
+    def sampler(self):
+        """Returns the sampler of the cached dataloader."""
+        return self.loader.sampler
+
+    @property
+    def dataset(self):
+        """Returns the dataset of the cached dataloader."""
+        return self.loader.dataset
+
+    def __len__(self):
+        """Returns the number of batches."""
+        return len(self.loader)
+
+    def __iter__(self):
+        """Yields (im, targets, paths, shapes) batches, from the file once it is complete, else from the dataloader."""
+        if self.data is None:
+            yield from self.build()
+            return
+        for (o, shape, cl), targets, paths, shapes in self.batches:
+            im = torch.from_numpy(self.data[o : o + math.prod(shape)].reshape(shape))
+            im = im.permute(0, 3, 1, 2) if cl else im  # NHWC memory to channels_last NCHW
+            if self.loader.pin_memory and torch.cuda.is_available():
+                im = im.pin_memory()
+            yield im, targets.clone(), paths, shapes  # validation scales targets in place
+
+    def build(self):
+        """Yields the batches of the dataloader while writing them to the file, mapping it once all are written."""
+        self.indices, o = list(self.sampler), 0
+        self.batches.clear()
+        self.labelsn.clear()  # in place, as validation holds it
+        with open(self.file, "wb") as f:
+            for im, targets, paths, shapes in self.loader:
+                cl = im.is_contiguous(memory_format=torch.channels_last) and not im.is_contiguous()
+                x = (im.permute(0, 2, 3, 1) if cl else im).contiguous().numpy()
+                f.write(x.tobytes())
+                self.batches.append(((o, x.shape, cl), targets.clone(), paths, shapes))
+                o += x.size
+                h, w = im.shape[2:]
+                t = targets.clone()
+                t[:, 2:] *= torch.tensor((w, h, w, h))  # to pixels
+                for i, (shape, ratio_pad) in enumerate(shapes):
+                    lb = t[t[:, 0] == i, 1:]
+                    box = scale_boxes((h, w), xywh2xyxy(lb[:, 1:]), shape, ratio_pad)  # native-space xyxy
+                    self.labelsn.append(torch.cat((lb[:, :1], box), 1))
+                yield im, targets, paths, shapes
+        self.data = np.memmap(self.file, dtype=np.uint8, mode="c") if o else np.zeros(0, np.uint8)
+        if isinstance(self.loader, InfiniteDataLoader):
+            self.loader.iterator = None  # shut down workers
+
+    def reset(self):
+        """Restarts the dataloader, dropping the cache if the sampler changed since it was written."""
+        if self.indices != list(self.sampler):
+            self.data = None
+        if self.data is None:
+            self.loader.reset()
+
+    def close(self):
+        """Drops the cache and deletes its file."""
+        self.data = None
+        self.file.unlink(missing_ok=True)
+
+
 class LoadScreenshots:
     """Loads and processes screenshots for YOLOv5 detection from specified screen regions using mss."""
 
@@ -430,6 +620,42 @@ class LoadImages:
         return self.nf  # number of files
 
 
+class LoadImageBatches(LoadImages):
+    """
+    YOLOv5 batched image dataloader, i.e. `python detect.py --source dir/ --batch-size 8`, yielding batches like
+    LoadStreams.
+    """
+
+    def __init__(self, path, img_size=640, stride=32, batch_size=8, transforms=None):
+        """Initializes the loader for images letterboxed to the full `img_size` so they stack into batches."""
+        super().__init__(path, img_size, stride, auto=False, transforms=transforms)
+        assert not any(self.video_flag), "batched inference supports images only, use --batch-size 1 for videos"
+        self.batch_size = batch_size
+
+    def __next__(self):
+        """Returns the next batch of image paths, stacked CHW RGB images, original BGR images, None and a log string."""
+        batch = []
+        for _ in range(self.batch_size):
+            try:
+                batch.append(super().__next__())
+            except StopIteration:
+                break
+        if not batch:
+            raise StopIteration
+        paths, ims, im0s, _, _ = zip(*batch)
+        return (
+            list(paths),
+            np.stack(ims),
+            list(im0s),
+            None,
+            f"images {self.count - len(batch) + 1}-{self.count}/{self.nf}: ",
+        )
+
+    def __len__(self):
+        """Returns the number of batches."""
+        return math.ceil(self.nf / self.batch_size)
+
+
 class LoadStreams:
     """Loads and processes video streams for YOLOv5, supporting various sources including YouTube and IP cameras."""
 
@@ -600,6 +826,7 @@ class LoadImagesAndLabels(Dataset):
             assert cache["hash"] == get_hash(self.label_files + self.im_files)  # identical hash
         except Exception:
             cache, exists = self.cache_labels(cache_path, prefix), False  # run cache ops
+        self.cache_path, self.label_hash = cache_path, cache["hash"]  # i.e. for AutoAnchor results cache
 
         # Display cache
         nf, nm, ne, nc, n = cache.pop("results")  # found, missing, empty, corrupt, total
@@ -700,6 +927,40 @@ class LoadImagesAndLabels(Dataset):
                     pbar.desc = f"{prefix}Caching images ({b / gb:.1f}GB {cache_images})"
                 pbar.close()
 
+    @property
+    def hyp(self):
+        """
+        Returns the augmentation hyperparameters dict, rebuilt from shared memory only when its version changes, so
+        dataloader workers see updates without a rebuild on every access.
+        """
+        if self._hyp is None:
+            return None
+        spec, keys, values, version = self._hyp
+        if self._hyp_cache[0] != version.item():
+            v = dict(zip(keys, values.tolist()))
+            self._hyp_cache = version.item(), {k: t(v[k]) if k in v else t for k, t in spec.items()}
+        return self._hyp_cache[1]
+
+    @hyp.setter
+    def hyp(self, hyp):
+        """
+        Sets augmentation hyperparameters, numeric values updated in place in shared memory if the keys, types and
+        non-numeric values are unchanged, i.e. to rebind a reused dataset and its persistent dataloader workers to a new
+        evolution trial.
+        """
+        self._hyp_cache = -1, None
+        if hyp is None:
+            self._hyp = None
+            return
+        numeric = {k: v for k, v in hyp.items() if isinstance(v, (int, float))}  # shared, as float64
+        spec = {k: type(v) if k in numeric else v for k, v in hyp.items()}  # key order, numeric types, other values
+        values = torch.tensor(list(numeric.values()), dtype=torch.float64)
+        if getattr(self, "_hyp", None) is not None and self._hyp[0] == spec:
+            self._hyp[2][:] = values
+            self._hyp[3].add_(1)  # version, workers rebuild their hyp dict on the next access
+        else:
+            self._hyp = spec, list(numeric), values.share_memory_(), torch.zeros((), dtype=torch.int64).share_memory_()
+
     def check_cache_ram(self, safety_margin=0.1, prefix=""):
         """Checks if available RAM is sufficient for caching images, adjusting for a safety margin."""
         b, gb = 0, 1 << 30  # bytes of cached images, bytes per gigabytes
@@ -771,6 +1032,10 @@ class LoadImagesAndLabels(Dataset):
 
     def __getitem__(self, index):
         """Fetches the dataset item at the given index, considering linear, shuffled, or weighted sampling."""
+        if isinstance(index, tuple):  # (index, seed) from ResumableSampler
+            index, seed = index
+            random.seed(seed)
+            np.random.seed(seed)
         index = self.indices[index]  # linear, shuffled, or image_weights
 
         hyp = self.hyp
@@ -1018,15 +1283,19 @@ class LoadImagesAndLabels(Dataset):
         return img9, labels9
 
     @staticmethod
-    def collate_fn(batch):
-        """Batches images, labels, paths, and shapes, assigning unique indices to targets in merged label tensor."""
+    def collate_fn(batch, memory_format=torch.contiguous_format, assigner=None):
+        """
+        Batches images, labels, paths, and shapes, assigning unique indices to targets in merged label tensor, and
+        appends the targets assigned to anchors by `assigner` if given.
+        """
         im, label, path, shapes = zip(*batch)  # transposed
         for i, lb in enumerate(label):
             lb[:, 0] = i  # add target image index for build_targets()
-        return torch.stack(im, 0), torch.cat(label, 0), path, shapes
+        im, label = torch.stack(im, 0).contiguous(memory_format=memory_format), torch.cat(label, 0)
+        return (im, label, path, shapes, assigner(im, label)) if assigner else (im, label, path, shapes)
 
     @staticmethod
-    def collate_fn4(batch):
+    def collate_fn4(batch, memory_format=torch.contiguous_format, assigner=None):
         """Bundles a batch's data by quartering the number of shapes and paths, preparing it for model input."""
         im, label, path, shapes = zip(*batch)  # transposed
         n = len(shapes) // 4
@@ -1051,7 +1320,8 @@ class LoadImagesAndLabels(Dataset):
         for i, lb in enumerate(label4):
             lb[:, 0] = i  # add target image index for build_targets()
 
-        return torch.stack(im4, 0), torch.cat(label4, 0), path4, shapes4
+        im4, label4 = torch.stack(im4, 0).contiguous(memory_format=memory_format), torch.cat(label4, 0)
+        return (im4, label4, path4, shapes4, assigner(im4, label4)) if assigner else (im4, label4, path4, shapes4)
 
 
 # Ancillary functions --------------------------------------------------------------------------------------------------
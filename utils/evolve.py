@@ -0,0 +1,146 @@
+# Ultralytics 🚀 AGPL-3.0 License - https://ultralytics.com/license
+"""Surrogate-model hyperparameter search utils."""
+
+import math
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.linalg import cho_solve, solve_triangular
+from scipy.stats import norm
+
+from utils.general import LOGGER, colorstr
+from utils.metrics import fitness
+
+PREFIX = colorstr("evolve: ")
+
+
+class GaussianProcess:
+    """Gaussian process regressor with a Matern 5/2 kernel, its lengthscale and noise chosen by marginal likelihood."""
+
+    def __init__(self, lengthscales=(0.1, 0.2, 0.4, 0.8, 1.6), noises=(1e-4, 1e-3, 1e-2, 1e-1)):
+        """Initializes the GP with the lengthscale and noise grids searched on each fit, inputs scaled to [0, 1]."""
+        self.lengthscales, self.noises = lengthscales, noises
+
+    @staticmethod
+    def kernel(a, b, ls):
+        """Returns the Matern 5/2 kernel matrix between points `a` (n, d) and `b` (m, d) at lengthscale `ls`."""
+        d = np.sqrt(((a[:, None] - b[None]) ** 2).sum(-1)) * math.sqrt(5) / ls
+        return (1 + d + d**2 / 3) * np.exp(-d)
+
+    def fit(self, x, y):
+        """Fits the GP to observations `x` (n, d) and `y` (n,), keeping the grid point of best marginal likelihood."""
+        self.x, self.mu, self.sd = x, y.mean(), y.std() + 1e-9
+        z, best = (y - self.mu) / self.sd, -np.inf
+        for ls in self.lengthscales:
+            k = self.kernel(x, x, ls)
+            for noise in self.noises:
+                try:
+                    c = np.linalg.cholesky(k + noise * np.eye(len(x)))
+                except np.linalg.LinAlgError:
+                    continue
+                alpha = cho_solve((c, True), z)
+                lml = -0.5 * z @ alpha - np.log(np.diag(c)).sum()  # log marginal likelihood, constant dropped
+                if lml > best:
+                    best, self.ls, self.c, self.alpha = lml, ls, c, alpha
+        return self
+
+    def predict(self, x):
+        """Returns the posterior mean and standard deviation at points `x` (m, d)."""
+        k = self.kernel(x, self.x, self.ls)
+        v = solve_triangular(self.c, k.T, lower=True)
+        std = np.sqrt(np.clip(1 - (v**2).sum(0), 1e-12, None))
+        return k @ self.alpha * self.sd + self.mu, std * self.sd
+
+
+def expected_improvement(mean, std, best, xi=0.01):
+    """Returns the expected improvement over fitness `best` of GP posterior `mean` and `std`, `xi` for exploration."""
+    z = (mean - best - xi) / std
+    return (mean - best - xi) * norm.cdf(z) + std * norm.pdf(z)
+
+
+def propose(x, y, n=1, rng=None, n_init=8, candidates=4096):
+    """
+    Returns `n` new points in [0, 1]^d maximizing the expected improvement of a GP fit to observations `x` and `y`.
+
+    Candidates are uniform samples plus Gaussian perturbations of the 5 fittest observations. Batches of `n` are chosen
+    one at a time, each proposal added as an observation of its predicted mean (kriging believer), so parallel trials
+    explore different points. Points are uniform random while fewer than `n_init` observations exist.
+    """
+    rng = rng or np.random.default_rng()
+    d = x.shape[1]
+    if len(y) < n_init:
+        return rng.uniform(size=(n, d))
+    p = []
+    for _ in range(n):
+        gp = GaussianProcess().fit(x, y)
+        top = x[np.argsort(y)[-5:]]
+        local = top[rng.integers(len(top), size=candidates)] + rng.normal(0, 0.05, (candidates, d))
+        c = np.concatenate((rng.uniform(size=(candidates, d)), local.clip(0, 1)))
+        mean, std = gp.predict(c)
+        i = expected_improvement(mean, std, y.max()).argmax()
+        p.append(c[i])
+        x, y = np.concatenate((x, c[i : i + 1])), np.append(y, mean[i])
+    return np.stack(p)
+
+
+def load_evolve(evolve_csv, keys):
+    """
+    Returns hyperparameters `keys` (n, len(keys)), fitness (n,) and full-budget mask (n,) of all evolve.csv rows.
+
+    Rows trained for fewer epochs than the longest, i.e. trials cut by successive halving, are False in the mask, as
+    their fitness is not comparable. Arrays are empty if there is no file.
+    """
+    if not Path(evolve_csv).exists():
+        return np.zeros((0, len(keys))), np.zeros(0), np.zeros(0, bool)
+    data = pd.read_csv(evolve_csv, skipinitialspace=True)
+    data = data.rename(columns=lambda x: x.strip())  # strip keys
+    full = (data["epochs"] == data["epochs"].max()).values if "epochs" in data else np.ones(len(data), bool)
+    return data[keys].values.astype(float), fitness(data.values), full
+
+
+def replay_evolve(evolve_csv="path/to/evolve.csv", target=None, n_init=8, seeds=5):
+    """
+    Replays a recorded evolve.csv, returning the trials each search strategy needs to reach fitness `target`.
+
+    The recorded rows form a fixed candidate pool whose fitness is revealed when a strategy picks them: 'ga' in recorded
+    order, 'random' in `seeds` shuffled orders averaged and 'gp' by expected improvement after the first `n_init`
+    recorded rows. `target` defaults to the best recorded fitness. Strategies that never reach it count all rows. Trials
+    cut by successive halving are left out.
+
+    Example: from utils.evolve import *; replay_evolve('runs/evolve/exp/evolve.csv')
+    """
+    data = pd.read_csv(evolve_csv, skipinitialspace=True)
+    data = data.rename(columns=lambda x: x.strip())
+    if "epochs" in data:  # full-budget trials
+        data = data[data["epochs"] == data["epochs"].max()].drop(columns="epochs")
+    x, y = data.values[:, 7:].astype(float), fitness(data.values)
+    lo, hi = x.min(0), x.max(0)
+    x = (x[:, hi > lo] - lo[hi > lo]) / (hi - lo)[hi > lo]  # varied hyperparameters scaled to [0, 1]
+    target = y.max() if target is None else target
+    n = len(y)
+
+    def trials(order):
+        """Returns the 1-based position in `order` of the first row reaching `target`."""
+        hit = np.nonzero(y[order] >= target)[0]
+        return hit[0] + 1 if len(hit) else n
+
+    def gp():
+        """Returns the trials GP expected improvement needs, starting from the first `n_init` recorded rows."""
+        seen = list(range(min(n_init, n)))
+        while y[seen].max() < target and len(seen) < n:
+            rest = np.setdiff1d(np.arange(n), seen)
+            mean, std = GaussianProcess().fit(x[seen], y[seen]).predict(x[rest])
+            seen.append(rest[expected_improvement(mean, std, y[seen].max()).argmax()])
+        return len(seen)
+
+    results = {
+        "ga": float(trials(np.arange(n))),
+        "random": float(np.mean([trials(np.random.default_rng(s).permutation(n)) for s in range(seeds)])),
+        "gp": float(gp()),
+    }
+    LOGGER.info(
+        f"{PREFIX}trials to reach fitness {target:.4f} in {n} recorded rows of {evolve_csv}: "
+        + ", ".join(f"{k} {v:.1f} ({v / results['ga']:.0%} of ga)" for k, v in results.items())
+    )
+    return results
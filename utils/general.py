@@ -295,6 +295,25 @@ def init_seeds(seed=0, deterministic=False):
         os.environ["PYTHONHASHSEED"] = str(seed)
 
 
+def get_rng_states():
+    """Returns a dict of python, numpy, torch and CUDA RNG states for restoring with `set_rng_states()`."""
+    return {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+        "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else [],
+    }
+
+
+def set_rng_states(states):
+    """Restores python, numpy, torch and CUDA RNG states saved by `get_rng_states()`."""
+    random.setstate(states["python"])
+    np.random.set_state(states["numpy"])
+    torch.set_rng_state(states["torch"])
+    if states["cuda"] and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(states["cuda"])
+
+
 def intersect_dicts(da, db, exclude=()):
     """Returns intersection of `da` and `db` dicts with matching keys and shapes, excluding `exclude` keys; uses `da`
     values.
@@ -1136,19 +1155,26 @@ def strip_optimizer(f="best.pt", s=""):
     x["model"].half()  # to FP16
     for p in x["model"].parameters():
         p.requires_grad = False
-    torch.save(x, s or f)
+    tmp = Path(s or f).with_name(f".{Path(s or f).name}.tmp")
+    torch.save(x, tmp)
+    os.replace(tmp, s or f)  # atomic, and leaves other hard links to a checkpoint unstripped
     mb = os.path.getsize(s or f) / 1e6  # filesize
     LOGGER.info(f"Optimizer stripped from {f},{f' saved as {s},' if s else ''} {mb:.1f}MB")
 
 
 def print_mutation(keys, results, hyp, save_dir, bucket, prefix=colorstr("evolve: ")):
-    """Logs evolution results and saves to CSV and YAML in `save_dir`, optionally syncs with `bucket`."""
+    """
+    Logs evolution results and saves to CSV and YAML in `save_dir`, optionally syncs with `bucket`.
+
+    The best generation is chosen among rows with the most `epochs`, if recorded, skipping trials cut by successive
+    halving.
+    """
     evolve_csv = save_dir / "evolve.csv"
     evolve_yaml = save_dir / "hyp_evolve.yaml"
     keys = tuple(keys) + tuple(hyp.keys())  # [results + hyps]
     keys = tuple(x.strip() for x in keys)
-    vals = results + tuple(hyp.values())
-    n = len(keys)
+    vals = tuple(results) + tuple(hyp.values())
+    n, nr = len(keys), len(results)
 
     # Download (optional)
     if bucket:
@@ -1165,20 +1191,21 @@ def print_mutation(keys, results, hyp, save_dir, bucket, prefix=colorstr("evolve
     with open(evolve_yaml, "w") as f:
         data = pd.read_csv(evolve_csv, skipinitialspace=True)
         data = data.rename(columns=lambda x: x.strip())  # strip keys
-        i = np.argmax(fitness(data.values[:, :4]))  #
+        full = data["epochs"] == data["epochs"].max() if "epochs" in data else True  # full-budget trials
+        i = np.argmax(np.where(full, fitness(data.values[:, :4]), -np.inf))
         generations = len(data)
         f.write(
             "# YOLOv5 Hyperparameter Evolution Results\n"
             + f"# Best generation: {i}\n"
             + f"# Last generation: {generations - 1}\n"
             + "# "
-            + ", ".join(f"{x.strip():>20s}" for x in keys[:7])
+            + ", ".join(f"{x.strip():>20s}" for x in keys[:nr])
             + "\n"
             + "# "
-            + ", ".join(f"{x:>20.5g}" for x in data.values[i, :7])
+            + ", ".join(f"{x:>20.5g}" for x in data.values[i, :nr])
             + "\n\n"
         )
-        yaml.safe_dump(data.loc[i][7:].to_dict(), f, sort_keys=False)
+        yaml.safe_dump(data.loc[i][nr:].to_dict(), f, sort_keys=False)
 
     # Print to screen
     LOGGER.info(
@@ -5,7 +5,7 @@ import torch
 import torch.nn as nn
 
 from utils.metrics import bbox_iou
-from utils.torch_utils import de_parallel
+from utils.torch_utils import de_parallel, time_sync
 
 
 def smooth_BCE(eps=0.1):
@@ -103,6 +103,75 @@ class QFocalLoss(nn.Module):
             return loss
 
 
+def build_targets(targets, anchors, shapes, anchor_t=4.0):
+    """
+    Assigns targets (image,class,x,y,w,h) to anchors and grid cells, returning class, box, indices, and anchors.
+
+    `anchors` (nl, na, 2) are in grid units and `shapes` are the (ny, nx) grid shapes of each output layer. Each target
+    matches the anchors within wh ratio `anchor_t` in its own grid cell and the 2 neighboring cells nearest its center.
+    """
+    na, nt = anchors.shape[1], targets.shape[0]  # number of anchors, targets
+    tcls, tbox, indices, anch = [], [], [], []
+    gain = torch.ones(7, device=targets.device)  # normalized to gridspace gain
+    ai = torch.arange(na, device=targets.device).float().view(na, 1).repeat(1, nt)  # same as .repeat_interleave(nt)
+    targets = torch.cat((targets.repeat(na, 1, 1), ai[..., None]), 2)  # append anchor indices
+
+    g = 0.5  # bias
+    off = (
+        torch.tensor(
+            [
+                [0, 0],
+                [1, 0],
+                [0, 1],
+                [-1, 0],
+                [0, -1],  # j,k,l,m
+                # [1, 1], [1, -1], [-1, 1], [-1, -1],  # jk,jm,lk,lm
+            ],
+            device=targets.device,
+        ).float()
+        * g
+    )  # offsets
+
+    for i, shape in enumerate(shapes):
+        ny, nx = (int(x) for x in shape)  # grid shape
+        gain[2:6] = torch.tensor([nx, ny, nx, ny])  # xyxy gain
+
+        # Match targets to anchors
+        t = targets * gain  # shape(3,n,7)
+        if nt:
+            # Matches
+            r = t[..., 4:6] / anchors[i, :, None]  # wh ratio
+            j = torch.max(r, 1 / r).max(2)[0] < anchor_t  # compare
+            # j = wh_iou(anchors, t[:, 4:6]) > model.hyp['iou_t']  # iou(3,n)=wh_iou(anchors(3,2), gwh(n,2))
+            t = t[j]  # filter
+
+            # Offsets
+            gxy = t[:, 2:4]  # grid xy
+            gxi = gain[[2, 3]] - gxy  # inverse
+            j, k = ((gxy % 1 < g) & (gxy > 1)).T
+            l, m = ((gxi % 1 < g) & (gxi > 1)).T
+            j = torch.stack((torch.ones_like(j), j, k, l, m))
+            t = t.repeat((5, 1, 1))[j]
+            offsets = (torch.zeros_like(gxy)[None] + off[:, None])[j]
+        else:
+            t = targets[0]
+            offsets = 0
+
+        # Define
+        bc, gxy, gwh, a = t.chunk(4, 1)  # (image, class), grid xy, grid wh, anchors
+        a, (b, c) = a.long().view(-1), bc.long().T  # anchors, image, class
+        gij = (gxy - offsets).long()
+        gi, gj = gij.T  # grid indices
+
+        # Append
+        indices.append((b, a, gj.clamp_(0, ny - 1), gi.clamp_(0, nx - 1)))  # image, anchor, grid
+        tbox.append(torch.cat((gxy - gij, gwh), 1))  # box
+        anch.append(anchors[i, a])  # anchors
+        tcls.append(c)  # class
+
+    return tcls, tbox, indices, anch
+
+
 class ComputeLoss:
     """Computes the total loss for YOLOv5 model predictions, including classification, box, and objectness losses."""
 
@@ -134,14 +203,20 @@ class ComputeLoss:
         self.nc = m.nc  # number of classes
         self.nl = m.nl  # number of layers
         self.anchors = m.anchors
+        self.anchors_cpu = m.anchors.detach().cpu()  # for TargetAssigner() outputs
         self.device = device
 
-    def __call__(self, p, targets):  # predictions, targets
-        """Performs forward pass, calculating class, box, and object loss for given predictions and targets."""
+    def __call__(self, p, targets, assigned=None):  # predictions, targets, TargetAssigner() output
+        """
+        Performs forward pass, calculating class, box, and object loss for given predictions and targets.
+
+        Targets `assigned` by a TargetAssigner() in dataloader workers are used directly when they match the current
+        anchors and grid shapes, otherwise they are assigned here with build_targets().
+        """
         lcls = torch.zeros(1, device=self.device)  # class loss
         lbox = torch.zeros(1, device=self.device)  # box loss
         lobj = torch.zeros(1, device=self.device)  # object loss
-        tcls, tbox, indices, anchors = self.build_targets(p, targets)  # targets
+        tcls, tbox, indices, anchors = (assigned and self.load_targets(p, assigned)) or self.build_targets(p, targets)
 
         # Losses
         for i, pi in enumerate(p):  # layer index, layer predictions
@@ -192,63 +267,106 @@ class ComputeLoss:
         """Prepares model targets from input targets (image,class,x,y,w,h) for loss computation, returning class, box,
         indices, and anchors.
         """
-        na, nt = self.na, targets.shape[0]  # number of anchors, targets
-        tcls, tbox, indices, anch = [], [], [], []
-        gain = torch.ones(7, device=self.device)  # normalized to gridspace gain
-        ai = torch.arange(na, device=self.device).float().view(na, 1).repeat(1, nt)  # same as .repeat_interleave(nt)
-        targets = torch.cat((targets.repeat(na, 1, 1), ai[..., None]), 2)  # append anchor indices
-
-        g = 0.5  # bias
-        off = (
-            torch.tensor(
-                [
-                    [0, 0],
-                    [1, 0],
-                    [0, 1],
-                    [-1, 0],
-                    [0, -1],  # j,k,l,m
-                    # [1, 1], [1, -1], [-1, 1], [-1, -1],  # jk,jm,lk,lm
-                ],
-                device=self.device,
-            ).float()
-            * g
-        )  # offsets
-
-        for i in range(self.nl):
-            anchors, shape = self.anchors[i], p[i].shape
-            gain[2:6] = torch.tensor(shape)[[3, 2, 3, 2]]  # xyxy gain
-
-            # Match targets to anchors
-            t = targets * gain  # shape(3,n,7)
-            if nt:
-                # Matches
-                r = t[..., 4:6] / anchors[:, None]  # wh ratio
-                j = torch.max(r, 1 / r).max(2)[0] < self.hyp["anchor_t"]  # compare
-                # j = wh_iou(anchors, t[:, 4:6]) > model.hyp['iou_t']  # iou(3,n)=wh_iou(anchors(3,2), gwh(n,2))
-                t = t[j]  # filter
-
-                # Offsets
-                gxy = t[:, 2:4]  # grid xy
-                gxi = gain[[2, 3]] - gxy  # inverse
-                j, k = ((gxy % 1 < g) & (gxy > 1)).T
-                l, m = ((gxi % 1 < g) & (gxi > 1)).T
-                j = torch.stack((torch.ones_like(j), j, k, l, m))
-                t = t.repeat((5, 1, 1))[j]
-                offsets = (torch.zeros_like(gxy)[None] + off[:, None])[j]
-            else:
-                t = targets[0]
-                offsets = 0
-
-            # Define
-            bc, gxy, gwh, a = t.chunk(4, 1)  # (image, class), grid xy, grid wh, anchors
-            a, (b, c) = a.long().view(-1), bc.long().T  # anchors, image, class
-            gij = (gxy - offsets).long()
-            gi, gj = gij.T  # grid indices
-
-            # Append
-            indices.append((b, a, gj.clamp_(0, shape[2] - 1), gi.clamp_(0, shape[3] - 1)))  # image, anchor, grid
-            tbox.append(torch.cat((gxy - gij, gwh), 1))  # box
-            anch.append(anchors[a])  # anchors
-            tcls.append(c)  # class
-
-        return tcls, tbox, indices, anch
+        return build_targets(targets, self.anchors, [x.shape[2:4] for x in p], self.hyp["anchor_t"])
+
+    def load_targets(self, p, assigned):
+        """Returns TargetAssigner() targets on the loss device, or None if assigned for other anchors or grid shapes."""
+        targets, (anchors, anchor_t, shapes) = assigned
+        if anchor_t != self.hyp["anchor_t"] or shapes != [tuple(x.shape[2:4]) for x in p]:
+            return None  # i.e. --multi-scale batches
+        if not torch.equal(anchors, self.anchors_cpu):
+            return None  # i.e. batches collated before AutoAnchor
+        tcls, tbox, indices, anch = targets
+        d = self.device
+        return (
+            [x.to(d, non_blocking=True) for x in tcls],
+            [x.to(d, non_blocking=True) for x in tbox],
+            [tuple(x.to(d, non_blocking=True) for x in i) for i in indices],
+            [x.to(d, non_blocking=True) for x in anch],
+        )
+
+
+class TargetAssigner:
+    """
+    Assigns targets with build_targets() in dataloader workers, for ComputeLoss() to consume instead.
+
+    Anchors and anchor_t live in shared memory so update() reaches running workers. Each output carries the anchors,
+    anchor_t and grid shapes it was computed for, and ComputeLoss() assigns batches that no longer match itself.
+    """
+
+    def __init__(self, anchors, stride, anchor_t=4.0):
+        """Initializes with Detect() `anchors` (nl, na, 2) in grid units, output strides and hyp['anchor_t']."""
+        self.anchors = anchors.detach().float().cpu().clone().share_memory_()
+        self.anchor_t = torch.tensor([anchor_t], dtype=torch.float64).share_memory_()
+        self.stride = [int(s) for s in stride]
+
+    def update(self, anchors, anchor_t):
+        """Updates anchors and anchor_t in place for batches collated from now on, i.e. after AutoAnchor."""
+        self.anchors.copy_(anchors.detach())
+        self.anchor_t.fill_(float(anchor_t))
+
+    def __call__(self, im, targets):
+        """
+        Returns build_targets() of a collated batch of images `im` and `targets`, with its anchors, anchor_t and grid
+        shapes.
+        """
+        anchors, anchor_t = self.anchors.clone(), self.anchor_t.item()
+        shapes = [(im.shape[2] // s, im.shape[3] // s) for s in self.stride]
+        return build_targets(targets, anchors, shapes, anchor_t), (anchors, anchor_t, shapes)
+
+
+def profile_targets(model, imgsz=640, batch_size=16, nt=100, n=10, hyp=None):
+    """
+    Returns [method, step assignment ms, loss ms, worker assignment ms, parity] rows timing ComputeLoss() with targets
+    assigned in the training step by build_targets() versus assigned by a TargetAssigner() as in dataloader workers.
+
+    `nt` random targets per image are assigned both ways, and parity requires identical tcls, tbox, indices and anchors
+    tensors and an identical loss. `hyp` defaults to the model's, else data/hyps/hyp.scratch-low.yaml.
+
+    Example: from utils.loss import *; profile_targets(Model('models/yolov5n.yaml'), 640, 16)
+    """
+    if hyp is None and not hasattr(model, "hyp"):
+        import yaml
+
+        from utils.general import ROOT
+
+        with open(ROOT / "data/hyps/hyp.scratch-low.yaml", errors="ignore") as f:
+            hyp = yaml.safe_load(f)
+    model = de_parallel(model).train()
+    model.hyp = hyp or model.hyp
+    device, m = next(model.parameters()).device, model.model[-1]  # Detect()
+    g = torch.Generator().manual_seed(0)
+    i = torch.arange(batch_size).repeat_interleave(nt)[:, None].float()  # image index
+    c = torch.randint(m.nc, (len(i), 1), generator=g).float()  # class
+    xy, wh = torch.rand(len(i), 2, generator=g), torch.rand(len(i), 2, generator=g) * 0.5 + 0.01
+    targets = torch.cat((i, c, xy, wh), 1)
+    im = torch.zeros(batch_size, 3, imgsz, imgsz, device=device)
+    with torch.no_grad():
+        p = model(im)
+    compute_loss = ComputeLoss(model)
+    assigner = TargetAssigner(m.anchors, m.stride, model.hyp["anchor_t"])
+
+    def timed(f):
+        """Returns the output of `f()` and its mean ms over `n` calls after a warmup call."""
+        y, t = f(), time_sync()
+        for _ in range(n):
+            f()
+        return y, (time_sync() - t) / n * 1e3
+
+    td = targets.to(device)
+    built, tb = timed(lambda: compute_loss.build_targets(p, td))
+    loss, lb = timed(lambda: compute_loss(p, td)[0])
+    assigned, tw = timed(lambda: assigner(im, targets))
+    loaded, tl = timed(lambda: compute_loss.load_targets(p, assigned))
+    loss_w, lw = timed(lambda: compute_loss(p, td, assigned)[0])
+    same = loaded is not None and all(
+        torch.equal(x, y)
+        for a, b in zip(built, loaded)
+        for u, v in zip(a, b)
+        for x, y in zip(*((u, v) if isinstance(u, tuple) else ((u,), (v,))))
+    )
+    parity = same and torch.equal(loss, loss_w)
+    return [
+        ["build_targets() in step", round(tb, 2), round(lb, 2), 0.0, True],
+        ["TargetAssigner() in workers", round(tl, 2), round(lw, 2), round(tw, 2), parity],
+    ]
@@ -26,7 +26,19 @@ def smooth(y, f=0.05):
     return np.convolve(yp, np.ones(nf) / nf, mode="valid")  # y-smoothed
 
 
-def ap_per_class(tp, conf, pred_cls, target_cls, plot=False, save_dir=".", names=(), eps=1e-16, prefix=""):
+def ap_per_class(
+    tp,
+    conf,
+    pred_cls,
+    target_cls,
+    plot=False,
+    save_dir=".",
+    names=(),
+    eps=1e-16,
+    prefix="",
+    pred_counts=None,
+    target_counts=None,
+):
     """
     Compute the average precision, given the recall and precision curves.
 
@@ -38,44 +50,54 @@ def ap_per_class(tp, conf, pred_cls, target_cls, plot=False, save_dir=".", names
         target_cls:  True object classes (nparray).
         plot:  Plot precision-recall curve at mAP@0.5
         save_dir:  Plot save directory
+        pred_counts:  Detections each row stands for, with `tp` their true positive counts (nparray, binned stats)
+        target_counts:  Labels each `target_cls` row stands for (nparray, binned stats)
     # Returns
         The average precision as computed in py-faster-rcnn.
     """
-    # Sort by objectness
-    i = np.argsort(-conf)
-    tp, conf, pred_cls = tp[i], conf[i], pred_cls[i]
-
     # Find unique classes
-    unique_classes, nt = np.unique(target_cls, return_counts=True)
+    unique_classes, j = np.unique(target_cls, return_inverse=True)
+    nt = np.bincount(j, target_counts).astype(int)
     nc = unique_classes.shape[0]  # number of classes, number of detections
 
-    # Create Precision-Recall curve and compute AP for each class
+    # Sort by objectness, then stably by class into one segment per class with labels
+    i = np.argsort(-conf)
+    k = np.searchsorted(unique_classes, pred_cls[i])  # class index
+    j = k < nc
+    j[j] = (unique_classes[k[j]] == pred_cls[i[j]]) & (nt[k[j]] > 0)
+    i, k = i[j], k[j]
+    j = np.argsort(k, kind="stable")
+    i, k = i[j], k[j]
+    tp, conf = tp[i], conf[i]
+    n = np.bincount(k, minlength=nc)  # detections per class
+    c, s = np.nonzero(n)[0], n.cumsum() - n  # classes with detections, segment starts
+
+    # Accumulate TPs and detections (TPs + FPs) per class
+    tpc = tp.cumsum(0)
+    tpc -= np.repeat(tpc[s[c]] - tp[s[c]], n[c], 0)
+    dc = np.ones(len(i), int) if pred_counts is None else pred_counts[i]
+    dc = dc.cumsum() - np.repeat(dc.cumsum()[s[c]] - dc[s[c]], n[c])
+
+    # Recall and precision curves, at pr_score
     px, py = np.linspace(0, 1, 1000), []  # for plotting
     ap, p, r = np.zeros((nc, tp.shape[1])), np.zeros((nc, 1000)), np.zeros((nc, 1000))
-    for ci, c in enumerate(unique_classes):
-        i = pred_cls == c
-        n_l = nt[ci]  # number of labels
-        n_p = i.sum()  # number of predictions
-        if n_p == 0 or n_l == 0:
-            continue
-
-        # Accumulate FPs and TPs
-        fpc = (1 - tp[i]).cumsum(0)
-        tpc = tp[i].cumsum(0)
-
-        # Recall
-        recall = tpc / (n_l + eps)  # recall curve
-        r[ci] = np.interp(-px, -conf[i], recall[:, 0], left=0)  # negative x, xp because xp decreases
-
-        # Precision
-        precision = tpc / (tpc + fpc)  # precision curve
-        p[ci] = np.interp(-px, -conf[i], precision[:, 0], left=1)  # p at pr_score
-
-        # AP from recall-precision curve
-        for j in range(tp.shape[1]):
-            ap[ci, j], mpre, mrec = compute_ap(recall[:, j], precision[:, j])
-            if plot and j == 0:
-                py.append(np.interp(px, mrec, mpre))  # precision at mAP@0.5
+    recall = tpc / (nt[k, None] + eps)  # recall curve
+    precision = tpc / dc[:, None]  # precision curve
+    r[c] = interp_segments(-px, -conf, recall[:, 0], n[c], left=0)  # negative x, xp because xp decreases
+    p[c] = interp_segments(-px, -conf, precision[:, 0], n[c], left=1)
+
+    # AP from recall-precision curves of all classes and thresholds, see compute_ap()
+    m = n[c] + 2  # curve lengths with sentinels
+    i = np.arange(len(k)) + 2 * np.searchsorted(c, k) + 1  # curve positions after start sentinels
+    mrec, mpre = np.zeros((tp.shape[1], m.sum())), np.zeros((tp.shape[1], m.sum()))
+    mrec[:, m.cumsum() - 1], mpre[:, m.cumsum() - m] = 1.0, 1.0
+    mrec[:, i], mpre[:, i] = recall.T, precision.T
+    mpre = segment_cummax(mpre, m)  # precision envelopes
+    x = np.linspace(0, 1, 101)  # 101-point interp (COCO)
+    y = interp_segments(x, mrec.ravel(), mpre.ravel(), np.tile(m, tp.shape[1]))  # (niou * len(c), 101)
+    ap[c] = trapz(y, x).reshape(tp.shape[1], -1).T
+    if plot:
+        py = list(interp_segments(px, mrec[0], mpre[0], m))  # precision at mAP@0.5
 
     # Compute F1 (harmonic mean of precision and recall)
     f1 = 2 * p * r / (p + r + eps)
@@ -113,7 +135,7 @@ def compute_ap(recall, precision):
     method = "interp"  # methods: 'continuous', 'interp'
     if method == "interp":
         x = np.linspace(0, 1, 101)  # 101-point interp (COCO)
-        ap = np.trapz(np.interp(x, mrec, mpre), x)  # integrate
+        ap = trapz(np.interp(x, mrec, mpre), x)  # integrate
     else:  # 'continuous'
         i = np.where(mrec[1:] != mrec[:-1])[0]  # points where x axis (recall) changes
         ap = np.sum((mrec[i + 1] - mrec[i]) * mpre[i + 1])  # area under curve
@@ -121,6 +143,169 @@ def compute_ap(recall, precision):
     return ap, mpre, mrec
 
 
+def trapz(y, x):
+    """Integrates `y` (..., n) over `x` (n,) along the last axis with the trapezoidal rule, exactly like np.trapz()."""
+    return (np.diff(x) * (y[..., 1:] + y[..., :-1]) / 2.0).sum(-1)
+
+
+def segment_cummax(x, lengths):
+    """
+    Returns the reverse cumulative maximum of `x` (..., L) along its last axis within consecutive segments of `lengths`,
+    i.e. np.flip(np.maximum.accumulate(np.flip(segment))) of every segment, all leading axes at once.
+    """
+    x, s = x.copy(), np.cumsum(lengths) - lengths
+    for a, b in zip(s, s + lengths):
+        x[..., a:b] = np.flip(np.maximum.accumulate(np.flip(x[..., a:b], -1), -1), -1)
+    return x
+
+
+def interp_segments(x, xp, fp, lengths, left=None):
+    """
+    Returns np.interp(x, xp_i, fp_i, left) of every segment i of `xp` and `fp` split into consecutive `lengths`, as a
+    (len(lengths), len(x)) array.
+
+    Segments are located for all queries at once by counting their points <= each sorted query, and interpolated with
+    np.interp() arithmetic so results are bit-identical. `xp` segments must be increasing, `left` defaults to fp_i[0].
+    """
+    x, xp, fp = (np.asarray(a, dtype=np.float64) for a in (x, xp, fp))
+    o, q, s = np.argsort(x, kind="stable"), len(x), (np.cumsum(lengths) - lengths)[:, None]
+    xs, seg = x[o], np.repeat(np.arange(len(lengths)), lengths)
+    j = np.bincount(seg * (q + 1) + np.searchsorted(xs, xp), minlength=len(lengths) * (q + 1))
+    j = j.reshape(-1, q + 1).cumsum(1)[:, :q] - 1  # index of the last segment point <= query, -1 if none
+    a = s + j.clip(0)
+    b = np.minimum(a + 1, s + lengths[:, None] - 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        y = (fp[b] - fp[a]) / (xp[b] - xp[a]) * (xs - xp[a]) + fp[a]
+    y = np.where((a == b) | (xp[a] == xs), fp[a], y)  # last point or exact match
+    y = np.where(j < 0, fp[s] if left is None else left, y)
+    out = np.empty_like(y)
+    out[:, o] = y
+    return out
+
+
+class APAccumulator:
+    """
+    Accumulates the detection matches of ap_per_class() image by image, exactly or binned in fixed memory.
+
+    With bins=0 (default) it keeps every (correct, conf, pcls, tcls) and computes metrics exactly like ap_per_class().
+    With bins > 0 it instead counts detections and true positives per class, IoU threshold and confidence bin
+    [k / bins, (k + 1) / bins), and labels per class, in O(nc * niou * bins) memory independent of the dataset size.
+
+    Binned PR curves are exact at the bin edges, so P, R and F1 are exact at confidences k / bins. AP integrates the
+    curve through those points and differs from exact AP only by how detections are ordered inside bins. Over the
+    recall gained in bin k both precision envelopes lie between the binned envelope e_k after the bin and the larger of
+    e_(k-1) before it and the highest precision any ordering reaches in bin k or later (true positives first), so
+    |AP - exact AP| is at most the 101-point integral of that range. compute() stores this bound per class and threshold
+    as `ap_error`, shaped like AP, and it shrinks as bins grow. Accumulators of the same mode merge with `+=`.
+    """
+
+    def __init__(self, nc, niou=10, bins=0, device="cpu"):
+        """Initializes an exact (bins=0) or binned accumulator for `nc` classes and `niou` IoU thresholds."""
+        self.nc, self.niou, self.bins = nc, niou, bins
+        self.stats, self.index = [], []  # exact (correct, conf, pcls, tcls) per image and image index for merging
+        self.n = torch.zeros(nc * bins, dtype=torch.long, device=device)  # detections per class and bin
+        self.tp = torch.zeros(niou, nc * bins, dtype=torch.long, device=device)  # true positives per class and bin
+        self.nt = torch.zeros(nc, dtype=torch.long, device=device)  # labels per class
+        self.ap_error = None
+
+    def update(self, correct, conf, pcls, tcls, index=None):
+        """Adds one image's (N, niou) `correct`, (N,) `conf` and `pcls` and (M,) `tcls`, `index` ordering merges."""
+        if not self.bins:
+            self.stats.append((correct, conf, pcls, tcls))
+            self.index.append(index)
+            return
+        self.nt.index_add_(0, tcls.long(), torch.ones_like(tcls, dtype=torch.long))
+        i = pcls.long() * self.bins + (conf * self.bins).long().clamp_(0, self.bins - 1)  # class and bin
+        self.n.index_add_(0, i, torch.ones_like(i))
+        self.tp.index_add_(1, i, correct.T.long())
+
+    def __iadd__(self, other):
+        """Merges `other` into this accumulator, restoring image index order of exact stats where indices exist."""
+        if not self.bins:
+            index, stats = self.index + other.index, self.stats + other.stats
+            if None not in index:
+                i = sorted(range(len(index)), key=index.__getitem__)
+                index, stats = [index[j] for j in i], [stats[j] for j in i]
+            self.index, self.stats = index, stats
+        else:
+            self.n += other.n.to(self.n.device)
+            self.tp += other.tp.to(self.n.device)
+            self.nt += other.nt.to(self.n.device)
+        return self
+
+    def cpu(self):
+        """Moves accumulated stats to the CPU, i.e. before gathering them across processes, and returns self."""
+        self.stats = [tuple(x.cpu() for x in s) for s in self.stats]
+        self.n, self.tp, self.nt = self.n.cpu(), self.tp.cpu(), self.nt.cpu()
+        return self
+
+    def targets(self):
+        """Returns the number of labels per class."""
+        if self.bins:
+            return self.nt.cpu().numpy()
+        tcls = torch.cat([s[3] for s in self.stats]).cpu().numpy() if self.stats else np.zeros(0)
+        return np.bincount(tcls.astype(int), minlength=self.nc)
+
+    def compute(self, **kwargs):
+        """Returns ap_per_class() results of the accumulated stats, passing `kwargs`, or None without true positives."""
+        if not self.bins:
+            stats = [torch.cat(x, 0).cpu().numpy() for x in zip(*self.stats)]
+            return ap_per_class(*stats, **kwargs) if len(stats) and stats[0].any() else None
+        n, tp, nt = self.n.cpu().numpy(), self.tp.cpu().numpy(), self.nt.cpu().numpy()
+        if not tp.any():
+            return None
+        c, b = np.divmod(np.nonzero(n)[0], self.bins)  # class and bin of each non-empty bin
+        k = nt > 0
+        results = ap_per_class(
+            tp[:, n > 0].T, b / self.bins, c, np.nonzero(k)[0], pred_counts=n[n > 0], target_counts=nt[k], **kwargs
+        )
+
+        # AP error bound per class and threshold, bins in descending confidence
+        self.ap_error, x = np.zeros((k.sum(), self.niou)), np.linspace(0, 1, 101)
+        n, tp = n.reshape(self.nc, self.bins)[:, ::-1], tp.reshape(self.niou, self.nc, self.bins)[..., ::-1]
+        for ci, c in enumerate(np.nonzero(k)[0]):
+            i = n[c] > 0
+            nb, tb = n[c, i], tp[:, c, i]  # (K,) detections and (niou, K) true positives of non-empty bins
+            tpc, dc = tb.cumsum(1), nb.cumsum()
+            one, zero = np.ones((self.niou, 1)), np.zeros((self.niou, 1))
+            hi = np.where(tb > 0, tpc / np.maximum(dc - nb + tb, 1), 0)  # precision with the bin's true positives first
+            hi = np.flip(np.maximum.accumulate(np.flip(hi, 1), 1), 1)
+            env = np.flip(np.maximum.accumulate(np.flip(np.concatenate((one, tpc / dc, zero), 1), 1), 1), 1)
+            rec = np.concatenate((zero, tpc / nt[c], one), 1)
+            span = np.concatenate((np.maximum(env[:, :-2], hi) - env[:, 1:-1], zero), 1)  # per recall segment
+            inside = (rec[:, :-1, None] <= x) & (x <= rec[:, 1:, None])  # segments holding each 101-point sample
+            self.ap_error[ci] = trapz((span[..., None] * inside).max(1), x)
+        return results
+
+
+def match_predictions(iou, correct_class, iouv):
+    """
+    Returns a (N, len(iouv)) bool tensor of the detections matched to a label at each IoU threshold, on `iou`'s device.
+
+    Each detection picks its highest-IoU label of the same class, which is the same label at every threshold it clears,
+    and each label then keeps the first (highest confidence) detection that picked it. All thresholds are matched at
+    once with (T, N) operations and no host transfers.
+
+    Arguments:
+        iou (Tensor[M, N]): IoU of M labels and N confidence-sorted detections.
+        correct_class (Tensor[M, N]): Whether the label and detection classes match.
+        iouv (Tensor[T]): IoU thresholds.
+    """
+    n = iou.shape[1]
+    if iou.shape[0] == 0 or n == 0:
+        return torch.zeros(n, len(iouv), dtype=torch.bool, device=iou.device)
+    v, best = torch.where(correct_class, iou, -1.0).max(0)  # best same-class label of each detection and its IoU
+    best, i = best.sort(stable=True)  # detections grouped by label, in confidence order within groups
+    m = v[i] >= iouv[:, None]  # (T, N) detections clearing each threshold
+    c = m.cumsum(1)
+    start = torch.ones_like(best, dtype=torch.bool)
+    start[1:] = best[1:] != best[:-1]  # first detection of each label group
+    first = m & (c - (c - m.long())[:, start][:, start.cumsum(0) - 1] == 1)  # first detection clearing t per label
+    correct = torch.zeros_like(first)
+    correct[:, i] = first
+    return correct.T
+
+
 class ConfusionMatrix:
     """Generates and visualizes a confusion matrix for evaluating object detection classification performance."""
 
@@ -143,41 +328,36 @@ class ConfusionMatrix:
         Returns:
             None, updates confusion matrix accordingly
         """
+        nc = self.nc
         if detections is None:
-            gt_classes = labels.int()
-            for gc in gt_classes:
-                self.matrix[self.nc, gc] += 1  # background FN
+            self.update(np.full(len(labels), nc), labels.int().cpu().numpy())  # background FN
             return
 
         detections = detections[detections[:, 4] > self.conf]
         gt_classes = labels[:, 0].int()
         detection_classes = detections[:, 5].int()
         iou = box_iou(labels[:, 1:], detections[:, :4])
+        if iou.numel() == 0:
+            self.update(np.full(len(labels), nc), gt_classes.cpu().numpy())  # true background
+            return
 
-        x = torch.where(iou > self.iou_thres)
-        if x[0].shape[0]:
-            matches = torch.cat((torch.stack(x, 1), iou[x[0], x[1]][:, None]), 1).cpu().numpy()
-            if x[0].shape[0] > 1:
-                matches = matches[matches[:, 2].argsort()[::-1]]
-                matches = matches[np.unique(matches[:, 1], return_index=True)[1]]
-                matches = matches[matches[:, 2].argsort()[::-1]]
-                matches = matches[np.unique(matches[:, 0], return_index=True)[1]]
-        else:
-            matches = np.zeros((0, 3))
-
-        n = matches.shape[0] > 0
-        m0, m1, _ = matches.transpose().astype(int)
-        for i, gc in enumerate(gt_classes):
-            j = m0 == i
-            if n and sum(j) == 1:
-                self.matrix[detection_classes[m1[j]], gc] += 1  # correct
-            else:
-                self.matrix[self.nc, gc] += 1  # true background
-
-        if n:
-            for i, dc in enumerate(detection_classes):
-                if not any(m1 == i):
-                    self.matrix[dc, self.nc] += 1  # predicted background
+        m = iou > self.iou_thres
+        best = torch.where(m, iou, -1.0).argmax(0)  # best label of each detection
+        m &= torch.arange(len(labels), device=iou.device)[:, None] == best  # (M, N) one label per detection
+        j = torch.where(m, iou, -1.0).argmax(1)  # highest IoU detection of each label
+        matched = m.any(1)
+        rows, cols = torch.where(matched, detection_classes[j], nc), gt_classes  # correct or true background
+        if matched.any():  # predicted background, only counted if any label matched
+            unmatched = torch.ones_like(detection_classes, dtype=torch.bool)
+            unmatched[j[matched]] = False
+            rows = torch.cat((rows, detection_classes[unmatched]))
+            cols = torch.cat((cols, torch.full_like(detection_classes[unmatched], nc)))
+        self.update(rows.cpu().numpy(), cols.cpu().numpy())
+
+    def update(self, rows, cols):
+        """Adds one count at each (predicted class, true class) pair of `rows` and `cols`, with `nc` as background."""
+        n = self.nc + 1
+        self.matrix += np.bincount(rows * n + cols, minlength=n * n).reshape(n, n)
 
     def tp_fp(self):
         """Calculates true positives (tp) and false positives (fp) excluding the background class from the confusion
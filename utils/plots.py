@@ -407,14 +407,17 @@ def plot_evolve(evolve_csv="path/to/evolve.csv"):
     Example: from utils.plots import *; plot_evolve()
     """
     evolve_csv = Path(evolve_csv)
-    data = pd.read_csv(evolve_csv)
-    keys = [x.strip() for x in data.columns]
+    data = pd.read_csv(evolve_csv, skipinitialspace=True)
+    data = data.rename(columns=lambda x: x.strip())  # strip keys
+    if "epochs" in data:  # full-budget trials, not those cut by successive halving
+        data = data[data["epochs"] == data["epochs"].max()].drop(columns="epochs")
+    keys = list(data.columns)
     x = data.values
     f = fitness(x)
     j = np.argmax(f)  # max fitness index
     plt.figure(figsize=(10, 12), tight_layout=True)
     matplotlib.rc("font", **{"size": 8})
-    print(f"Best results from row {j} of {evolve_csv}:")
+    print(f"Best results from row {data.index[j]} of {evolve_csv}:")
     for i, k in enumerate(keys[7:]):
         v = x[:, 7 + i]
         mu = v[j]  # best single result
@@ -0,0 +1,162 @@
+# Ultralytics 🚀 AGPL-3.0 License - https://ultralytics.com/license
+"""Structured channel pruning utils."""
+
+import time
+from copy import deepcopy
+
+import torch
+import torch.nn as nn
+
+from models.common import C3, SPPF, Concat, Conv
+from models.yolo import Detect, Model
+from utils.general import LOGGER, colorstr
+from utils.torch_utils import de_parallel
+
+try:
+    import thop  # for FLOPs computation
+except ImportError:
+    thop = None
+
+PREFIX = colorstr("Prune: ")
+
+
+def importance(m, method="bn"):
+    """Returns per-output-channel importance of a Conv() layer from |BN gamma| ('bn') or filter L1 norm ('l1')."""
+    return m.bn.weight.detach().abs() if method == "bn" else m.conv.weight.detach().abs().sum((1, 2, 3))
+
+
+def keep_count(c, amount):
+    """Returns the number of channels kept when pruning `amount` of `c` channels, as a multiple of 8 and at least 8."""
+    return max(int(c * (1 - amount)) // 8 * 8, min(c, 8))
+
+
+def topk(score, n):
+    """Returns the sorted indices of the `n` highest scoring channels."""
+    return score.topk(n).indices.sort().values
+
+
+def slice_conv(m, out, inp):
+    """Physically keeps output channels `out` and input channels `inp` of a Conv() or nn.Conv2d layer and its BN."""
+    c = m.conv if isinstance(m, Conv) else m
+    w = c.weight.data[out][:, inp]
+    conv = nn.Conv2d(w.shape[1], w.shape[0], c.kernel_size, c.stride, c.padding, c.dilation, bias=c.bias is not None)
+    conv.weight.data = w.clone()
+    if c.bias is not None:
+        conv.bias.data = c.bias.data[out].clone()
+    if not isinstance(m, Conv):
+        return conv
+    bn = nn.BatchNorm2d(len(out), eps=m.bn.eps, momentum=m.bn.momentum)
+    for k in "weight", "bias", "running_mean", "running_var":
+        getattr(bn, k).data = getattr(m.bn, k).data[out].clone()
+    bn.num_batches_tracked = m.bn.num_batches_tracked.clone()
+    m.conv, m.bn = conv, bn
+    return m
+
+
+def profile_model(model, imgsz=640, n=10):
+    """Returns parameters, GFLOPs and mean fused CPU latency (ms) of a YOLOv5 model at image size `imgsz`."""
+    model = deepcopy(de_parallel(model)).float().cpu().eval()
+    im = torch.zeros(1, model.yaml.get("ch", 3), imgsz, imgsz)
+    p = sum(x.numel() for x in model.parameters())
+    flops = thop.profile(deepcopy(model), inputs=(im,), verbose=False)[0] / 1e9 * 2 if thop else 0
+    model.fuse()
+    with torch.inference_mode():
+        model(im)  # warmup
+        t = time.perf_counter()
+        for _ in range(n):
+            model(im)
+    return p, flops, (time.perf_counter() - t) / n * 1e3
+
+
+def prune_channels(model, amount=0.3, method="bn", imgsz=640):
+    """
+    Structured channel pruning of a YOLOv5 DetectionModel, physically removing Conv/C3/Bottleneck/SPPF channels.
+
+    Each channel group keeps its `1 - amount` most important channels ranked by |BN gamma| (method='bn') or filter L1
+    norm (method='l1'), rounded down to a multiple of 8. Bottleneck shortcuts share one channel set with C3.cv1, SPPF
+    hidden channels follow its input, and Concat, Upsample and Detect() inputs are re-indexed to the kept channels.
+    Returns a new Model built from the pruned yaml (width and depth multiples 1.0 with explicit channels) with the
+    surviving weights loaded. Supports the Conv, C3, SPPF, Upsample and Concat layers of the standard YOLOv5 models.
+    """
+    model = deepcopy(de_parallel(model)).float().cpu()
+    layers = model.model
+    for m in layers:
+        assert type(m) in {Conv, C3, SPPF, Concat, nn.Upsample, Detect}, f"structured pruning does not support {m.type}"
+        assert type(m) is not Conv or m.conv.groups == 1, "structured pruning does not support grouped Conv()"
+    assert method in {"bn", "l1"}, f"invalid pruning method '{method}', valid methods are 'bn' or 'l1'"
+    p0, f0, t0 = profile_model(model, imgsz)
+
+    # Output channels and input layers of each layer
+    im = torch.zeros(1, model.yaml.get("ch", 3), 64, 64)
+    ch, y, x = [], [], im
+    with torch.no_grad():
+        for m in layers[:-1]:
+            if m.f != -1:
+                x = y[m.f] if isinstance(m.f, int) else [x if j == -1 else y[j] for j in m.f]
+            x = m(x)
+            y.append(x)
+            ch.append(x.shape[1])
+    sources = [
+        [i - 1 if j == -1 else j for j in ([m.f] if isinstance(m.f, int) else m.f)] for i, m in enumerate(layers)
+    ]
+
+    # Prune
+    keep, rows = [], deepcopy(model.yaml["backbone"] + model.yaml["head"])
+    for i, m in enumerate(layers):
+        inp = [keep[j] if j >= 0 else torch.arange(im.shape[1]) for j in sources[i]]  # kept input channels
+        t = type(m)
+        if t is Conv:
+            out = topk(importance(m, method), keep_count(ch[i], amount))
+            slice_conv(m, out, inp[0])
+            rows[i][3][0] = len(out)
+        elif t is C3:
+            c_ = m.cv1.conv.out_channels
+            n = keep_count(c_, amount)
+            add = all(b.add for b in m.m)
+            s = importance(m.cv1, method) + (sum(importance(b.cv2, method) for b in m.m) if add else 0)
+            h = topk(s, n)  # residual channels shared by C3.cv1 and Bottleneck outputs
+            slice_conv(m.cv1, h, inp[0])
+            for b in m.m:
+                hb, ho = topk(importance(b.cv1, method), n), h if add else topk(importance(b.cv2, method), n)
+                slice_conv(b.cv1, hb, h)
+                slice_conv(b.cv2, ho, hb)
+                h = ho
+            h2 = topk(importance(m.cv2, method), n)
+            slice_conv(m.cv2, h2, inp[0])
+            out = topk(importance(m.cv3, method), keep_count(ch[i], amount))
+            slice_conv(m.cv3, out, torch.cat((h, h2 + c_)))
+            shortcut = rows[i][3][1] if len(rows[i][3]) > 1 else True
+            rows[i][1], rows[i][3] = len(m.m), [len(out), shortcut, 1, (n + 0.5) / len(out)]  # exact int(c2 * e) = n
+        elif t is SPPF:
+            c_ = m.cv1.conv.out_channels
+            h = topk(importance(m.cv1, method), len(inp[0]) // 2)
+            slice_conv(m.cv1, h, inp[0])
+            out = topk(importance(m.cv2, method), keep_count(ch[i], amount))
+            slice_conv(m.cv2, out, torch.cat([h + j * c_ for j in range(4)]))
+            rows[i][3][0] = len(out)
+        elif t is Concat:
+            offsets = [sum(ch[j] for j in sources[i][:k]) for k in range(len(inp))]
+            out = torch.cat([k + o for k, o in zip(inp, offsets)])
+        elif t is Detect:
+            m.m = nn.ModuleList(slice_conv(c, torch.arange(c.out_channels), x) for c, x in zip(m.m, inp))
+            break
+        else:  # nn.Upsample
+            out = inp[0]
+        keep.append(out)
+
+    # Rebuild from pruned yaml
+    d = deepcopy(model.yaml)
+    d["depth_multiple"], d["width_multiple"] = 1.0, 1.0
+    d["backbone"], d["head"] = rows[: len(d["backbone"])], rows[len(d["backbone"]) :]
+    pruned = Model(d, ch=d.get("ch", 3))
+    pruned.load_state_dict(model.state_dict())  # strict, verifies pruned yaml
+    for k in "names", "hyp":
+        if hasattr(model, k):
+            setattr(pruned, k, getattr(model, k))
+
+    p1, f1, t1 = profile_model(pruned, imgsz)
+    LOGGER.info(
+        f"{PREFIX}{method} pruned {amount:.0%} of channels: parameters {p0:.0f} -> {p1:.0f}, "
+        f"GFLOPs {f0:.1f} -> {f1:.1f}, CPU latency {t0:.1f} -> {t1:.1f} ms at {imgsz}x{imgsz}"
+    )
+    return pruned
@@ -8,7 +8,6 @@ from ..general import xywh2xyxy
 from ..loss import FocalLoss, smooth_BCE
 from ..metrics import bbox_iou
 from ..torch_utils import de_parallel
-from .general import crop_mask
 
 
 class ComputeLoss:
@@ -91,13 +90,7 @@ class ComputeLoss:
                     masks = F.interpolate(masks[None], (mask_h, mask_w), mode="nearest")[0]
                 marea = xywhn[i][:, 2:].prod(1)  # mask width, height normalized
                 mxyxy = xywh2xyxy(xywhn[i] * torch.tensor([mask_w, mask_h, mask_w, mask_h], device=self.device))
-                for bi in b.unique():
-                    j = b == bi  # matching index
-                    if self.overlap:
-                        mask_gti = torch.where(masks[bi][None] == tidxs[i][j].view(-1, 1, 1), 1.0, 0.0)
-                    else:
-                        mask_gti = masks[tidxs[i]][j]
-                    lseg += self.single_mask_loss(mask_gti, pmask[j], proto[bi], mxyxy[j], marea[j])
+                lseg += self.mask_loss(masks, b, tidxs[i], pmask, proto, mxyxy, marea)
 
             obji = self.BCEobj(pi[..., 4], tobj)
             lobj += obji * self.balance[i]  # obj loss
@@ -114,11 +107,40 @@ class ComputeLoss:
         loss = lbox + lobj + lcls + lseg
         return loss * bs, torch.cat((lbox, lseg, lobj, lcls)).detach()
 
-    def single_mask_loss(self, gt_mask, pred, proto, xyxy, area):
-        """Calculates and normalizes single mask loss for YOLOv5 between predicted and ground truth masks."""
-        pred_mask = (pred @ proto.view(self.nm, -1)).view(-1, *proto.shape[1:])  # (n,32) @ (32,80,80) -> (n,80,80)
-        loss = F.binary_cross_entropy_with_logits(pred_mask, gt_mask, reduction="none")
-        return (crop_mask(loss, xyxy).mean(dim=(1, 2)) / area).mean()
+    def mask_loss(self, masks, b, tidx, pred, proto, xyxy, area, max_elements=2**22):
+        """
+        Returns the mask loss of positives in images `b`, summed over images of their mean, in batched chunks of images.
+
+        Positives are padded per image to (images, slots) for one batched proto matmul and BCE per chunk, padded slots
+        weighted 0, and BCE is summed inside boxes by separable row and column masks instead of crop_mask(), in FP32
+        outside autocast as FP16 sums overflow. Chunks hold at most `max_elements` mask pixels (at least one image) to
+        bound memory.
+        """
+        bs, nm, h, w = proto.shape
+        n = torch.bincount(b, minlength=bs)  # positives per image
+        j, k = b.argsort(), torch.empty_like(b)  # positives grouped by image, slots
+        k[j] = torch.arange(len(b), device=b.device) - (n.cumsum(0) - n)[b[j]]  # slot within image
+        m = int(n.max())  # slots
+        coef = pred.new_zeros(bs, m, nm)
+        ti, box, weight = tidx.new_zeros(bs, m), xyxy.new_zeros(bs, m, 4), area.new_zeros(bs, m)
+        coef[b, k], ti[b, k], box[b, k], weight[b, k] = pred, tidx, xyxy, 1 / (area * n[b])  # per-image mean weights
+        c = max(1, max_elements // (m * h * w))  # images per chunk
+        gx, gy = (torch.arange(x, device=box.device, dtype=box.dtype) for x in (w, h))  # mask pixel coordinates
+        loss = torch.zeros(1, device=self.device)
+        for i in range(0, bs, c):
+            x = slice(i, i + c)
+            pred_mask = (coef[x] @ proto[x].view(-1, nm, h * w)).view(-1, h, w)  # (c * m, h, w)
+            if self.overlap:
+                gt_mask = torch.where(masks[x, None] == ti[x, :, None, None], 1.0, 0.0).view(-1, h, w)
+            else:
+                gt_mask = masks[ti[x]].view(-1, h, w)
+            lx = F.binary_cross_entropy_with_logits(pred_mask, gt_mask, reduction="none").float()
+            x1, y1, x2, y2 = box[x].float().view(-1, 4, 1).unbind(1)  # boxes (c * m, 1)
+            inside_y = ((gy >= y1) & (gy < y2))[:, None].float()  # (c * m, 1, h)
+            inside_x = ((gx >= x1) & (gx < x2))[..., None].float()  # (c * m, w, 1)
+            with torch.autocast(proto.device.type, enabled=False):  # FP32 sums of up to h * w BCE values
+                loss += ((inside_y @ lx @ inside_x).view(-1) / (h * w) * weight[x].view(-1)).sum()  # crop_mask() means
+        return loss
 
     def build_targets(self, p, targets):
         """Prepares YOLOv5 targets for loss computation; inputs targets (image, class, x, y, w, h), output target
@@ -1,13 +1,16 @@
 # Ultralytics 🚀 AGPL-3.0 License - https://ultralytics.com/license
 """PyTorch utils."""
 
+import logging
 import math
 import os
 import platform
+import shutil
 import subprocess
 import time
 import warnings
-from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
 from copy import deepcopy
 from pathlib import Path
 
@@ -17,7 +20,7 @@ import torch.nn as nn
 import torch.nn.functional as F
 from torch.nn.parallel import DistributedDataParallel as DDP
 
-from utils.general import LOGGER, check_version, colorstr, file_date, git_describe
+from utils.general import CONFIG_DIR, LOGGER, check_version, colorstr, file_date, git_describe
 
 LOCAL_RANK = int(os.getenv("LOCAL_RANK", -1))  # https://pytorch.org/docs/stable/elastic/run.html
 RANK = int(os.getenv("RANK", -1))
@@ -43,6 +46,15 @@ def smart_inference_mode(torch_1_9=check_version(torch.__version__, "1.9.0")):
     return decorate
 
 
+def smart_autocast(device, amp=False, bf16=False):
+    """Returns a bfloat16 autocast context on CPU or CUDA if `bf16`, else CUDA float16 AMP autocast if `amp`."""
+    if bf16:
+        assert check_version(torch.__version__, "1.10.0"), "bfloat16 autocast requires torch>=1.10.0"
+        assert device.type in {"cpu", "cuda"}, f"bfloat16 autocast not supported on {device.type}"
+        return torch.autocast(device.type, dtype=torch.bfloat16)
+    return torch.cuda.amp.autocast(amp)
+
+
 def smartCrossEntropyLoss(label_smoothing=0.0):
     """Returns a CrossEntropyLoss with optional label smoothing for torch>=1.10.0; warns if smoothing on lower
     versions.
@@ -54,16 +66,238 @@ def smartCrossEntropyLoss(label_smoothing=0.0):
     return nn.CrossEntropyLoss()
 
 
-def smart_DDP(model):
-    """Initializes DistributedDataParallel (DDP) for model training, respecting torch version constraints."""
+def smart_DDP(model, comm_hook=None, powersgd_rank=1, powersgd_start=1000):
+    """
+    Initializes DistributedDataParallel (DDP) for model training, respecting torch version constraints.
+
+    `comm_hook` compresses gradient all-reduces by casting to 'fp16' or 'bf16', or by a 'powersgd' low-rank
+    approximation of rank `powersgd_rank` after `powersgd_start` uncompressed iterations. CPU models use gloo groups.
+    """
     assert not check_version(torch.__version__, "1.12.0", pinned=True), (
         "torch==1.12.0 torchvision==0.13.0 DDP training is not supported due to a known issue. "
         "Please upgrade or downgrade torch to use DDP. See https://github.com/ultralytics/yolov5/issues/8395"
     )
+    ids = [LOCAL_RANK] if next(model.parameters()).device.type == "cuda" else None  # CPU models take no device ids
     if check_version(torch.__version__, "1.11.0"):
-        return DDP(model, device_ids=[LOCAL_RANK], output_device=LOCAL_RANK, static_graph=True)
+        model = DDP(model, device_ids=ids, output_device=ids and ids[0], static_graph=True)
     else:
-        return DDP(model, device_ids=[LOCAL_RANK], output_device=LOCAL_RANK)
+        model = DDP(model, device_ids=ids, output_device=ids and ids[0])
+    if comm_hook:
+        from torch.distributed.algorithms.ddp_comm_hooks import default_hooks, powerSGD_hook
+
+        if comm_hook == "powersgd":
+            state = powerSGD_hook.PowerSGDState(
+                None, matrix_approximation_rank=powersgd_rank, start_powerSGD_iter=powersgd_start
+            )
+            model.register_comm_hook(state, powerSGD_hook.powerSGD_hook)
+        else:
+            model.register_comm_hook(None, getattr(default_hooks, f"{comm_hook}_compress_hook"))
+    return model
+
+
+def smart_sync(model, sync=True):
+    """
+    Returns a context skipping the DDP gradient all-reduce of backward passes unless `sync`, i.e. for accumulated
+    micro-batches that do not step the optimizer. Gradients accumulated locally are reduced by the next synced pass.
+
+    The first pass always syncs, as DDP with static_graph=True records its graph on it. The context must include the
+    forward pass.
+    """
+    if not isinstance(model, DDP):
+        return nullcontext()
+    if sync or not getattr(model, "synced", False):
+        model.synced = True
+        return nullcontext()
+    return model.no_sync()
+
+
+def is_compiling():
+    """Returns True while torch.compile traces a model, so Python-only code that breaks graphs can be skipped."""
+    compiler = getattr(torch, "compiler", None)
+    return compiler is not None and hasattr(compiler, "is_compiling") and compiler.is_compiling()
+
+
+def smart_compile(model, dynamic=None):
+    """
+    Compiles a model with torch.compile, caching Inductor kernels on disk so later processes start fast.
+
+    dynamic=None compiles static shapes first and recompiles once with dynamic H/W when input shapes change (i.e. rect
+    batches), dynamic=True marks all dims dynamic upfront (i.e. multi-scale training). Graphs that fail to compile fall
+    back to eager mode; without torch>=2.0 the model is returned unchanged.
+    """
+    prefix = colorstr("torch.compile:")
+    if not check_version(torch.__version__, "2.0.0"):
+        LOGGER.warning(f"{prefix} WARNING ⚠️ requires torch>=2.0.0, using eager mode")
+        return model
+    try:
+        import torch._dynamo.config as dynamo_config
+        import torch._inductor.config as inductor_config
+
+        os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(CONFIG_DIR / "torchinductor"))  # persistent cache
+        inductor_config.fx_graph_cache = True
+        dynamo_config.suppress_errors = True  # eager fallback
+        LOGGER.info(f"{prefix} compiling model with cache {os.environ['TORCHINDUCTOR_CACHE_DIR']}")
+        return torch.compile(model, dynamic=dynamic)
+    except Exception as e:
+        LOGGER.warning(f"{prefix} WARNING ⚠️ compile failed, using eager mode: {e}")
+        return model
+
+
+def profile_compile(model, im, n=10):
+    """Compiles a `smart_compile()` model for input `im`, logging compile time versus eager and compiled latency."""
+    eager = getattr(model, "_orig_mod", model)
+    t = time_sync()
+    for _ in range(2):
+        model(im)  # compile, 2nd call recompiles once for the cached Detect() grids
+    tc = time_sync() - t
+    dt = []
+    for m in eager, model:
+        t = time_sync()
+        for _ in range(n):
+            m(im)
+        dt.append((time_sync() - t) / n * 1e3)  # ms/iter
+    s = f"break-even after {tc * 1e3 / (dt[0] - dt[1]):.0f} iterations" if dt[0] > dt[1] else "no speedup"
+    LOGGER.info(
+        f"{colorstr('torch.compile:')} {tc:.1f}s compile, {dt[0]:.1f} -> {dt[1]:.1f} ms/iter eager -> compiled "
+        f"({dt[0] / dt[1]:.2f}x), {s}"
+    )
+
+
+def profile_memory_format(model, imgsz=640, batch_sizes=(1, 8, 16, 32), n=10):
+    """
+    Returns [batch_size, NCHW ms/img, NHWC ms/img, speedup] rows timing `model` inference in contiguous and
+    torch.channels_last memory formats.
+    """
+    p = next(model.parameters())
+    y = []
+    for b in batch_sizes:
+        dt = []
+        for mf in torch.contiguous_format, torch.channels_last:
+            model.to(memory_format=mf)
+            im = torch.zeros(b, 3, imgsz, imgsz, device=p.device, dtype=p.dtype).contiguous(memory_format=mf)
+            with torch.inference_mode():
+                model(im)  # warmup
+                t = time_sync()
+                for _ in range(n):
+                    model(im)
+            dt.append((time_sync() - t) / n / b * 1e3)  # ms/img
+        y.append([b, round(dt[0], 2), round(dt[1], 2), round(dt[0] / dt[1], 2)])
+    model.to(memory_format=torch.contiguous_format)
+    return y
+
+
+def profile_train_step(model, imgsz=640, batch_size=8, optimizers=("SGD", "Adam"), n=10):
+    """
+    Returns [optimizer, implementation, step ms, clip + optimizer + EMA ms] rows timing training steps of `model` with
+    per-tensor loops versus multi-tensor foreach/fused optimizer, gradient clipping and EMA updates.
+    """
+    device = next(model.parameters()).device
+    im = torch.rand(batch_size, 3, imgsz, imgsz, device=device)
+    y = []
+    for name in optimizers:
+        for foreach in False, True:
+            m = deepcopy(de_parallel(model)).float().train()
+            for p in m.parameters():
+                p.requires_grad_(True)
+            optimizer = smart_optimizer(m, name, foreach=foreach)
+            ema = ModelEMA(m, foreach=foreach)
+            dt = [0.0, 0.0]
+            for i in range(n + 1):  # first step is warmup
+                t0 = time_sync()
+                sum(x.sum() for x in m(im)).backward()  # forward, backward
+                t1 = time_sync()
+                clip_gradients(m, max_norm=10.0, foreach=foreach)
+                optimizer.step()
+                optimizer.zero_grad()
+                ema.update(m)
+                t2 = time_sync()
+                if i:
+                    dt[0], dt[1] = dt[0] + t2 - t0, dt[1] + t2 - t1
+            impl = "foreach/fused" if foreach else "loop"
+            y.append([name, impl, round(dt[0] / n * 1e3, 2), round(dt[1] / n * 1e3, 2)])
+    return y
+
+
+def profile_ddp_worker(rank, world_size, port, cfg, imgsz, batch_size, accumulate, steps, configs, queue):
+    """Runs profile_ddp() `configs` on `rank` of a CPU gloo group, rank 0 putting its result rows on `queue`."""
+    from torch.distributed.algorithms.ddp_comm_hooks import default_hooks
+
+    from models.yolo import Model
+
+    os.environ.update(MASTER_ADDR="127.0.0.1", MASTER_PORT=str(port))
+    dist.init_process_group("gloo", rank=rank, world_size=world_size)
+    torch.set_num_threads(1)
+    LOGGER.setLevel(logging.WARNING)  # model summaries
+    sent = [0]  # bytes sent to collectives
+
+    def counted(f):
+        """Wraps collective `f` to count the bytes of its tensor."""
+
+        def wrapper(*args, **kwargs):
+            t = kwargs.get("tensor", args[0] if args else None)
+            sent[0] += t.numel() * t.element_size()
+            return f(*args, **kwargs)
+
+        return wrapper
+
+    dist.all_reduce, dist.broadcast = counted(dist.all_reduce), counted(dist.broadcast)  # read by comm hooks and ZeRO
+    im = torch.rand(batch_size, 3, imgsz, imgsz, generator=torch.Generator().manual_seed(rank))
+    y, p0 = [], None
+    for no_sync, hook, zero in configs:
+        torch.manual_seed(0)
+        model = Model(cfg).train()
+        ddp = smart_DDP(model, comm_hook=hook, powersgd_start=2)
+        if hook is None:
+            ddp.register_comm_hook(None, default_hooks.allreduce_hook)  # the DDP default all-reduce, counted
+        optimizer = smart_optimizer(model, "SGD", lr=1e-4, zero=zero)
+        for i in range(steps + 1):  # first step is warmup
+            if i == 1:
+                sent[0], t = 0, time_sync()
+            for j in range(accumulate):
+                with smart_sync(ddp, sync=not no_sync or j == accumulate - 1):
+                    loss = sum(x.mean() for x in ddp(im))
+                loss.backward()
+            optimizer.step()
+            optimizer.zero_grad()
+        dt = (time_sync() - t) / steps
+        state = (optimizer.optim if zero else optimizer).state.values()
+        mb = sum(x.numel() * x.element_size() for s in state for x in s.values() if torch.is_tensor(x)) / 1e6
+        p = torch.cat([x.detach().flatten() for x in model.parameters()])
+        p0 = p if p0 is None else p0
+        y.append([hook or "none", no_sync, zero, round(sent[0] / steps / 1e6, 2), round(mb, 2), round(dt * 1e3, 1)])
+        y[-1].append(float((p - p0).abs().max()))
+    if rank == 0:
+        queue.put(y)
+    dist.destroy_process_group()
+
+
+def profile_ddp(cfg="models/yolov5n.yaml", world_size=2, imgsz=320, batch_size=2, accumulate=4, steps=3, configs=None):
+    """
+    Returns [comm hook, no_sync, ZeRO, MB sent per step, optimizer state MB per rank, step ms, max |param - first|] rows
+    profiling DDP training steps of `accumulate` micro-batches on a spawned CPU gloo group of `world_size` processes.
+
+    MB sent counts every rank-0 all-reduce and broadcast tensor per optimizer step. `configs` are (no_sync, comm_hook,
+    zero) tuples, by default all-reduce per micro-batch, then no_sync alone and with each comm hook, then ZeRO.
+    """
+    import socket
+
+    import torch.multiprocessing as mp
+
+    configs = configs or [
+        (False, None, False),
+        (True, None, False),
+        (True, "fp16", False),
+        (True, "bf16", False),
+        (True, "powersgd", False),
+        (True, None, True),
+    ]
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]  # free port
+    queue = mp.get_context("spawn").SimpleQueue()
+    args = world_size, port, cfg, imgsz, batch_size, accumulate, steps, configs, queue
+    mp.spawn(profile_ddp_worker, args=args, nprocs=world_size)
+    return queue.get()
 
 
 def reshape_classifier_output(model, n=1000):
@@ -260,6 +494,84 @@ def prune(model, amount=0.3):
     LOGGER.info(f"Model pruned to {sparsity(model):.3g} global sparsity")
 
 
+class QuantWrapper(nn.Module):
+    """Exposes a YOLOv5 model's layers and single-scale forward so it can be FX-traced for INT8 quantization."""
+
+    def __init__(self, model):
+        """Wraps the layers of a YOLOv5 DetectionModel, keeping `model[-1]` as the Detect() head."""
+        super().__init__()
+        self.model, self.save = model.model, model.save
+
+    def forward(self, x):
+        """Runs the wrapped layers without augment/profile/visualize branches, which are not FX-traceable."""
+        from models.yolo import BaseModel
+
+        return BaseModel._forward_once(self, x)
+
+
+def prepare_int8(model, im, qat=False):
+    """
+    Prepares a YOLOv5 model for PyTorch FX graph mode static INT8 quantization on CPU.
+
+    The Detect() head is excluded from tracing and quantization so anchor/grid decoding stays in float. With qat=False
+    observers are inserted for post-training calibration, with qat=True Conv+BN layers are folded and fake-quantized for
+    quantization-aware training (model must be in train mode). Returns a torch.fx.GraphModule that keeps the model
+    attributes and `model[-1]` Detect() layout used by ComputeLoss and check_anchors(), see `convert_int8()`.
+    """
+    assert check_version(torch.__version__, "1.13.0"), "PyTorch INT8 quantization requires torch>=1.13"
+    from torch.ao.quantization import get_default_qat_qconfig_mapping, get_default_qconfig_mapping
+    from torch.ao.quantization.fx.custom_config import PrepareCustomConfig
+    from torch.ao.quantization.quantize_fx import prepare_fx, prepare_qat_fx
+
+    backend = "qnnpack" if platform.machine() in {"arm64", "aarch64"} else "x86"  # ARM or x86 kernels
+    torch.backends.quantized.engine = backend
+    head = type(model.model[-1])  # Detect() or Segment()
+    mapping = (get_default_qat_qconfig_mapping if qat else get_default_qconfig_mapping)(backend)
+    mapping.set_object_type(head, None)  # float head
+    custom = PrepareCustomConfig().set_non_traceable_module_classes([head])
+    m = (prepare_qat_fx if qat else prepare_fx)(QuantWrapper(deepcopy(model)), mapping, (im,), custom)
+    m.meta["fp32"] = model  # picklable FP32 model for dump_qat()
+    layers = m.model  # traced layers, Concat() and other functional layers are inlined
+    m.model = nn.Sequential(*(getattr(layers, str(i), nn.Identity()) for i in range(len(model.model))))
+    copy_attr(m, model, include=("yaml", "nc", "hyp", "names", "stride", "class_weights"))
+    return m
+
+
+def convert_int8(model):
+    """Converts an observed or fake-quantized `prepare_int8()` GraphModule to a CPU INT8 model in eval mode."""
+    from torch.ao.quantization.quantize_fx import convert_fx
+
+    q = convert_fx(deepcopy(model).cpu().eval())
+    copy_attr(q, model, include=("yaml", "nc", "names", "stride"))
+    return q
+
+
+def dump_qat(model):
+    """
+    Returns a picklable copy of a QAT `prepare_int8()` GraphModule for checkpoints.
+
+    FX-prepared models hold unpicklable qconfig closures, so the FP32 model is saved instead with the trained Conv/BN
+    weights copied in and the full fake-quant state_dict attached as `qat`, see `load_qat()`.
+    """
+    m = deepcopy(model.meta["fp32"])
+    sd = {k.replace(".conv.bn.", ".bn."): v for k, v in model.state_dict().items()}  # ConvBn2d to Conv() names
+    m.load_state_dict({k: v for k, v in sd.items() if k in m.state_dict()}, strict=False)
+    copy_attr(m, model, include=("yaml", "nc", "hyp", "names", "stride", "class_weights"))
+    m.qat = deepcopy(model.state_dict())
+    return m
+
+
+def load_qat(model):
+    """Rebuilds a QAT GraphModule from a `dump_qat()` checkpoint model in eval mode with observers disabled."""
+    from torch.ao.quantization import disable_observer
+
+    sd = model.__dict__.pop("qat")
+    im = torch.zeros(1, model.yaml.get("ch", 3), 64, 64, device=next(model.parameters()).device)  # trace input
+    m = prepare_int8(model.train(), im, qat=True)
+    m.load_state_dict(sd)
+    return m.eval().apply(disable_observer)  # freeze fake-quant qparams for inference
+
+
 def fuse_conv_and_bn(conv, bn):
     """
     Fuses Conv2d and BatchNorm2d layers into a single Conv2d layer.
@@ -282,7 +594,7 @@ def fuse_conv_and_bn(conv, bn):
     )
 
     # Prepare filters
-    w_conv = conv.weight.clone().view(conv.out_channels, -1)
+    w_conv = conv.weight.clone().reshape(conv.out_channels, -1)  # reshape() for channels_last weights
     w_bn = torch.diag(bn.weight.div(torch.sqrt(bn.eps + bn.running_var)))
     fusedconv.weight.copy_(torch.mm(w_bn, w_conv).view(fusedconv.weight.shape))
 
@@ -348,11 +660,14 @@ def copy_attr(a, b, include=(), exclude=()):
             setattr(a, k, v)
 
 
-def smart_optimizer(model, name="Adam", lr=0.001, momentum=0.9, decay=1e-5):
+def smart_optimizer(model, name="Adam", lr=0.001, momentum=0.9, decay=1e-5, foreach=True, zero=False):
     """
     Initializes YOLOv5 smart optimizer with 3 parameter groups for different decay configurations.
 
-    Groups are 0) weights with decay, 1) weights no decay, 2) biases no decay.
+    Groups are 0) weights with decay, 1) weights no decay, 2) biases no decay. With `foreach=True` Adam and AdamW use
+    the fused implementation (CUDA torch>=2.0, CPU torch>=2.4) and other optimizers the multi-tensor foreach
+    implementation (torch>=1.13), replacing per-parameter Python loops. With `zero=True` optimizer state is sharded
+    across DDP ranks by a ZeroRedundancyOptimizer, whose state_dict() needs consolidate_state_dict() on all ranks first.
     """
     g = [], [], []  # optimizer parameter groups
     bn = tuple(v for k, v in nn.__dict__.items() if "Norm" in k)  # normalization layers, i.e. BatchNorm2d()
@@ -365,26 +680,52 @@ def smart_optimizer(model, name="Adam", lr=0.001, momentum=0.9, decay=1e-5):
             else:
                 g[0].append(p)  # weight (with decay)
 
+    kw = {}  # multi-tensor implementation
+    if foreach:
+        device = next(model.parameters()).device
+        if name in {"Adam", "AdamW"} and check_version(torch.__version__, "2.4.0" if device.type == "cpu" else "2.0.0"):
+            kw = {"fused": True} if device.type in {"cpu", "cuda"} else {}
+        elif check_version(torch.__version__, "1.13.0"):
+            kw = {"foreach": True}
     if name == "Adam":
-        optimizer = torch.optim.Adam(g[2], lr=lr, betas=(momentum, 0.999))  # adjust beta1 to momentum
+        optimizer, args = torch.optim.Adam, {"lr": lr, "betas": (momentum, 0.999), **kw}  # adjust beta1 to momentum
     elif name == "AdamW":
-        optimizer = torch.optim.AdamW(g[2], lr=lr, betas=(momentum, 0.999), weight_decay=0.0)
+        optimizer, args = torch.optim.AdamW, {"lr": lr, "betas": (momentum, 0.999), "weight_decay": 0.0, **kw}
     elif name == "RMSProp":
-        optimizer = torch.optim.RMSprop(g[2], lr=lr, momentum=momentum)
+        optimizer, args = torch.optim.RMSprop, {"lr": lr, "momentum": momentum, **kw}
     elif name == "SGD":
-        optimizer = torch.optim.SGD(g[2], lr=lr, momentum=momentum, nesterov=True)
+        optimizer, args = torch.optim.SGD, {"lr": lr, "momentum": momentum, "nesterov": True, **kw}
     else:
         raise NotImplementedError(f"Optimizer {name} not implemented.")
+    if zero:
+        from torch.distributed.optim import ZeroRedundancyOptimizer
+
+        optimizer = ZeroRedundancyOptimizer(g[2], optimizer_class=optimizer, **args)
+    else:
+        optimizer = optimizer(g[2], **args)
 
     optimizer.add_param_group({"params": g[0], "weight_decay": decay})  # add g0 with weight_decay
     optimizer.add_param_group({"params": g[1], "weight_decay": 0.0})  # add g1 (BatchNorm2d weights)
+    cls = type(optimizer.optim if zero else optimizer)  # ZeroRedundancyOptimizer wraps the optimizer class
     LOGGER.info(
-        f"{colorstr('optimizer:')} {type(optimizer).__name__}(lr={lr}) with parameter groups "
-        f"{len(g[1])} weight(decay=0.0), {len(g[0])} weight(decay={decay}), {len(g[2])} bias"
+        f"{colorstr('optimizer:')} {'ZeRO-sharded ' if zero else ''}{cls.__name__}"
+        f"(lr={lr}{''.join(f', {k}=True' for k in kw)}) with "
+        f"parameter groups {len(g[1])} weight(decay=0.0), {len(g[0])} weight(decay={decay}), {len(g[2])} bias"
     )
     return optimizer
 
 
+def clip_gradients(model, max_norm=10.0, foreach=True):
+    """Clips the gradient norm of `model` parameters, using the multi-tensor foreach implementation on torch>=2.0."""
+    device = next(model.parameters()).device
+    kw = (
+        {"foreach": True}
+        if foreach and device.type in {"cpu", "cuda"} and check_version(torch.__version__, "2.0.0")
+        else {}
+    )
+    return torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=max_norm, **kw)
+
+
 def smart_hub_load(repo="ultralytics/yolov5", model="yolov5s", **kwargs):
     """YOLOv5 torch.hub.load() wrapper with smart error handling, adjusting torch arguments for compatibility."""
     if check_version(torch.__version__, "1.9.1"):
@@ -408,7 +749,7 @@ def smart_resume(ckpt, optimizer, ema=None, weights="yolov5s.pt", epochs=300, re
         ema.ema.load_state_dict(ckpt["ema"].float().state_dict())  # EMA
         ema.updates = ckpt["updates"]
     if resume:
-        assert start_epoch > 0, (
+        assert start_epoch > 0 or ckpt.get("iteration"), (  # mid-epoch checkpoints may resume epoch 0
             f"{weights} training to {epochs} epochs is finished, nothing to resume.\n"
             f"Start a new training without --resume, i.e. 'python train.py --weights {weights}'"
         )
@@ -453,30 +794,142 @@ class ModelEMA:
     For EMA details see https://www.tensorflow.org/api_docs/python/tf/train/ExponentialMovingAverage.
     """
 
-    def __init__(self, model, decay=0.9999, tau=2000, updates=0):
+    def __init__(self, model, decay=0.9999, tau=2000, updates=0, every=1, foreach=True):
         """Initializes EMA with model parameters, decay rate, tau for decay adjustment, and update count; sets model to
         evaluation mode.
+
+        The EMA is updated every `every` optimizer steps with decay d**every, matching `every` per-step updates with
+        the model held constant in between. `foreach=True` updates all tensors with two multi-tensor ops over cached
+        tensor lists instead of two ops per state_dict tensor.
         """
         self.ema = deepcopy(de_parallel(model)).eval()  # FP32 EMA
         self.updates = updates  # number of EMA updates
         self.decay = lambda x: decay * (1 - math.exp(-x / tau))  # decay exponential ramp (to help early epochs)
+        self.every = every  # optimizer steps per EMA update
+        self.foreach = foreach and hasattr(torch, "_foreach_mul_")
+        self.key, self.tensors = None, ([], [])  # cached EMA and model tensor lists
         for p in self.ema.parameters():
             p.requires_grad_(False)
 
     def update(self, model):
         """Updates the Exponential Moving Average (EMA) parameters based on the current model's parameters."""
         self.updates += 1
-        d = self.decay(self.updates)
+        if self.updates % self.every:
+            return
+        d = self.decay(self.updates) ** self.every  # decay corrected for skipped steps
+
+        model = de_parallel(model)
+        if not self.foreach:  # per-tensor updates
+            msd = model.state_dict()  # model state_dict
+            for k, v in self.ema.state_dict().items():
+                if v.dtype.is_floating_point and v.shape == msd[k].shape:  # QAT per-channel qparams are sized lazily
+                    v *= d
+                    v += (1 - d) * msd[k].detach()
+            return
+
+        key = model, self._ptrs(self.ema), self._ptrs(model)
+        if key != self.key:  # model changed or to(), half(), float() reallocated its tensors
+            e, m, complete = self._tensors(model)
+            self.key = key if complete else None  # QAT per-channel qparams are sized lazily, rebuild until they match
+            self.tensors = e, m
+        e, m = self.tensors
+        torch._foreach_mul_(e, d)
+        torch._foreach_add_(e, m, alpha=1 - d)
+
+    @staticmethod
+    def _ptrs(model):
+        """Returns data pointers of the first parameter and buffer of `model`, which change when tensors are moved."""
+        return tuple(
+            t.data_ptr() for t in (next(model.parameters(), None), next(model.buffers(), None)) if t is not None
+        )
 
-        msd = de_parallel(model).state_dict()  # model state_dict
-        for k, v in self.ema.state_dict().items():
-            if v.dtype.is_floating_point:  # true for FP16 and FP32
-                v *= d
-                v += (1 - d) * msd[k].detach()
-        # assert v.dtype == msd[k].dtype == torch.float32, f'{k}: EMA {v.dtype} and model {msd[k].dtype} must be FP32'
+    def _tensors(self, model):
+        """
+        Returns floating point EMA and model state_dict tensor lists sharing storage with both models, and whether all
+        shapes matched.
+        """
+        msd = model.state_dict()  # model state_dict
+        esd = {k: v for k, v in self.ema.state_dict().items() if v.dtype.is_floating_point}
+        keys = [k for k, v in esd.items() if v.shape == msd[k].shape]
+        return [esd[k] for k in keys], [msd[k].detach() for k in keys], len(keys) == len(esd)
+
+    def broadcast(self, src=0):
+        """Broadcasts the EMA state_dict from DDP rank `src`, as local BatchNorm statistics make rank EMAs drift."""
+        for v in self.ema.state_dict().values():
+            dist.broadcast(v, src)
 
     def update_attr(self, model, include=(), exclude=("process_group", "reducer")):
         """Updates EMA attributes by copying specified attributes from model to EMA, excluding certain attributes by
         default.
         """
         copy_attr(self.ema, model, include, exclude)
+
+
+class CheckpointWriter:
+    """
+    Writes training checkpoints on a background thread so serialization overlaps training.
+
+    save() snapshots tensors to CPU on the calling thread, then a single writer thread saves the checkpoint to a
+    temporary file and atomically renames it into place, so an interrupted save never leaves a truncated checkpoint.
+    Identical copies, i.e. best.pt, are hard-linked to the written file (copied where links are unsupported).
+    """
+
+    def __init__(self):
+        """Initializes a single-thread writer, preserving checkpoint save order."""
+        self.pool = ThreadPoolExecutor(1)
+        self.future = None  # checkpoint being written
+        self.prefix = colorstr("checkpoint: ")
+
+    def save(self, ckpt, f, links=(), callback=None):
+        """
+        Snapshots `ckpt` to CPU and writes it to `f` in the background, then links `f` to `links` and runs `callback`.
+        """
+        self.wait()  # one checkpoint in flight bounds host memory
+        t = time.perf_counter()
+        ckpt = self.snapshot(ckpt)
+        dt = time.perf_counter() - t  # training blocked
+        self.future = self.pool.submit(self._write, ckpt, Path(f), [Path(x) for x in links], dt, callback)
+
+    def wait(self):
+        """Blocks until the pending checkpoint is written, re-raising any write error."""
+        if self.future is not None:
+            self.future, future = None, self.future
+            future.result()
+
+    @staticmethod
+    def snapshot(x):
+        """
+        Returns `x` with tensors copied and modules moved to CPU, unaffected by later in-place training updates.
+
+        Modules are moved in place and should be copies, i.e. `deepcopy(model).half()`.
+        """
+        if isinstance(x, torch.Tensor):
+            return x.detach().to("cpu", copy=True)
+        if isinstance(x, nn.Module):
+            return x.cpu()
+        if isinstance(x, dict):
+            return {k: CheckpointWriter.snapshot(v) for k, v in x.items()}
+        if isinstance(x, (list, tuple)):
+            return type(x)(CheckpointWriter.snapshot(v) for v in x)
+        return x
+
+    def _write(self, ckpt, f, links, dt, callback):
+        """Saves `ckpt` to `f` through a temporary file, links it to `links` and runs `callback`."""
+        t = time.perf_counter()
+        tmp = f.with_name(f".{f.name}.tmp")
+        torch.save(ckpt, tmp)
+        os.replace(tmp, f)  # atomic
+        for x in links:
+            tmp = x.with_name(f".{x.name}.tmp")
+            tmp.unlink(missing_ok=True)
+            try:
+                os.link(f, tmp)  # hard link, no second serialization
+            except OSError:
+                shutil.copyfile(f, tmp)
+            os.replace(tmp, x)
+        LOGGER.info(
+            f"{self.prefix}saved {', '.join(x.name for x in (f, *links))} "
+            f"({dt * 1e3:.0f}ms snapshot, {time.perf_counter() - t:.2f}s background write)"
+        )
+        if callback:
+            callback()
@@ -20,7 +20,6 @@ Usage - formats:
 """
 
 import argparse
-import json
 import os
 import subprocess
 import sys
@@ -28,6 +27,7 @@ from pathlib import Path
 
 import numpy as np
 import torch
+import torch.distributed as dist
 from tqdm import tqdm
 
 FILE = Path(__file__).resolve()
@@ -37,8 +37,10 @@ if str(ROOT) not in sys.path:
 ROOT = Path(os.path.relpath(ROOT, Path.cwd()))  # relative
 
 from models.common import DetectMultiBackend
+from utils.autobatch import autobatch_inference
 from utils.callbacks import Callbacks
-from utils.dataloaders import create_dataloader
+from utils.cocoeval import COCOEvaluator, COCOJSONWriter
+from utils.dataloaders import ShardedSampler, create_dataloader
 from utils.general import (
     LOGGER,
     TQDM_BAR_FORMAT,
@@ -56,9 +58,9 @@ from utils.general import (
     xywh2xyxy,
     xyxy2xywh,
 )
-from utils.metrics import ConfusionMatrix, ap_per_class, box_iou
+from utils.metrics import APAccumulator, ConfusionMatrix, box_iou, match_predictions
 from utils.plots import output_to_target, plot_images, plot_val_study
-from utils.torch_utils import select_device, smart_inference_mode
+from utils.torch_utils import select_device, smart_autocast, smart_inference_mode
 
 
 def save_one_txt(predn, save_conf, shape, file):
@@ -94,51 +96,24 @@ def save_one_txt(predn, save_conf, shape, file):
             f.write(("%g " * len(line)).rstrip() % line + "\n")
 
 
-def save_one_json(predn, jdict, path, class_map):
+def coco_boxes(xyxy):
     """
-    Saves a single JSON detection result, including image ID, category ID, bounding box, and confidence score.
+    Converts native-space boxes to the COCO [x, y, width, height] format, x and y being the top-left corner.
 
     Args:
-        predn (torch.Tensor): Predicted detections in xyxy format with shape (n, 6) where n is the number of detections.
-                              The tensor should contain [x_min, y_min, x_max, y_max, confidence, class_id] for each detection.
-        jdict (list[dict]): List to collect JSON formatted detection results.
-        path (pathlib.Path): Path object of the image file, used to extract image_id.
-        class_map (dict[int, int]): Mapping from model class indices to dataset-specific category IDs.
+        xyxy (torch.Tensor): Boxes in xyxy format with shape (n, 4).
 
     Returns:
-        None: Appends detection results as dictionaries to `jdict` list in-place.
+        (np.ndarray): Boxes in [x, y, width, height] format with shape (n, 4), as written to COCO results JSON files.
 
     Example:
         ```python
-        predn = torch.tensor([[100, 50, 200, 150, 0.9, 0], [50, 30, 100, 80, 0.8, 1]])
-        jdict = []
-        path = Path("42.jpg")
-        class_map = {0: 18, 1: 19}
-        save_one_json(predn, jdict, path, class_map)
+        coco_boxes(torch.tensor([[100, 50, 200, 150]]))  # array([[100., 50., 100., 100.]])
         ```
-        This will append to `jdict`:
-        ```
-        [
-            {'image_id': 42, 'category_id': 18, 'bbox': [125.0, 75.0, 100.0, 100.0], 'score': 0.9},
-            {'image_id': 42, 'category_id': 19, 'bbox': [75.0, 55.0, 50.0, 50.0], 'score': 0.8}
-        ]
-        ```
-
-    Notes:
-        The `bbox` values are formatted as [x, y, width, height], where x and y represent the top-left corner of the box.
     """
-    image_id = int(path.stem) if path.stem.isnumeric() else path.stem
-    box = xyxy2xywh(predn[:, :4])  # xywh
+    box = xyxy2xywh(xyxy)  # xywh
     box[:, :2] -= box[:, 2:] / 2  # xy center to top-left corner
-    for p, b in zip(predn.tolist(), box.tolist()):
-        jdict.append(
-            {
-                "image_id": image_id,
-                "category_id": class_map[int(p[5])],
-                "bbox": [round(x, 3) for x in b],
-                "score": round(p[4], 5),
-            }
-        )
+    return box.cpu().numpy()
 
 
 def process_batch(detections, labels, iouv):
@@ -168,27 +143,15 @@ def process_batch(detections, labels, iouv):
         - This function is used as part of the evaluation pipeline for object detection models.
         - IoU (Intersection over Union) is a common evaluation metric for object detection performance.
     """
-    correct = np.zeros((detections.shape[0], iouv.shape[0])).astype(bool)
     iou = box_iou(labels[:, 1:], detections[:, :4])
-    correct_class = labels[:, 0:1] == detections[:, 5]
-    for i in range(len(iouv)):
-        x = torch.where((iou >= iouv[i]) & correct_class)  # IoU > threshold and classes match
-        if x[0].shape[0]:
-            matches = torch.cat((torch.stack(x, 1), iou[x[0], x[1]][:, None]), 1).cpu().numpy()  # [label, detect, iou]
-            if x[0].shape[0] > 1:
-                matches = matches[matches[:, 2].argsort()[::-1]]
-                matches = matches[np.unique(matches[:, 1], return_index=True)[1]]
-                # matches = matches[matches[:, 2].argsort()[::-1]]
-                matches = matches[np.unique(matches[:, 0], return_index=True)[1]]
-            correct[matches[:, 1].astype(int), i] = True
-    return torch.tensor(correct, dtype=torch.bool, device=iouv.device)
+    return match_predictions(iou, labels[:, 0:1] == detections[:, 5], iouv)  # all IoU thresholds at once
 
 
 @smart_inference_mode()
 def run(
     data,
     weights=None,  # model.pt path(s)
-    batch_size=32,  # batch size
+    batch_size=32,  # batch size, -1 for highest throughput
     imgsz=640,  # inference size (pixels)
     conf_thres=0.001,  # confidence threshold
     iou_thres=0.6,  # NMS IoU threshold
@@ -203,11 +166,20 @@ def run(
     save_hybrid=False,  # save label+prediction hybrid results to *.txt
     save_conf=False,  # save confidences in --save-txt labels
     save_json=False,  # save a COCO-JSON results file
+    coco_eval=False,  # compute COCO mAP (AP, AP50, AP75, APs/m/l, AR@1/10/100) natively
     project=ROOT / "runs/val",  # save to project/name
     name="exp",  # save to project/name
     exist_ok=False,  # existing project/name ok, do not increment
     half=True,  # use FP16 half-precision inference
     dnn=False,  # use OpenCV DNN for ONNX inference
+    throughput=False,  # use OpenVINO THROUGHPUT mode with async infer requests
+    nireq=0,  # OpenVINO in-flight infer requests for --throughput, 0 for device optimal
+    threads=None,  # TFLite threads per interpreter, None for default
+    interpreters=1,  # TFLite interpreter pool size for concurrent batch images
+    compile=False,  # run PyTorch models through torch.compile
+    channels_last=False,  # run PyTorch models and batches in torch.channels_last memory format
+    bf16=False,  # use bfloat16 autocast inference for PyTorch models
+    ap_bins=0,  # confidence bins of a fixed-memory mAP accumulator, 0 for exact mAP
     model=None,
     dataloader=None,
     save_dir=Path(""),
@@ -223,7 +195,7 @@ def run(
         weights (str | list[str], optional): Path to the model weights file(s). Supports various formats including PyTorch,
             TorchScript, ONNX, OpenVINO, TensorRT, CoreML, TensorFlow SavedModel, TensorFlow GraphDef, TensorFlow Lite,
             TensorFlow Edge TPU, and PaddlePaddle.
-        batch_size (int, optional): Batch size for inference. Default is 32.
+        batch_size (int, optional): Batch size for inference, -1 to sweep for the highest throughput. Default is 32.
         imgsz (int, optional): Input image size (pixels). Default is 640.
         conf_thres (float, optional): Confidence threshold for object detection. Default is 0.001.
         iou_thres (float, optional): IoU threshold for Non-Maximum Suppression (NMS). Default is 0.6.
@@ -237,12 +209,28 @@ def run(
         save_txt (bool, optional): Save results to *.txt files. Default is False.
         save_hybrid (bool, optional): Save label and prediction hybrid results to *.txt files. Default is False.
         save_conf (bool, optional): Save confidences in --save-txt labels. Default is False.
-        save_json (bool, optional): Save a COCO-JSON results file. Default is False.
+        save_json (bool, optional): Save a COCO-JSON results file streamed image by image, i.e. for COCO test-dev
+            submissions. Default is False.
+        coco_eval (bool, optional): Compute COCO mAP natively, against the COCO annotations JSON if found, else the
+            dataset labels. Default is False.
         project (str | Path, optional): Directory to save results. Default is ROOT/'runs/val'.
         name (str, optional): Name of the run. Default is 'exp'.
         exist_ok (bool, optional): Overwrite existing project/name without incrementing. Default is False.
         half (bool, optional): Use FP16 half-precision inference. Default is True.
         dnn (bool, optional): Use OpenCV DNN for ONNX inference. Default is False.
+        throughput (bool, optional): Use OpenVINO THROUGHPUT mode with an async infer request queue. Default is False.
+        nireq (int, optional): OpenVINO in-flight requests for throughput mode, 0 for device optimal. Default is 0.
+        threads (int, optional): Threads per TFLite interpreter, None for the runtime default. Default is None.
+        interpreters (int, optional): TFLite interpreter pool size for concurrent batch images. Default is 1.
+        compile (bool, optional): Run PyTorch models through torch.compile with a persistent kernel cache. Default is
+            False.
+        channels_last (bool, optional): Run PyTorch models and dataloader batches in torch.channels_last (NHWC) memory
+            format. Default is False.
+        bf16 (bool, optional): Run PyTorch models under bfloat16 autocast on CPU or CUDA, computing NMS, metrics and
+            loss in FP32. Default is False.
+        ap_bins (int, optional): Accumulate mAP in fixed memory, counting matches per class, IoU threshold and one of
+            `ap_bins` confidence bins instead of keeping every detection, 0 for exact mAP. See
+            utils.metrics.APAccumulator for its error bound. Default is 0.
         model (torch.nn.Module, optional): Model object for training. Default is None.
         dataloader (torch.utils.data.DataLoader, optional): Dataloader object. Default is None.
         save_dir (Path, optional): Directory to save results. Default is Path('').
@@ -267,7 +255,20 @@ def run(
         (save_dir / "labels" if save_txt else save_dir).mkdir(parents=True, exist_ok=True)  # make dir
 
         # Load model
-        model = DetectMultiBackend(weights, device=device, dnn=dnn, data=data, fp16=half)
+        model = DetectMultiBackend(
+            weights,
+            device=device,
+            dnn=dnn,
+            data=data,
+            fp16=half,
+            throughput=throughput,
+            nireq=nireq,
+            threads=threads,
+            interpreters=interpreters,
+            compile=compile,
+            channels_last=channels_last,
+            bf16=bf16,
+        )
         stride, pt, jit, engine = model.stride, model.pt, model.jit, model.engine
         imgsz = check_img_size(imgsz, s=stride)  # check image size
         half = model.fp16  # FP16 supported on limited backends with CUDA
@@ -275,7 +276,10 @@ def run(
             batch_size = model.batch_size
         else:
             device = model.device
-            if not (pt or jit):
+            pool = (model.xml and throughput) or (model.tflite and interpreters > 1)  # split batches across requests
+            if batch_size == -1:  # AutoBatch, sweeping the batch sizes this backend accepts
+                batch_size = autobatch_inference(model, imgsz)
+            elif not (pt or jit or pool):
                 batch_size = 1  # export.py models default to batch-size 1
                 LOGGER.info(f"Forcing --batch-size 1 square inference (1,3,{imgsz},{imgsz}) for non-PyTorch models")
 
@@ -311,7 +315,10 @@ def run(
             rect=rect,
             workers=workers,
             prefix=colorstr(f"{task}: "),
+            channels_last=model.channels_last,
         )[0]
+    sharded = isinstance(dataloader.sampler, ShardedSampler)  # val set split across DDP ranks by train.py
+    rank, world = (dataloader.sampler.rank, dataloader.sampler.world_size) if sharded else (0, 1)
 
     seen = 0
     confusion_matrix = ConfusionMatrix(nc=nc)
@@ -323,9 +330,25 @@ def run(
     tp, fp, p, r, f1, mp, mr, map50, ap50, map = 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0
     dt = Profile(device=device), Profile(device=device), Profile(device=device)  # profiling times
     loss = torch.zeros(3, device=device)
-    jdict, stats, ap, ap_class = [], [], [], []
+    ap, ap_class = [], []
+    stats = APAccumulator(nc, niou, bins=ap_bins, device=device)  # exact, or binned in fixed memory
+    idx = list(dataloader.sampler) if sharded else None  # dataset index of each image of this rank
+    native = getattr(dataloader, "labelsn", None)  # native-space labels of each image, cached by a ValCache
+    w = Path(weights[0] if isinstance(weights, list) else weights).stem if weights is not None else ""  # weights
+    pred_json = save_dir / f"{w}_predictions.json"  # predictions, of each rank until merged on rank 0
+    writer = COCOJSONWriter(pred_json.with_suffix(f".{rank}.json") if rank else pred_json) if save_json else None
+    coco, coco_labels = None, False  # COCO evaluator, its labels taken from the dataset
+    if coco_eval:
+        anno_json = Path("../datasets/coco/annotations/instances_val2017.json")  # annotations
+        if not anno_json.exists():
+            anno_json = Path(data["path"]) / "annotations" / "instances_val2017.json"
+        if anno_json.exists():
+            ids = [int(Path(x).stem) for x in dataloader.dataset.im_files] if is_coco else None  # image IDs to evaluate
+            coco = COCOEvaluator.from_json(anno_json, img_ids=ids)
+        else:
+            coco, coco_labels = COCOEvaluator([class_map[c] for c in range(nc)]), True
     callbacks.run("on_val_start")
-    pbar = tqdm(dataloader, desc=s, bar_format=TQDM_BAR_FORMAT)  # progress bar
+    pbar = tqdm(dataloader, desc=s, bar_format=TQDM_BAR_FORMAT, disable=rank > 0)  # progress bar
     for batch_i, (im, targets, paths, shapes) in enumerate(pbar):
         callbacks.run("on_val_batch_start")
         with dt[0]:
@@ -337,11 +360,12 @@ def run(
             nb, _, height, width = im.shape  # batch size, channels, height, width
 
         # Inference
-        with dt[1]:
+        with dt[1], smart_autocast(device, bf16=bf16 and training):  # DetectMultiBackend autocasts itself
             preds, train_out = model(im) if compute_loss else (model(im, augment=augment), None)
 
         # Loss
         if compute_loss:
+            train_out = [x.float() for x in train_out] if bf16 else train_out  # FP32 loss
             loss += compute_loss(train_out, targets)[1]  # box, obj, cls
 
         # NMS
@@ -357,12 +381,22 @@ def run(
             labels = targets[targets[:, 0] == si, 1:]
             nl, npr = labels.shape[0], pred.shape[0]  # number of labels, predictions
             path, shape = Path(paths[si]), shapes[si][0]
+            image_id = int(path.stem) if path.stem.isnumeric() else path.stem
             correct = torch.zeros(npr, niou, dtype=torch.bool, device=device)  # init
             seen += 1
+            if nl and native:
+                labelsn = native[seen - 1].to(device)  # native-space labels
+            elif nl:
+                tbox = xywh2xyxy(labels[:, 1:5])  # target boxes
+                scale_boxes(im[si].shape[1:], tbox, shape, shapes[si][1])  # native-space labels
+                labelsn = torch.cat((labels[:, 0:1], tbox), 1)  # native-space labels
+            if coco_labels:
+                cats = [class_map[int(c)] for c in labels[:, 0].tolist()]
+                coco.add_labels(image_id, coco_boxes(labelsn[:, 1:]) if nl else np.zeros((0, 4)), cats)
 
             if npr == 0:
                 if nl:
-                    stats.append((correct, *torch.zeros((2, 0), device=device), labels[:, 0]))
+                    stats.update(correct, *torch.zeros((2, 0), device=device), labels[:, 0], idx and idx[seen - 1])
                     if plots:
                         confusion_matrix.process_batch(detections=None, labels=labels[:, 0])
                 continue
@@ -375,36 +409,74 @@ def run(
 
             # Evaluate
             if nl:
-                tbox = xywh2xyxy(labels[:, 1:5])  # target boxes
-                scale_boxes(im[si].shape[1:], tbox, shape, shapes[si][1])  # native-space labels
-                labelsn = torch.cat((labels[:, 0:1], tbox), 1)  # native-space labels
                 correct = process_batch(predn, labelsn, iouv)
                 if plots:
                     confusion_matrix.process_batch(predn, labelsn)
-            stats.append((correct, pred[:, 4], pred[:, 5], labels[:, 0]))  # (correct, conf, pcls, tcls)
+            stats.update(correct, pred[:, 4], pred[:, 5], labels[:, 0], idx and idx[seen - 1])  # conf, pcls, tcls
 
             # Save/log
             if save_txt:
                 (save_dir / "labels").mkdir(parents=True, exist_ok=True)
                 save_one_txt(predn, save_conf, shape, file=save_dir / "labels" / f"{path.stem}.txt")
-            if save_json:
-                save_one_json(predn, jdict, path, class_map)  # append to COCO-JSON dictionary
+            if save_json or coco:
+                dets = (
+                    image_id,
+                    coco_boxes(predn[:, :4]),
+                    predn[:, 4].cpu().numpy(),
+                    [class_map[int(c)] for c in predn[:, 5].tolist()],
+                )
+                if save_json:
+                    writer.write(*dets)  # stream to COCO-JSON file
+                if coco:
+                    coco.update(*dets)
             callbacks.run("on_val_image_end", pred, predn, path, names, im[si])
 
         # Plot images
-        if plots and batch_i < 3:
+        if plots and batch_i < 3 and rank == 0:
             plot_images(im, targets, paths, save_dir / f"val_batch{batch_i}_labels.jpg", names)  # labels
             plot_images(im, output_to_target(preds), paths, save_dir / f"val_batch{batch_i}_pred.jpg", names)  # pred
 
         callbacks.run("on_val_batch_end", batch_i, im, targets, paths, shapes, preds)
 
+    # Gather DDP shards to rank 0, in single-process image order
+    nb = len(dataloader)  # number of batches
+    if world > 1:
+        shards, results, stats = [None] * world if rank == 0 else None, [None], stats.cpu()
+        if coco:
+            coco.flush()  # match on every rank
+        if writer and rank:
+            writer.close()
+        with torch.inference_mode(False):  # collectives write to their buffers outside inference mode
+            dist.gather_object((stats, coco, seen, nb, loss.cpu(), confusion_matrix.matrix, [x.t for x in dt]), shards)
+            if rank:  # metrics computed on rank 0 and broadcast
+                dist.broadcast_object_list(results, 0)
+        if rank:
+            model.float()
+            return results[0]
+        stats, coco, seen, nb, loss, matrix, times = zip(*shards)
+        stats, *others = stats
+        for x in others:
+            stats += x  # exact stats merged in dataset order
+        coco, *others = coco
+        if coco:
+            for x in others:
+                coco += x  # evaluators of disjoint images
+        if writer:
+            for r in range(1, world):
+                writer.extend(pred_json.with_suffix(f".{r}.json"))
+                pred_json.with_suffix(f".{r}.json").unlink()
+        seen, nb, loss = sum(seen), sum(nb), sum(loss)
+        confusion_matrix.matrix = sum(matrix)
+        for x, t in zip(dt, zip(*times)):
+            x.t = sum(t)
+
     # Compute metrics
-    stats = [torch.cat(x, 0).cpu().numpy() for x in zip(*stats)]  # to numpy
-    if len(stats) and stats[0].any():
-        tp, fp, p, r, f1, ap, ap_class = ap_per_class(*stats, plot=plots, save_dir=save_dir, names=names)
+    metrics = stats.compute(plot=plots, save_dir=save_dir, names=names)  # None without true positives
+    if metrics:
+        tp, fp, p, r, f1, ap, ap_class = metrics
         ap50, ap = ap[:, 0], ap.mean(1)  # AP@0.5, AP@0.5:0.95
         mp, mr, map50, map = p.mean(), r.mean(), ap50.mean(), ap.mean()
-    nt = np.bincount(stats[3].astype(int), minlength=nc)  # number of targets per class
+    nt = stats.targets()  # number of targets per class
 
     # Print results
     pf = "%22s" + "%11i" * 2 + "%11.3g" * 4  # print format
@@ -413,7 +485,7 @@ def run(
         LOGGER.warning(f"WARNING ⚠️ no labels found in {task} set, can not compute metrics without labels")
 
     # Print results per class
-    if (verbose or (nc < 50 and not training)) and nc > 1 and len(stats):
+    if (verbose or (nc < 50 and not training)) and nc > 1:
         for i, c in enumerate(ap_class):
             LOGGER.info(pf % (names[c], seen, nt[c], p[i], r[i], ap50[i], ap[i]))
 
@@ -429,32 +501,16 @@ def run(
         callbacks.run("on_val_end", nt, tp, fp, p, r, f1, ap, ap50, ap_class, confusion_matrix)
 
     # Save JSON
-    if save_json and len(jdict):
-        w = Path(weights[0] if isinstance(weights, list) else weights).stem if weights is not None else ""  # weights
-        anno_json = str(Path("../datasets/coco/annotations/instances_val2017.json"))  # annotations
-        if not os.path.exists(anno_json):
-            anno_json = os.path.join(data["path"], "annotations", "instances_val2017.json")
-        pred_json = str(save_dir / f"{w}_predictions.json")  # predictions
-        LOGGER.info(f"\nEvaluating pycocotools mAP... saving {pred_json}...")
-        with open(pred_json, "w") as f:
-            json.dump(jdict, f)
-
-        try:  # https://github.com/cocodataset/cocoapi/blob/master/PythonAPI/pycocoEvalDemo.ipynb
-            check_requirements("pycocotools>=2.0.6")
-            from pycocotools.coco import COCO
-            from pycocotools.cocoeval import COCOeval
-
-            anno = COCO(anno_json)  # init annotations api
-            pred = anno.loadRes(pred_json)  # init predictions api
-            eval = COCOeval(anno, pred, "bbox")
-            if is_coco:
-                eval.params.imgIds = [int(Path(x).stem) for x in dataloader.dataset.im_files]  # image IDs to evaluate
-            eval.evaluate()
-            eval.accumulate()
-            eval.summarize()
-            map, map50 = eval.stats[:2]  # update results (mAP@0.5:0.95, mAP@0.5)
-        except Exception as e:
-            LOGGER.info(f"pycocotools unable to run: {e}")
+    if writer:
+        writer.close()
+        LOGGER.info(f"\nSaved {writer.n} detections to {pred_json}")
+
+    # COCO mAP
+    if coco and coco.labeled():
+        LOGGER.info("\nEvaluating COCO mAP...")
+        map, map50 = coco.evaluate()[:2]  # update results (mAP@0.5:0.95, mAP@0.5)
+    elif coco:
+        LOGGER.warning(f"WARNING ⚠️ no labels for the {task} images, skipping COCO mAP")
 
     # Return results
     model.float()  # for training
@@ -464,7 +520,11 @@ def run(
     maps = np.zeros(nc) + map
     for i, c in enumerate(ap_class):
         maps[c] = ap[i]
-    return (mp, mr, map50, map, *(loss.cpu() / len(dataloader)).tolist()), maps, t
+    results = (mp, mr, map50, map, *(loss.cpu() / nb).tolist()), maps, t
+    if world > 1:
+        with torch.inference_mode(False):
+            dist.broadcast_object_list([results], 0)
+    return results
 
 
 def parse_opt():
@@ -474,7 +534,7 @@ def parse_opt():
     Args:
         data (str, optional): Path to the dataset YAML file. Default is 'data/coco128.yaml'.
         weights (list[str], optional): List of paths to model weight files. Default is 'yolov5s.pt'.
-        batch_size (int, optional): Batch size for inference. Default is 32.
+        batch_size (int, optional): Batch size for inference, -1 to sweep for the highest throughput. Default is 32.
         imgsz (int, optional): Inference image size in pixels. Default is 640.
         conf_thres (float, optional): Confidence threshold for predictions. Default is 0.001.
         iou_thres (float, optional): IoU threshold for Non-Max Suppression (NMS). Default is 0.6.
@@ -489,17 +549,27 @@ def parse_opt():
         save_hybrid (bool, optional): If set, saves label+prediction hybrid results to *.txt files. Default is False.
         save_conf (bool, optional): If set, saves confidences in --save-txt labels. Default is False.
         save_json (bool, optional): If set, saves results to a COCO-JSON file. Default is False.
+        coco_eval (bool, optional): If set, computes COCO mAP natively. Default is False.
         project (str, optional): Project directory to save results to. Default is 'runs/val'.
         name (str, optional): Name of the directory to save results to. Default is 'exp'.
         exist_ok (bool, optional): If set, existing directory will not be incremented. Default is False.
         half (bool, optional): If set, uses FP16 half-precision inference. Default is False.
         dnn (bool, optional): If set, uses OpenCV DNN for ONNX inference. Default is False.
+        throughput (bool, optional): If set, uses OpenVINO THROUGHPUT mode with async infer requests. Default is False.
+        nireq (int, optional): OpenVINO in-flight infer requests for --throughput, 0 for device optimal. Default is 0.
+        threads (int, optional): Threads per TFLite interpreter. Default is None (runtime default).
+        interpreters (int, optional): TFLite interpreter pool size for concurrent batch images. Default is 1.
+        compile (bool, optional): If set, runs PyTorch models through torch.compile. Default is False.
+        channels_last (bool, optional): If set, runs PyTorch models and batches in torch.channels_last memory format.
+            Default is False.
+        bf16 (bool, optional): If set, runs PyTorch models under bfloat16 autocast. Default is False.
+        ap_bins (int, optional): Confidence bins of a fixed-memory mAP accumulator, 0 for exact mAP. Default is 0.
 
     Returns:
         argparse.Namespace: Parsed command-line options.
 
     Notes:
-        - The '--data' parameter is checked to ensure it ends with 'coco.yaml' if '--save-json' is set.
+        - The '--data' parameter is checked to ensure it ends with 'coco.yaml' to set '--coco-eval'.
         - The '--save-txt' option is set to True if '--save-hybrid' is enabled.
         - Args are printed using `print_args` to facilitate debugging.
 
@@ -517,12 +587,12 @@ def parse_opt():
     parser = argparse.ArgumentParser()
     parser.add_argument("--data", type=str, default=ROOT / "data/coco128.yaml", help="dataset.yaml path")
     parser.add_argument("--weights", nargs="+", type=str, default=ROOT / "yolov5s.pt", help="model path(s)")
-    parser.add_argument("--batch-size", type=int, default=32, help="batch size")
+    parser.add_argument("--batch-size", type=int, default=32, help="batch size, -1 for highest throughput")
     parser.add_argument("--imgsz", "--img", "--img-size", type=int, default=640, help="inference size (pixels)")
     parser.add_argument("--conf-thres", type=float, default=0.001, help="confidence threshold")
     parser.add_argument("--iou-thres", type=float, default=0.6, help="NMS IoU threshold")
     parser.add_argument("--max-det", type=int, default=300, help="maximum detections per image")
-    parser.add_argument("--task", default="val", help="train, val, test, speed or study")
+    parser.add_argument("--task", default="val", help="train, val, test, speed, study or int8")
     parser.add_argument("--device", default="", help="cuda device, i.e. 0 or 0,1,2,3 or cpu")
     parser.add_argument("--workers", type=int, default=8, help="max dataloader workers (per RANK in DDP mode)")
     parser.add_argument("--single-cls", action="store_true", help="treat as single-class dataset")
@@ -531,15 +601,26 @@ def parse_opt():
     parser.add_argument("--save-txt", action="store_true", help="save results to *.txt")
     parser.add_argument("--save-hybrid", action="store_true", help="save label+prediction hybrid results to *.txt")
     parser.add_argument("--save-conf", action="store_true", help="save confidences in --save-txt labels")
-    parser.add_argument("--save-json", action="store_true", help="save a COCO-JSON results file")
+    parser.add_argument(
+        "--save-json", action="store_true", help="save a COCO-JSON results file, i.e. for COCO test-dev submissions"
+    )
+    parser.add_argument("--coco-eval", action="store_true", help="compute COCO mAP natively")
     parser.add_argument("--project", default=ROOT / "runs/val", help="save to project/name")
     parser.add_argument("--name", default="exp", help="save to project/name")
     parser.add_argument("--exist-ok", action="store_true", help="existing project/name ok, do not increment")
     parser.add_argument("--half", action="store_true", help="use FP16 half-precision inference")
     parser.add_argument("--dnn", action="store_true", help="use OpenCV DNN for ONNX inference")
+    parser.add_argument("--throughput", action="store_true", help="OpenVINO THROUGHPUT mode with async infer requests")
+    parser.add_argument("--nireq", type=int, default=0, help="OpenVINO --throughput infer requests, 0 for optimal")
+    parser.add_argument("--threads", type=int, default=None, help="TFLite threads per interpreter")
+    parser.add_argument("--interpreters", type=int, default=1, help="TFLite interpreter pool size")
+    parser.add_argument("--compile", action="store_true", help="torch.compile PyTorch models")
+    parser.add_argument("--channels-last", action="store_true", help="torch.channels_last PyTorch models and batches")
+    parser.add_argument("--bf16", action="store_true", help="bfloat16 autocast inference for PyTorch models")
+    parser.add_argument("--ap-bins", type=int, default=0, help="fixed-memory binned mAP confidence bins, 0 for exact")
     opt = parser.parse_args()
     opt.data = check_yaml(opt.data)  # check YAML
-    opt.save_json |= opt.data.endswith("coco.yaml")
+    opt.coco_eval |= opt.data.endswith("coco.yaml")
     opt.save_txt |= opt.save_hybrid
     print_args(vars(opt))
     return opt
@@ -547,7 +628,8 @@ def parse_opt():
 
 def main(opt):
     """
-    Executes YOLOv5 tasks like training, validation, testing, speed, and study benchmarks based on provided options.
+    Executes YOLOv5 tasks like training, validation, testing, speed, study and INT8 benchmarks based on provided
+    options.
 
     Args:
         opt (argparse.Namespace): Parsed command-line options.
@@ -579,7 +661,7 @@ def main(opt):
         opt.half = torch.cuda.is_available() and opt.device != "cpu"  # FP16 for fastest results
         if opt.task == "speed":  # speed benchmarks
             # python val.py --task speed --data coco.yaml --batch 1 --weights yolov5n.pt yolov5s.pt...
-            opt.conf_thres, opt.iou_thres, opt.save_json = 0.25, 0.45, False
+            opt.conf_thres, opt.iou_thres, opt.save_json, opt.coco_eval = 0.25, 0.45, False, False
             for opt.weights in weights:
                 run(**vars(opt), plots=False)
 
@@ -595,8 +677,23 @@ def main(opt):
                 np.savetxt(f, y, fmt="%10.4g")  # save
             subprocess.run(["zip", "-r", "study.zip", "study_*.txt"])
             plot_val_study(x=x)  # plot
+
+        elif opt.task == "int8":  # PyTorch FP32 vs INT8 (PTQ, or QAT for train.py --qat weights) mAP and CPU latency
+            # python val.py --task int8 --data coco128.yaml --weights yolov5n.pt runs/train/exp/weights/best.pt...
+            from export import run as export
+
+            opt.device, opt.half = "cpu", False  # INT8 kernels are CPU-only
+            y = []
+            for w in weights:
+                f = export(weights=w, data=opt.data, imgsz=[opt.imgsz], include=["torchscript"], int8=True)[0]
+                for opt.weights in (w, f):
+                    r, _, t = run(**vars(opt), plots=False)
+                    y.append((Path(opt.weights).name, r[3], t[1]))  # name, mAP50-95, inference ms/img
+            LOGGER.info(f"\n{'Model':>30s}{'mAP50-95':>12s}{'CPU ms':>10s}{'speedup':>10s}")
+            for name, m, ms in y:
+                LOGGER.info(f"{name:>30s}{m:>12.4g}{ms:>10.1f}{y[0][2] / ms:>9.2f}x")
         else:
-            raise NotImplementedError(f'--task {opt.task} not in ("train", "val", "test", "speed", "study")')
+            raise NotImplementedError(f'--task {opt.task} not in ("train", "val", "test", "speed", "study", "int8")')
 
 
 if __name__ == "__main__":